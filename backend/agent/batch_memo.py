@@ -0,0 +1,44 @@
+import copy
+import json
+import asyncio
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+class BatchMemo:
+    """Results of understanding, retrieval and web lookups shared by every query in one batch.
+
+    A lookup already in flight is awaited rather than repeated.
+    """
+
+    def __init__(self):
+        self._results: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.hits = Counter()
+        self.misses = Counter()
+
+    async def get_or_compute(self, kind: str, key: Any, compute: Callable[[], Awaitable[Any]]) -> Any:
+        memo_key = (kind, json.dumps(key, sort_keys=True, default=str))
+        future = self._results.get(memo_key)
+        if future is None:
+            self.misses[kind] += 1
+            future = self._results[memo_key] = asyncio.ensure_future(compute())
+
+            def forget_failure(done: asyncio.Future):
+                # A failed lookup is not cached; the next query asking for it tries again
+                if done.cancelled() or done.exception() is not None:
+                    self._results.pop(memo_key, None)
+
+            future.add_done_callback(forget_failure)
+        else:
+            self.hits[kind] += 1
+        # One query hitting its deadline must not cancel a lookup the others are waiting on;
+        # every query gets its own copy, so no node can mutate another query's state
+        return copy.deepcopy(await asyncio.shield(future))
+
+    def cancel(self):
+        """Stop lookups still in flight once the batch itself is cancelled or finished"""
+        for future in self._results.values():
+            future.cancel()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {kind: {"hits": self.hits[kind], "misses": self.misses[kind]} for kind in sorted(set(self.hits) | set(self.misses))}
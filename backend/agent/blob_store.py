@@ -0,0 +1,68 @@
+import os
+import sys
+import time
+import uuid
+from typing import Any, Dict
+
+from langchain_core.messages import HumanMessage
+
+# Characters of an uploaded document kept in the conversation history; the full text stays in processed_input
+HISTORY_EXCERPT_CHARS = int(os.environ.get("HISTORY_EXCERPT_CHARS", "500"))
+
+
+class BlobStore:
+    """Per-request home for large payloads; the agent state carries short handles instead of copies"""
+
+    def __init__(self):
+        self._blobs: Dict[str, Any] = {}
+
+    def put(self, value: Any, kind: str = "blob") -> str:
+        handle = f"{kind}:{uuid.uuid4().hex[:12]}"
+        self._blobs[handle] = value
+        return handle
+
+    def get(self, handle: str) -> Any:
+        try:
+            return self._blobs[handle]
+        except KeyError:
+            raise KeyError(f"Unknown or released blob handle: {handle}") from None
+
+    def __contains__(self, handle: Any) -> bool:
+        return isinstance(handle, str) and handle in self._blobs
+
+    def nbytes(self) -> int:
+        """Approximate payload size; bytes and strings dominate, so nested objects are counted shallowly"""
+        total = 0
+        for value in self._blobs.values():
+            items = value if isinstance(value, list) else [value]
+            for item in items:
+                total += sys.getsizeof(getattr(item, "page_content", item))
+        return total
+
+    def clear(self):
+        self._blobs.clear()
+
+
+def lean_extraction(extraction: Dict[str, Any], blobs: BlobStore) -> Dict[str, Any]:
+    """Keep one copy of the document text in state; page Documents move to the blob store behind a handle"""
+    metadata = dict(extraction["metadata"])
+    # Same text as content, minus the user's question
+    metadata.pop("extracted_text", None)
+    if "documents" in metadata:
+        metadata["pages_ref"] = blobs.put(metadata.pop("documents"), "pages")
+    return {**extraction, "metadata": metadata}
+
+
+def history_message(processed_input: Dict[str, Any], excerpt_chars: int = HISTORY_EXCERPT_CHARS) -> HumanMessage:
+    """The user's turn as remembered in conversation history; uploads shrink to the question and an excerpt"""
+    content = processed_input["content"]
+    if processed_input["type"] not in ("image", "pdf"):
+        return HumanMessage(content=content, additional_kwargs={"timestamp": time.time()})
+
+    metadata = processed_input.get("metadata", {})
+    excerpt = content if len(content) <= excerpt_chars else content[:excerpt_chars].rstrip() + "..."
+    # No blob handles: the store is cleared when the request ends, but the history is sent back on later turns
+    attachment = {"type": processed_input["type"], "chars": len(content)}
+    lines = [metadata["user_query"]] if metadata.get("user_query") else []
+    lines.append(f"[Attached {processed_input['type']}, {len(content)} characters: {excerpt}]")
+    return HumanMessage(content="\n\n".join(lines), additional_kwargs={"timestamp": time.time(), "attachment": attachment})
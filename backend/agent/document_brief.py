@@ -0,0 +1,128 @@
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+
+
+class DocumentBriefBuilder:
+    """Map-reduce a long uploaded document into a compact brief the agent graph can work with"""
+
+    def __init__(
+        self,
+        llm: Any,
+        long_document_chars: Optional[int] = None,
+        chunk_chars: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        reduce_chars: int = 24000
+    ):
+        self.llm = llm
+        self.long_document_chars = long_document_chars or int(os.environ.get("LONG_DOCUMENT_CHARS", "40000"))
+        self.chunk_chars = chunk_chars or int(os.environ.get("BRIEF_CHUNK_CHARS", "12000"))
+        # Bounded so a 200-page contract does not burst past the LLM provider's rate limits
+        self.max_concurrency = max_concurrency or int(os.environ.get("BRIEF_MAX_CONCURRENCY", "4"))
+        self.reduce_chars = reduce_chars
+
+        self.map_prompt = ChatPromptTemplate.from_messages([
+            ("system", "You are a legal analyst extracting the substance of one section of a longer legal document."),
+            ("human", """Summarize this excerpt ({location}) of an uploaded legal document.
+
+            User question: {text_query}
+
+            Excerpt:
+            {text}
+
+            List concisely: parties, obligations, rights, dates and deadlines, amounts, defined terms,
+            and any clause relevant to the user's question, quoting key language and citing the pages.
+            """)
+        ])
+        self.reduce_prompt = ChatPromptTemplate.from_messages([
+            ("system", "You are a legal analyst combining section summaries into a single document brief."),
+            ("human", """Combine these section summaries of one legal document into a compact brief.
+
+            User question: {text_query}
+
+            Section summaries:
+            {summaries}
+
+            Keep page citations. Cover the document type, parties, key terms, obligations, deadlines, amounts,
+            and the provisions most relevant to the user's question. Drop boilerplate and repetition.
+            """)
+        ])
+
+    def is_long(self, extraction: Dict[str, Any]) -> bool:
+        return extraction.get("type") == "pdf" and len(extraction.get("content", "")) > self.long_document_chars
+
+    def chunk_pages(self, pages: List[Any]) -> List[Tuple[str, str]]:
+        """Group consecutive pages into (location, text) chunks of roughly chunk_chars"""
+        chunks, texts, first_page, size = [], [], None, 0
+
+        def flush(last_page: int):
+            if texts:
+                location = f"page {first_page + 1}" if first_page == last_page else f"pages {first_page + 1}-{last_page + 1}"
+                chunks.append((location, "\n".join(texts)))
+
+        for page in pages:
+            number, text = page.metadata.get("page", 0), page.page_content
+            # Oversized pages (dense scans, tables) are split on their own
+            for start in range(0, max(len(text), 1), self.chunk_chars):
+                piece = text[start:start + self.chunk_chars]
+                if texts and size + len(piece) > self.chunk_chars:
+                    flush(last_page)
+                    texts, first_page, size = [], None, 0
+                if first_page is None:
+                    first_page = number
+                texts.append(piece)
+                size += len(piece)
+                last_page = number
+        if pages:
+            flush(last_page)
+        return chunks
+
+    async def _map(self, chunks: List[Tuple[str, str]], text_query: str) -> List[str]:
+        chain = self.map_prompt | self.llm | StrOutputParser()
+        results = await chain.abatch(
+            [{"location": location, "text": text, "text_query": text_query} for location, text in chunks],
+            config={"max_concurrency": self.max_concurrency},
+            return_exceptions=True
+        )
+        summaries = []
+        for (location, _), result in zip(chunks, results):
+            if isinstance(result, Exception):
+                print(f"Summarizing {location} failed: {result}")
+                continue
+            summaries.append(f"[{location}] {result}")
+        return summaries
+
+    async def _reduce(self, summaries: List[str], text_query: str) -> str:
+        chain = self.reduce_prompt | self.llm | StrOutputParser()
+        # Collapse in groups until the summaries fit a single reduce call
+        while sum(len(summary) for summary in summaries) > self.reduce_chars and len(summaries) > 1:
+            groups, group, size = [], [], 0
+            for summary in summaries:
+                if group and size + len(summary) > self.reduce_chars:
+                    groups.append(group)
+                    group, size = [], 0
+                group.append(summary)
+                size += len(summary)
+            groups.append(group)
+            if len(groups) == len(summaries):
+                break
+            summaries = await chain.abatch(
+                [{"summaries": "\n\n".join(group), "text_query": text_query} for group in groups],
+                config={"max_concurrency": self.max_concurrency}
+            )
+        return await chain.ainvoke({"summaries": "\n\n".join(summaries), "text_query": text_query})
+
+    async def build(self, pages: List[Any], text_query: Optional[str] = "") -> Dict[str, Any]:
+        """Summarize chunks concurrently, then reduce them into one brief"""
+        text_query = text_query or "(none; summarize the document generally)"
+        chunks = self.chunk_pages(pages)
+        summaries = await self._map(chunks, text_query)
+        if not summaries:
+            raise RuntimeError("Every section summary failed; the document brief could not be built")
+        return {
+            "brief": await self._reduce(summaries, text_query),
+            "chunks": len(chunks),
+            "summarized_chunks": len(summaries),
+        }
@@ -1,36 +1,55 @@
+import re
 from typing import TypedDict, List, Dict, Any, Optional, Union
 from langchain_core.messages import AIMessage, HumanMessage
 
 class EnhancedAgentState(TypedDict):
     """Enhanced state management for the Legal AI Assistant"""
+    # Plain text for text queries; a BlobStore handle for uploaded image/PDF bytes
     input: Any
     input_type: str
+    text_query: Optional[str]
     processed_input: Optional[Dict[str, Any]]
     query_details: Optional[Dict[str, Any]]
     document_search_results: Optional[List[Dict[str, Any]]]
+    document_search_evaluation: Optional[Dict[str, Any]]
     document_search_sufficient: Optional[bool]
     web_search_results: Optional[List[Dict[str, Any]]]
+    web_search_evaluation: Optional[Dict[str, Any]]
     web_search_sufficient: Optional[bool]
     need_additional_search: Optional[bool]
     final_response: Optional[str]
     references: Optional[List[str]]
     conversation_history: List[Union[HumanMessage, AIMessage]]
 
+def relevance_score(evaluation: Optional[Dict[str, Any]]) -> float:
+    """The LLM's 0-10 "Relevance Score" as a number; it may come back as 8, "8", "8/10" or "80 out of 100".
+
+    Anything unparseable counts as 0, so the search is treated as insufficient.
+    """
+    score = (evaluation or {}).get("Relevance Score", 0)
+    if isinstance(score, bool):
+        return 0.0
+    if isinstance(score, (int, float)):
+        return float(score)
+    match = re.search(r"(\d+(?:\.\d+)?)(?:\s*(?:/|out of)\s*(\d+(?:\.\d+)?))?", str(score))
+    if match is None:
+        return 0.0
+    value, scale = float(match.group(1)), match.group(2)
+    # A score given on another scale is brought back to 0-10
+    return value * 10 / float(scale) if scale and float(scale) > 0 else value
+
+
 def determine_search_sufficiency(state: EnhancedAgentState, search_type: str, threshold: float = 7.0) -> Dict[str, Any]:
     """Determine if search results are sufficient based on relevance score"""
     if search_type == "document":
-        evaluation = state.get("document_search_evaluation", {})
-        relevance_score = evaluation.get("Relevance Score", 0)
-        sufficient = relevance_score >= threshold
+        sufficient = relevance_score(state.get("document_search_evaluation")) >= threshold
         
         return {
             "document_search_sufficient": sufficient,
             "need_additional_search": not sufficient
         }
     elif search_type == "web":
-        evaluation = state.get("web_search_evaluation", {})
-        relevance_score = evaluation.get("Relevance Score", 0)
-        sufficient = relevance_score >= threshold
+        sufficient = relevance_score(state.get("web_search_evaluation")) >= threshold
         
         return {
             "web_search_sufficient": sufficient,
@@ -4,7 +4,7 @@ import time
 import warnings
 from dotenv import load_dotenv
 import asyncio
-from typing import Dict, Any, List, Optional, Union
+from typing import Dict, Any, List, Optional, Union, Callable
 from PIL import Image
 
 # Importing necessary libraries
@@ -12,14 +12,11 @@ from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 from langchain_core.output_parsers import JsonOutputParser
-from tavily import TavilyClient
-from langchain_core.runnables import RunnablePassthrough, RunnableParallel
+from tavily import AsyncTavilyClient
+from langchain_core.runnables import RunnablePassthrough, RunnableParallel, RunnableConfig
 from langchain_core.tools import Tool
-from langgraph.graph import StateGraph, END
 from typing import TypedDict, List, Optional
-
-import networkx as nx
-import matplotlib.pyplot as plt
+from contextlib import contextmanager
 
 # Load environment variables
 load_dotenv()
@@ -27,22 +24,47 @@ load_dotenv()
 # Import our custom modules
 from processing.document_processing import DocumentProcessor
 from processing.multimodal_handler import MultimodalInputHandler
+from processing.extraction_pool import ExtractionPool
+from processing.extraction_cache import ExtractionCache
+from processing.metadata_tagging import filters_from_query
+from retrieval.metadata_filter import build_weaviate_filter
+from agent.blob_store import BlobStore, lean_extraction, history_message
+from agent.batch_memo import BatchMemo
+from agent.request_budget import RequestBudget
+from agent.document_brief import DocumentBriefBuilder
 from agent.enhanced_agent_state import EnhancedAgentState, determine_search_sufficiency
 
 class LegalAIAssistant:
     def __init__(self):
-        self.llm = ChatGroq(
-            model="llama3-70b-8192",
-            temperature=0.6,
-            api_key=os.getenv("GROQ_API_KEY")
-        )
+        # Seconds spent building each component, reported by benchmarks/startup_profile.py
+        self.startup_timings: Dict[str, float] = {}
+
+        with self._timed("llm_client"):
+            self.llm = ChatGroq(
+                model="llama3-70b-8192",
+                temperature=0.6,
+                api_key=os.getenv("GROQ_API_KEY")
+            )
         
-        self.tavily_client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
+        with self._timed("web_search_client"):
+            self.tavily_client = AsyncTavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
     
-        self.document_processor = DocumentProcessor(documents_dir="")
-        self.vector_store = self.document_processor.create_vector_store()
-
-        self.input_handler = MultimodalInputHandler()
+        with self._timed("document_processor"):
+            self.document_processor = DocumentProcessor(documents_dir="")
+        self.retrieval_backend = os.getenv("RETRIEVAL_BACKEND", "weaviate")
+        with self._timed("vector_store"):
+            if self.retrieval_backend == "local" and os.getenv("HYBRID_SEARCH", "true").lower() == "true":
+                self.vector_store = self.document_processor.create_hybrid_retriever()
+            elif self.retrieval_backend == "local":
+                self.vector_store = self.document_processor.create_local_index()
+            else:
+                self.vector_store = self.document_processor.create_vector_store()
+
+        with self._timed("input_handler"):
+            self.input_handler = MultimodalInputHandler()
+            self.brief_builder = DocumentBriefBuilder(self.llm)
+            self.extraction_pool = ExtractionPool()
+            self.extraction_cache = ExtractionCache(namespace=self.input_handler.settings_fingerprint())
         
         self.query_understanding_system = """You are an expert legal AI assistant specializing in understanding complex legal queries.
         Your task is to analyze the user's input and break it down into components that will guide a comprehensive legal search and response.
@@ -93,6 +115,35 @@ class LegalAIAssistant:
         # Initialize prompts
         self._initialize_prompts()
     
+    @contextmanager
+    def _timed(self, component: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.startup_timings[component] = round(time.perf_counter() - start, 3)
+
+    def warm_up(self):
+        """Load what construction left lazy (the embedding model, the agent graph) before the first query needs it"""
+        with self._timed("embedding_model"):
+            self.document_processor.embeddings.embed_query("warm up")
+        with self._timed("agent_graph"):
+            self.build_workflow()
+
+    def before_fork(self):
+        """Drop per-process resources so API workers can be forked from a preloaded assistant"""
+        self.extraction_pool.close()
+        self.document_processor.before_fork()
+
+    def after_fork(self):
+        """Reopen per-process resources in a forked worker; the models stay shared with the parent"""
+        self.document_processor.after_fork()
+
+    def close(self):
+        """Release long-lived connections and worker processes held by the assistant"""
+        self.extraction_pool.close()
+        self.document_processor.close()
+
     def _initialize_prompts(self):
         """Initialize all prompts used by the assistant"""
         # Query Understanding Prompt
@@ -173,14 +224,17 @@ class LegalAIAssistant:
             """)
         ])
     
-    def process_input_node(self, state: EnhancedAgentState) -> Dict[str, Any]:
+    async def process_input_node(self, state: EnhancedAgentState, config: RunnableConfig) -> Dict[str, Any]:
         """Process the input based on its type"""
-        if state.get('text_query') and state['input_type'] in ["image", "pdf"]:
-            processed_input = self.input_handler.process_input(
-                state['input'], 
-                state['input_type'],
-                text_query=state.get('text_query')
+        blobs = config["configurable"]["blobs"]
+        budget = self._budget(config)
+        budget.check("input processing")
+        if state['input_type'] in ["image", "pdf"]:
+            extraction = await budget.run(
+                "document extraction",
+                self.extract_document(blobs.get(state['input']), state['input_type'], state.get('text_query'))
             )
+            processed_input = lean_extraction(extraction, blobs)
         else:
             processed_input = self.input_handler.process_input(
                 state['input'], 
@@ -191,16 +245,62 @@ class LegalAIAssistant:
             state['conversation_history'] = []
         
         return {"processed_input": processed_input}
-    
-    def understand_query_node(self, state: EnhancedAgentState) -> Dict[str, Any]:
+
+    async def extract_document(self, data: Any, input_type: str, text_query: Optional[str] = "") -> Dict[str, Any]:
+        """Extract text from an upload, reusing the cached extraction of identical bytes"""
+        if not isinstance(data, (str, bytes, bytearray, memoryview)):
+            return await self.extraction_pool.run(input_type, data, text_query=text_query)
+
+        key = await asyncio.to_thread(self.extraction_cache.key_for, input_type, data)
+        extraction = await asyncio.to_thread(self.extraction_cache.get, key)
+        if extraction is None:
+            # OCR and PDF parsing run in the extraction pool so they never block the event loop
+            extraction = await self.extraction_pool.run(input_type, data)
+            await asyncio.to_thread(self.extraction_cache.put, key, extraction)
+
+        if self.brief_builder.is_long(extraction):
+            extraction = await self.summarize_long_document(extraction, text_query)
+        return MultimodalInputHandler.attach_query(extraction, text_query)
+
+    async def summarize_long_document(self, extraction: Dict[str, Any], text_query: Optional[str] = "") -> Dict[str, Any]:
+        """Replace the raw text of a long upload with a map-reduced brief that fits the later prompts"""
+        brief = await self.brief_builder.build(extraction["metadata"]["documents"], text_query)
+        print(f"Condensed {len(extraction['content'])} characters into a {len(brief['brief'])} character brief from {brief['chunks']} chunks")
+        return {
+            **extraction,
+            "content": brief["brief"],
+            "metadata": {
+                **extraction["metadata"],
+                "document_brief": True,
+                "original_chars": len(extraction["content"]),
+                "brief_chunks": brief["chunks"],
+                "summarized_chunks": brief["summarized_chunks"]
+            }
+        }
+
+    @staticmethod
+    def _budget(config: Optional[RunnableConfig]) -> RequestBudget:
+        """The request's deadline budget; graphs run without one get the default deadline"""
+        configurable = (config or {}).setdefault("configurable", {})
+        if configurable.get("budget") is None:
+            configurable["budget"] = RequestBudget()
+        return configurable["budget"]
+
+    async def _memoized(self, config: Optional[RunnableConfig], kind: str, key: Any, compute):
+        """Share a lookup across the queries of a batch; single queries just compute it"""
+        memo = (config or {}).get("configurable", {}).get("memo")
+        if memo is None:
+            return await compute()
+        return await memo.get_or_compute(kind, key, compute)
+
+    async def understand_query_node(self, state: EnhancedAgentState, config: RunnableConfig) -> Dict[str, Any]:
         """Node for understanding the query"""
+        budget = self._budget(config)
+        budget.check("query understanding")
         chain = self.query_understanding_prompt | self.llm | JsonOutputParser()
 
-        human_message = HumanMessage(
-            content=state['processed_input']['content'],
-            additional_kwargs={"timestamp": time.time()}
-        )
-        state['conversation_history'].append(human_message)
+        # History is resent with every later turn, so an upload is remembered by excerpt, not in full
+        state['conversation_history'].append(history_message(state['processed_input']))
         max_history_size = 10 
         if len(state['conversation_history']) > max_history_size:
             state['conversation_history'] = state['conversation_history'][-max_history_size:]
@@ -208,23 +308,50 @@ class LegalAIAssistant:
         recent_context = state['conversation_history'][-3:]
 
         context_enhanced_query = state['processed_input']['content']
-        query_details = chain.invoke({"processed_input": context_enhanced_query})
+        query_details = await self._memoized(
+            config, "understanding", context_enhanced_query,
+            lambda: budget.run("query understanding", chain.ainvoke({"processed_input": context_enhanced_query}))
+        )
         
         return {
             "query_details": query_details,
             "conversation_history": state['conversation_history']
         }
 
-    def document_search_node(self, state: EnhancedAgentState) -> Dict[str, Any]:
+    def _search_multi(self, queries: List[str], k: int, filters: Optional[Dict[str, List[str]]] = None) -> List[Any]:
+        """One batched embedding call and one ranked, deduplicated list for all queries"""
+        if self.retrieval_backend == "weaviate":
+            return self.document_processor.search_collection_multi(queries, k=k, filters=build_weaviate_filter(filters))
+        return self.vector_store.similarity_search_multi(queries, k=k, filters=filters)
+
+    def search_documents(self, queries: Union[str, List[str]], k: int = 5, filters: Optional[Dict[str, List[str]]] = None) -> List[Any]:
+        """Similarity search narrowed by metadata filters, topped up unfiltered if too few match"""
+        queries = [queries] if isinstance(queries, str) else queries
+        if not filters:
+            return self._search_multi(queries, k)
+
+        results = self._search_multi(queries, k, filters)
+        if len(results) < k:
+            seen = {doc.metadata.get('chunk_id') for doc, _ in results}
+            for doc, score in self._search_multi(queries, k):
+                if doc.metadata.get('chunk_id') not in seen and len(results) < k:
+                    results.append((doc, score))
+        return results
+
+    async def document_search_node(self, state: EnhancedAgentState, config: RunnableConfig) -> Dict[str, Any]:
         """Node for searching legal documents"""
+        budget = self._budget(config)
+        budget.check("document search")
         key_terms = state['query_details'].get('key_terms', [])
         core_issue = state['query_details'].get('core_legal_issue', '')
         
         search_query = f"{core_issue} {' '.join(key_terms)}"
+        subqueries = [str(subquery) for subquery in state['query_details'].get('subqueries') or [] if subquery]
 
-        search_results = self.vector_store.similarity_search_with_score(
-            query=search_query,
-            k=5,
+        queries, filters = [search_query] + subqueries, filters_from_query(state['query_details'])
+        search_results = await self._memoized(
+            config, "retrieval", [queries, filters],
+            lambda: budget.run("document search", asyncio.to_thread(self.search_documents, queries, k=5, filters=filters))
         )
 
         document_search_results = [
@@ -232,16 +359,20 @@ class LegalAIAssistant:
                 "source": result[0].metadata.get('source', 'Unknown'),
                 "page": result[0].metadata.get('page', 0),
                 "relevance_score": result[1],
-                "content": result[0].page_content
+                "content": result[0].page_content,
+                "also_found_in": result[0].metadata.get('sources', [])[1:]
             }
             for result in search_results
         ]
 
-        chain = self.document_evaluation_prompt | self.llm | JsonOutputParser()
-        document_evaluation = chain.invoke({
-            "query_details": state['query_details'],
-            "document_search_results": document_search_results
-        })
+        # The evaluation only steers the extra searches, so it is the first thing a tight deadline drops
+        document_evaluation = {}
+        if budget.allows("document evaluation"):
+            chain = self.document_evaluation_prompt | self.llm | JsonOutputParser()
+            document_evaluation = await budget.run_optional("document evaluation", chain.ainvoke({
+                "query_details": state['query_details'],
+                "document_search_results": document_search_results
+            }), default={})
         
         return {
             "document_search_results": document_search_results,
@@ -252,24 +383,34 @@ class LegalAIAssistant:
         """Node for evaluating document search results and deciding next steps"""
         return determine_search_sufficiency(state, "document")
 
-    def web_search_node(self, state: EnhancedAgentState) -> Dict[str, Any]:
+    async def web_search_node(self, state: EnhancedAgentState, config: RunnableConfig) -> Dict[str, Any]:
         """Node for web searching"""
+        budget = self._budget(config)
+        budget.check("web search")
+        if not budget.allows("web search"):
+            return {"web_search_results": [], "web_search_evaluation": {}}
+
         core_issue = state['query_details'].get('core_legal_issue', '')
         jurisdiction = state['query_details'].get('jurisdiction', '')
         
         web_query = f"{core_issue} legal {jurisdiction}"
         
-        web_search_results = self.tavily_client.search(
-            query=web_query, 
-            max_results=5,
-            search_depth="advanced"
-        )
-        
-        chain = self.web_evaluation_prompt | self.llm | JsonOutputParser()
-        web_search_evaluation = chain.invoke({
-            "query_details": state['query_details'],
-            "web_search_results": web_search_results['results']
-        })
+        web_search_results = await budget.run_optional("web search", self._memoized(
+            config, "web", [web_query, 5],
+            lambda: self.tavily_client.search(
+                query=web_query, 
+                max_results=5,
+                search_depth="advanced"
+            )
+        ), default={"results": []})
+
+        web_search_evaluation = {}
+        if web_search_results['results'] and budget.allows("web evaluation"):
+            chain = self.web_evaluation_prompt | self.llm | JsonOutputParser()
+            web_search_evaluation = await budget.run_optional("web evaluation", chain.ainvoke({
+                "query_details": state['query_details'],
+                "web_search_results": web_search_results['results']
+            }), default={})
         
         return {
             "web_search_results": web_search_results['results'],
@@ -280,18 +421,20 @@ class LegalAIAssistant:
         """Node for evaluating web search results and deciding next steps"""
         return determine_search_sufficiency(state, "web")
 
-    def generate_final_response_node(self, state: EnhancedAgentState) -> Dict[str, Any]:
+    async def generate_final_response_node(self, state: EnhancedAgentState, config: RunnableConfig) -> Dict[str, Any]:
         """Node for generating final comprehensive response"""
+        budget = self._budget(config)
+        budget.check("response generation")
         recent_conversation = state['conversation_history'][-5:]
 
         chain = self.final_response_prompt | self.llm
-        final_response = chain.invoke({
+        final_response = await budget.run("response generation", chain.ainvoke({
             "processed_input": state['processed_input']['content'],
             "query_details": state['query_details'],
             "document_search_results": state['document_search_results'],
-            "web_search_results": state['web_search_results'],
+            "web_search_results": state.get('web_search_results', []),
             "recent_conversation": recent_conversation
-        })
+        }))
 
         ai_message = AIMessage(
             content=final_response.content,
@@ -306,6 +449,9 @@ class LegalAIAssistant:
             page = doc.get('page', '')
             if source and source not in references:
                 references.append(f"{source} (Page {page})")
+            for reference in doc.get('also_found_in', []):
+                if reference not in references:
+                    references.append(reference)
         
         for result in state.get('web_search_results', []):
             url = result.get('url', '')
@@ -318,8 +464,13 @@ class LegalAIAssistant:
             "conversation_history": state['conversation_history']
         }
     
-    def additional_search_node(self, state: EnhancedAgentState) -> Dict[str, Any]:
+    async def additional_search_node(self, state: EnhancedAgentState, config: RunnableConfig) -> Dict[str, Any]:
         """Node for performing additional searches when needed"""
+        budget = self._budget(config)
+        budget.check("additional search")
+        current_web_results = state.get('web_search_results', [])
+        if not budget.allows("additional search"):
+            return {"web_search_results": current_web_results, "need_additional_search": False}
 
         doc_eval = state.get('document_search_evaluation', {})
         web_eval = state.get('web_search_evaluation', {})
@@ -329,21 +480,34 @@ class LegalAIAssistant:
         
 
         all_gaps = info_gaps_doc + info_gaps_web
-        
-        additional_results = []
-        for gap in all_gaps:
-            if isinstance(gap, str) and gap.strip():
-                try:
-                    gap_results = self.tavily_client.search(
-                        query=f"{gap} legal information {state['query_details'].get('jurisdiction', '')}",
+        gap_queries = [
+            f"{gap} legal information {state['query_details'].get('jurisdiction', '')}"
+            for gap in all_gaps if isinstance(gap, str) and gap.strip()
+        ]
+
+        async def search_gap(gap_query: str) -> List[Dict[str, Any]]:
+            try:
+                gap_results = await self._memoized(
+                    config, "web", [gap_query, 2],
+                    lambda: self.tavily_client.search(
+                        query=gap_query,
                         max_results=2,
                         search_depth="advanced"
                     )
-                    additional_results.extend(gap_results['results'])
-                except Exception as e:
-                    print(f"Error in additional search: {e}")
+                )
+                return gap_results['results']
+            except Exception as e:
+                print(f"Error in additional search: {e}")
+                return []
+
+        # The gap searches are independent, so they share the remaining budget instead of queuing for it
+        gap_results = await budget.run_optional(
+            "additional search",
+            asyncio.gather(*(search_gap(gap_query) for gap_query in gap_queries)),
+            default=[]
+        )
+        additional_results = [result for results in gap_results for result in results]
         
-        current_web_results = state.get('web_search_results', [])
         combined_results = current_web_results + additional_results
 
         seen_urls = set()
@@ -367,6 +531,8 @@ class LegalAIAssistant:
     
     def build_workflow(self):
         """Construct the agentic workflow using LangGraph with decision points"""
+        from langgraph.graph import StateGraph
+
         workflow = StateGraph(EnhancedAgentState)
         
         # Add all nodes
@@ -412,7 +578,7 @@ class LegalAIAssistant:
         
         return workflow.compile()
     
-    def visualize_workflow(self, graph: StateGraph):
+    def visualize_workflow(self, graph: Any):
         """Visualize the LangGraph workflow with decision points and save it to a file."""
         
         try:
@@ -423,15 +589,34 @@ class LegalAIAssistant:
         except Exception as e:
             print("Error:", e)
 
-    async def process_query(self, query: Any, input_type: str = "text", text_query: str = "", conversation_history=None):
-        """Async method to process user query with any input type"""
+    async def process_query(
+        self,
+        query: Any,
+        input_type: str = "text",
+        text_query: str = "",
+        conversation_history=None,
+        memo: Optional[BatchMemo] = None,
+        deadline: Optional[float] = None,
+        is_cancelled: Optional[Callable[[], bool]] = None
+    ):
+        """Async method to process user query with any input type.
+
+        A memo shares lookups across a batch; deadline (seconds) bounds the whole graph, and optional
+        stages are skipped as it runs low. is_cancelled is checked between nodes.
+        """
+        budget = RequestBudget(deadline, is_cancelled)
         workflow = self.build_workflow()
+        # Uploads and extracted pages live here for the request; the state only carries handles to them
+        blobs = BlobStore()
         initial_state = {
-            "input": query,
+            "input": query if input_type == "text" else blobs.put(query, "input"),
             "input_type": input_type,
             "text_query": text_query, 
             "conversation_history": conversation_history or []
         }
         
-        result = await workflow.ainvoke(initial_state)
-        return result
\ No newline at end of file
+        try:
+            result = await workflow.ainvoke(initial_state, config={"configurable": {"blobs": blobs, "memo": memo, "budget": budget}})
+        finally:
+            blobs.clear()
+        return {**result, "skipped_stages": budget.skipped}
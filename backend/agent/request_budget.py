@@ -0,0 +1,65 @@
+import os
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional
+
+
+class QueryCancelled(Exception):
+    """Raised at a node boundary once the task has been cancelled by its client"""
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a required stage cannot finish inside the request's deadline"""
+
+
+class RequestBudget:
+    """Time left for one query; optional stages give way before the final answer runs out of time"""
+
+    def __init__(
+        self,
+        seconds: Optional[float] = None,
+        is_cancelled: Optional[Callable[[], bool]] = None,
+        response_reserve: Optional[float] = None,
+        optional_stage_min: Optional[float] = None
+    ):
+        seconds = seconds or float(os.environ.get("QUERY_DEADLINE", "120"))
+        self.deadline = time.monotonic() + seconds
+        self.is_cancelled = is_cancelled
+        # Kept back for the final response, which is the one stage a user cannot do without
+        self.response_reserve = response_reserve if response_reserve is not None else float(os.environ.get("RESPONSE_RESERVE_SECONDS", "15"))
+        self.optional_stage_min = optional_stage_min if optional_stage_min is not None else float(os.environ.get("OPTIONAL_STAGE_MIN_SECONDS", "5"))
+        self.skipped: List[str] = []
+
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
+
+    def check(self, stage: str):
+        """Stop between nodes if the client cancelled or the deadline has already passed"""
+        if self.is_cancelled and self.is_cancelled():
+            raise QueryCancelled(f"Query cancelled before {stage}")
+        if self.remaining() <= 0:
+            raise DeadlineExceeded(f"Query deadline passed before {stage}")
+
+    def allows(self, stage: str) -> bool:
+        """Whether an optional stage still fits in front of the response reserve; records it as skipped if not"""
+        if self.remaining() - self.response_reserve >= self.optional_stage_min:
+            return True
+        self.skipped.append(stage)
+        print(f"Skipping {stage}: {self.remaining():.1f}s left of the query deadline")
+        return False
+
+    async def run(self, stage: str, call: Awaitable[Any]) -> Any:
+        """Await a required external call, cancelling it at the deadline"""
+        try:
+            return await asyncio.wait_for(call, timeout=max(self.remaining(), 0.001))
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"{stage} did not finish before the query deadline") from None
+
+    async def run_optional(self, stage: str, call: Awaitable[Any], default: Any = None) -> Any:
+        """Await an optional external call, giving up on it before it eats into the response reserve"""
+        try:
+            return await asyncio.wait_for(call, timeout=max(self.remaining() - self.response_reserve, 0.001))
+        except asyncio.TimeoutError:
+            self.skipped.append(stage)
+            print(f"Gave up on {stage} to stay inside the query deadline")
+            return default
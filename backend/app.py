@@ -1,40 +1,94 @@
 import os
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 import uvicorn
 import asyncio
 from dotenv import load_dotenv
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Union, Callable, Awaitable, Tuple
 import base64
 from io import BytesIO
 from PIL import Image
 import time
+import json
 
 load_dotenv()
 
 from metrics.legal_metrics_api import register_legal_metrics_endpoints
-from agent.legal_ai_assistant import LegalAIAssistant
+from agent.batch_memo import BatchMemo
+from agent.request_budget import QueryCancelled, DeadlineExceeded
+from tasks.task_store import create_task_store, new_task_id
+from tasks.job_queue import JobQueue, JobQueueFull
+from tasks.notifier import TaskNotifier, TERMINAL_STATUSES
+from tasks.status_response import StatusResponder, status_body, status_version
+from processing.uploads import UploadRejected, UploadSizeLimitMiddleware, receive_upload, discard_upload
 
 legal_assistant = None
-active_tasks = {}
+task_store = None
+job_queue = None
+task_notifier = TaskNotifier()
+status_responder = StatusResponder()
+UPLOAD_SPOOL_THRESHOLD = int(os.environ.get("UPLOAD_SPOOL_THRESHOLD", os.environ.get("PDF_SPOOL_THRESHOLD", str(16 * 1024 * 1024))))
+MAX_UPLOAD_BYTES = {
+    "image": int(os.environ.get("MAX_IMAGE_UPLOAD_BYTES", str(20 * 1024 * 1024))),
+    "pdf": int(os.environ.get("MAX_PDF_UPLOAD_BYTES", str(100 * 1024 * 1024))),
+}
+MAX_LONG_POLL = float(os.environ.get("MAX_LONG_POLL", "60"))
+# Re-read the store this often while waiting, for tasks run by another worker process
+TASK_WATCH_RECHECK = float(os.environ.get("TASK_WATCH_RECHECK", "5"))
+SSE_HEARTBEAT = float(os.environ.get("SSE_HEARTBEAT", "15"))
+MAX_BATCH_QUERIES = int(os.environ.get("MAX_BATCH_QUERIES", "100"))
+# Shared by every running batch, so many batches cannot multiply the load on the LLM and search APIs
+batch_slots = asyncio.Semaphore(int(os.environ.get("BATCH_CONCURRENCY", "4")))
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global legal_assistant
-    legal_assistant = LegalAIAssistant()
+    global legal_assistant, task_store, job_queue
+    task_store = create_task_store()
+    # Tasks a crashed or restarted worker was holding would otherwise poll as queued or processing until they expire
+    recovered = task_store.recover_orphans()
+    if recovered:
+        print(f"Marked {recovered} tasks left unfinished by an exited worker as failed")
+    warm_up = None
+    if legal_assistant is None:
+        # Imported here: the agent stack is the bulk of the backend's import time
+        from agent.legal_ai_assistant import LegalAIAssistant
+        legal_assistant = LegalAIAssistant()
+        # The embedding model and graph load in the background; the first query waits on them only if it beats them
+        warm_up = asyncio.create_task(warm_up_assistant())
+    else:
+        # Preloaded by the launcher in main.py before this worker was forked
+        legal_assistant.after_fork()
+    job_queue = JobQueue()
+    job_queue.start()
     print("Legal AI Assistant initialized")
     cleanup_task = asyncio.create_task(cleanup_tasks())
+    health_task = asyncio.create_task(weaviate_health_checks())
     
     yield
     
-    cleanup_task.cancel()
-    try:
-        await cleanup_task
-    except asyncio.CancelledError:
-        pass
+    for task in (cleanup_task, health_task, warm_up):
+        if task is None:
+            continue
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    await job_queue.stop()
+    legal_assistant.close()
+    task_store.close()
+
+def preload_assistant():
+    """Build the assistant in the launcher process so forked workers share its memory copy-on-write"""
+    global legal_assistant
+    from agent.legal_ai_assistant import LegalAIAssistant
+    legal_assistant = LegalAIAssistant()
+    # Everything a worker would otherwise load lazily is loaded once here and shared
+    legal_assistant.warm_up()
+    legal_assistant.before_fork()
 
 app = FastAPI(title="Legal AI Assistant API", lifespan=lifespan)
 
@@ -46,180 +100,373 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    limits={"/query/image": MAX_UPLOAD_BYTES["image"], "/query/pdf": MAX_UPLOAD_BYTES["pdf"]},
+)
+
 register_legal_metrics_endpoints(app)
 
+def reject_if_extraction_busy():
+    """Turn uploads away up front rather than queue them behind a full extraction pool"""
+    if legal_assistant.extraction_pool.is_full:
+        raise HTTPException(status_code=503, detail="Document extraction queue is full, retry shortly", headers={"Retry-After": "10"})
+
+def is_spooled(query_data: Any, input_type: str) -> bool:
+    return input_type in ("image", "pdf") and isinstance(query_data, str)
+
+async def read_upload(request: Request, input_type: str) -> Tuple[Union[bytes, str], Optional[str], Optional[List[Dict[str, Any]]]]:
+    """The upload, query and history of a multipart request.
+
+    Small uploads are handled in memory; large ones spill to a temp file the worker reads by path.
+    """
+    try:
+        contents, filename, fields = await receive_upload(
+            request, input_type, input_type, MAX_UPLOAD_BYTES[input_type], UPLOAD_SPOOL_THRESHOLD
+        )
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    try:
+        if input_type == "pdf" and not (filename or "").lower().endswith(".pdf"):
+            raise HTTPException(status_code=400, detail="Uploaded file must be a PDF")
+        if input_type == "image":
+            try:
+                Image.open(contents if isinstance(contents, str) else BytesIO(contents)).verify()
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=f"Invalid image: {str(e)}")
+        history = parse_history(fields.get("conversation_history"))
+    except HTTPException:
+        discard_upload(contents)
+        raise
+    return contents, fields.get("query"), history
+
+def parse_history(conversation_history: Optional[str]) -> Optional[List[Dict[str, Any]]]:
+    if not conversation_history:
+        return None
+    try:
+        return json.loads(conversation_history)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid conversation history format: {str(e)}")
+
 class TextQueryRequest(BaseModel):
     query: str
     conversation_history: Optional[List[Dict[str, Any]]] = None
 
+class BatchQueryRequest(BaseModel):
+    queries: List[TextQueryRequest]
+
 class QueryResponse(BaseModel):
     task_id: str
     status: str
     response: Optional[Dict[str, Any]] = None
+    queue: Optional[Dict[str, Any]] = None
+
+def enqueue_task(input_type: str, run: Callable[[str], Awaitable[Any]], on_reject: Optional[Callable[[], None]] = None) -> QueryResponse:
+    """Admit a job into the bounded job queue, or turn it away with 429 while the queue is full.
+
+    on_reject also runs if the task is cancelled before it starts.
+    """
+    task_id = new_task_id()
+    task_store.create(task_id, status="queued")
+    try:
+        job_queue.submit(task_id, input_type, lambda: run(task_id), on_discard=on_reject)
+    except JobQueueFull as e:
+        task_store.delete(task_id)
+        if on_reject:
+            on_reject()
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return QueryResponse(task_id=task_id, status="queued", queue=job_queue.job_status(task_id))
+
+def enqueue_query(query_data: Any, input_type: str, text_query: Optional[str], history: Optional[List[Dict[str, Any]]]) -> QueryResponse:
+    """Queue a single query; a spooled upload is removed if the query is turned away"""
+    on_reject = (lambda: os.unlink(query_data)) if is_spooled(query_data, input_type) else None
+    return enqueue_task(
+        input_type,
+        lambda task_id: process_query_async(task_id, query_data, input_type, text_query, history),
+        on_reject
+    )
 
 @app.post("/query/text", response_model=QueryResponse)
-async def text_query(background_tasks: BackgroundTasks, request: TextQueryRequest):
+async def text_query(request: TextQueryRequest):
     """Process a text-based legal query"""
     if not legal_assistant:
         raise HTTPException(status_code=503, detail="Legal AI Assistant not initialized")
     
-    task_id = f"task_{int(time.time())}"
+    return enqueue_query(request.query, "text", None, request.conversation_history)
 
-    active_tasks[task_id] = {"status": "processing", "response": None}
+@app.post("/query/batch", response_model=QueryResponse)
+async def batch_query(request: BatchQueryRequest):
+    """Process many text queries as one task, sharing identical lookups between them"""
+    if not legal_assistant:
+        raise HTTPException(status_code=503, detail="Legal AI Assistant not initialized")
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="A batch needs at least one query")
+    if len(request.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"A batch can hold at most {MAX_BATCH_QUERIES} queries")
 
-    background_tasks.add_task(
-        process_query_async,
-        task_id,
-        request.query,
-        "text",
-        None,
-        request.conversation_history
-    )
-    
-    return QueryResponse(task_id=task_id, status="processing")
-
-@app.post("/query/image", response_model=QueryResponse)
-async def image_query(
-    background_tasks: BackgroundTasks, 
-    image: UploadFile = File(...), 
-    query: str = Form(None),
-    conversation_history: str = Form(None)
-):
+    return enqueue_task("batch", lambda task_id: process_batch_async(task_id, request.queries))
+
+def upload_form_schema(file_field: str) -> Dict[str, Any]:
+    """OpenAPI description of the multipart form the upload endpoints parse themselves"""
+    return {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+        "type": "object",
+        "required": [file_field],
+        "properties": {
+            file_field: {"type": "string", "format": "binary"},
+            "query": {"type": "string"},
+            "conversation_history": {"type": "string", "description": "JSON list of prior messages"},
+        },
+    }}}}}
+
+# The form is parsed off the request stream in read_upload, so FastAPI does not spool a copy of the file first
+@app.post("/query/image", response_model=QueryResponse, openapi_extra=upload_form_schema("image"))
+async def image_query(request: Request):
     """Process an image-based legal query (e.g., a document photo)"""
     if not legal_assistant:
         raise HTTPException(status_code=503, detail="Legal AI Assistant not initialized")
 
-    contents = await image.read()
-    try:
-        img = Image.open(BytesIO(contents))
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Invalid image: {str(e)}")
+    reject_if_extraction_busy()
+    contents, query, history = await read_upload(request, "image")
+    return enqueue_query(contents, "image", query, history)
 
-    task_id = f"task_{int(time.time())}"
-    
-    active_tasks[task_id] = {"status": "processing", "response": None}
-
-    history = None
-    if conversation_history:
-        try:
-            import json
-            history = json.loads(conversation_history)
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Invalid conversation history format: {str(e)}")
-    
-    background_tasks.add_task(
-        process_query_async,
-        task_id,
-        img,
-        "image",
-        query,
-        history
-    )
-    
-    return QueryResponse(task_id=task_id, status="processing")
-
-@app.post("/query/pdf", response_model=QueryResponse)
-async def pdf_query(
-    background_tasks: BackgroundTasks, 
-    pdf: UploadFile = File(...), 
-    query: str = Form(None),
-    conversation_history: str = Form(None)
-):
+@app.post("/query/pdf", response_model=QueryResponse, openapi_extra=upload_form_schema("pdf"))
+async def pdf_query(request: Request):
     """Process a PDF-based legal query"""
     if not legal_assistant:
         raise HTTPException(status_code=503, detail="Legal AI Assistant not initialized")
-    
-    contents = await pdf.read()
-    if not pdf.filename.lower().endswith('.pdf'):
-        raise HTTPException(status_code=400, detail="Uploaded file must be a PDF")
-    
-    task_id = f"task_{int(time.time())}"
 
-    active_tasks[task_id] = {"status": "processing", "response": None}
+    reject_if_extraction_busy()
+    contents, query, history = await read_upload(request, "pdf")
+    return enqueue_query(contents, "pdf", query, history)
 
-    history = None
-    if conversation_history:
-        try:
-            import json
-            history = json.loads(conversation_history)
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Invalid conversation history format: {str(e)}")
-
-    background_tasks.add_task(
-        process_query_async,
-        task_id,
-        contents,
-        "pdf",
-        query,
-        history
-    )
-    
-    return QueryResponse(task_id=task_id, status="processing")
+def task_is_cancelled(task_id: str) -> bool:
+    task_info = task_store.get(task_id)
+    return task_info is not None and task_info["status"] == "cancelled"
 
-@app.get("/query/status/{task_id}", response_model=QueryResponse)
-async def query_status(task_id: str):
-    """Check the status of a processing task"""
-    if task_id not in active_tasks:
-        raise HTTPException(status_code=404, detail="Task not found")
-    
-    task_info = active_tasks[task_id]
+def set_task_status(task_id: str, status: str, response: Optional[Dict[str, Any]] = None):
+    """Persist a task transition and wake anyone long-polling or subscribed to it"""
+    # A pipeline finishing after its client cancelled must not overwrite the cancellation
+    if status != "cancelled" and task_is_cancelled(task_id):
+        return
+    task_store.update(task_id, status, response)
+    task_notifier.publish(task_id)
+
+def task_snapshot(task_id: str) -> Optional[QueryResponse]:
+    task_info = task_store.get(task_id)
+    if task_info is None:
+        return None
     return QueryResponse(
         task_id=task_id,
         status=task_info["status"],
-        response=task_info.get("response")
+        response=task_info.get("response"),
+        queue=job_queue.job_status(task_id)
+    )
+
+def task_status_body(task_id: str) -> Optional[Tuple[str, bytes, bytes]]:
+    """Status, response body and ETag version of a task, built from the JSON bytes stored when it last changed"""
+    raw = task_store.get_raw(task_id)
+    if raw is None:
+        return None
+    status, response = raw
+    queue = job_queue.job_status(task_id)
+    return status, status_body(task_id, status, response, queue), status_version(task_id, status, response, queue)
+
+@app.get("/query/status/{task_id}", response_model=QueryResponse)
+async def query_status(request: Request, task_id: str, wait: float = 0, since: Optional[str] = None):
+    """Check the status of a processing task; with wait, hold the request until the status moves on.
+
+    The status moves on when it differs from since, or, without since, when the task finishes.
+    Responses carry an ETag, so a client polling with If-None-Match gets a 304 until something changes.
+    """
+    deadline = time.monotonic() + max(0.0, min(wait, MAX_LONG_POLL))
+    while True:
+        with task_notifier.watch(task_id) as changed:
+            current = task_status_body(task_id)
+            if current is None:
+                raise HTTPException(status_code=404, detail="Task not found")
+            status, body, version = current
+            unchanged = status == since if since else status not in TERMINAL_STATUSES
+            remaining = deadline - time.monotonic()
+            if not unchanged or remaining <= 0:
+                return status_responder.respond(request, body, cacheable=status in TERMINAL_STATUSES, version=version)
+            await task_notifier.wait(changed, min(remaining, TASK_WATCH_RECHECK))
+
+@app.delete("/query/{task_id}", response_model=QueryResponse)
+async def cancel_query(task_id: str):
+    """Cancel a queued or running task and stop its in-flight LLM and search calls"""
+    task_info = task_store.get(task_id)
+    if task_info is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if task_info["status"] in TERMINAL_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Task already {task_info['status']}")
+
+    set_task_status(task_id, "cancelled")
+    # A task held by another worker process stops at its next graph node, when it sees the cancelled status
+    job_queue.cancel(task_id)
+    return task_snapshot(task_id)
+
+@app.get("/query/events/{task_id}")
+async def query_events(task_id: str):
+    """Server-sent events stream of a task's status and progress updates, closed once the task finishes"""
+    if task_store.get(task_id) is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    async def stream():
+        last_version = None
+        while True:
+            with task_notifier.watch(task_id) as changed:
+                current = task_status_body(task_id)
+                if current is None:
+                    yield "event: expired\ndata: {}\n\n"
+                    return
+                status, body, version = current
+                # Progress written under an unchanged status is an update too, e.g. a batch's counts
+                if version != last_version:
+                    last_version = version
+                    yield b"event: status\ndata: " + body + b"\n\n"
+                    if status in TERMINAL_STATUSES:
+                        return
+                if not await task_notifier.wait(changed, SSE_HEARTBEAT):
+                    # Keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 async def process_query_async(task_id: str, query_data: Any, input_type: str, text_query: str = None, conversation_history: List[Dict[str, Any]] = None):
     """Process a query asynchronously and update the task status"""
+    set_task_status(task_id, "processing")
     try:
         if text_query and input_type in ["image", "pdf"]:
             result = await legal_assistant.process_query(
                 query_data, 
                 input_type, 
                 text_query=text_query,
-                conversation_history=conversation_history
+                conversation_history=conversation_history,
+                is_cancelled=lambda: task_is_cancelled(task_id)
             )
         else:
             result = await legal_assistant.process_query(
                 query_data, 
                 input_type,
-                conversation_history=conversation_history
+                conversation_history=conversation_history,
+                is_cancelled=lambda: task_is_cancelled(task_id)
             )
 
-        active_tasks[task_id] = {
-            "status": "completed",
-            "response": {
-                "final_response": result.get("final_response", ""),
-                "references": result.get("references", []),
-                "query_details": result.get("query_details", {}),
-                "conversation_history": result.get("conversation_history", [])
-            }
-        }
+        set_task_status(task_id, "completed", task_result(result))
+    except QueryCancelled:
+        print(f"Task {task_id} cancelled")
+    except DeadlineExceeded as e:
+        set_task_status(task_id, "error", {"error": str(e), "deadline_exceeded": True})
+        print(f"Task {task_id} ran out of time: {e}")
     except Exception as e:
-        active_tasks[task_id] = {
-            "status": "error",
-            "response": {"error": str(e)}
-        }
+        set_task_status(task_id, "error", {"error": str(e)})
         print(f"Error processing task {task_id}: {e}")
+    finally:
+        if is_spooled(query_data, input_type):
+            os.unlink(query_data)
+
+def task_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    # Messages and other pydantic objects are serialized by the task store, once, when the result is stored
+    return {
+        "final_response": result.get("final_response", ""),
+        "references": result.get("references", []),
+        "query_details": result.get("query_details", {}),
+        "conversation_history": result.get("conversation_history", []),
+        "skipped_stages": result.get("skipped_stages", [])
+    }
+
+async def process_batch_async(task_id: str, queries: List[TextQueryRequest]):
+    """Run a batch's queries concurrently; the aggregate task reports counts while running and every item once done"""
+    memo = BatchMemo()
+    items = [{"index": index, "status": "queued"} for index in range(len(queries))]
+
+    def progress(final: bool = False) -> Dict[str, Any]:
+        counts = {status: sum(item["status"] == status for item in items) for status in ("queued", "processing", "completed", "error", "cancelled")}
+        # Rewriting every finished answer after each item would make a batch's store writes grow quadratically
+        summary = {"counts": counts, "shared_lookups": memo.stats()}
+        return {"items": items, **summary} if final else summary
+
+    # Identical questions with identical history are answered once
+    groups: Dict[str, List[int]] = {}
+    for index, query in enumerate(queries):
+        groups.setdefault(json.dumps([query.query, query.conversation_history], sort_keys=True, default=str), []).append(index)
+
+    async def run_group(indexes: List[int]):
+        query = queries[indexes[0]]
+        async with batch_slots:
+            for index in indexes:
+                items[index]["status"] = "processing"
+            try:
+                result = await legal_assistant.process_query(
+                    query.query,
+                    "text",
+                    conversation_history=query.conversation_history,
+                    memo=memo,
+                    is_cancelled=lambda: task_is_cancelled(task_id)
+                )
+                outcome = {"status": "completed", "response": task_result(result)}
+            except QueryCancelled:
+                outcome = {"status": "cancelled"}
+            except Exception as e:
+                print(f"Error processing item {indexes[0]} of batch {task_id}: {e}")
+                outcome = {"status": "error", "error": str(e)}
+        for index in indexes:
+            items[index] = {"index": index, **outcome}
+        set_task_status(task_id, "processing", progress())
+
+    set_task_status(task_id, "processing", progress())
+    try:
+        await asyncio.gather(*(run_group(indexes) for indexes in groups.values()))
+    finally:
+        memo.cancel()
+    summary = progress(final=True)
+    set_task_status(task_id, "error" if summary["counts"]["error"] == len(items) else "completed", summary)
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "ok", "assistant_ready": legal_assistant is not None}
+    health = {"status": "ok", "assistant_ready": legal_assistant is not None}
+    if legal_assistant:
+        health["extraction"] = legal_assistant.extraction_pool.stats()
+        health["extraction_cache"] = legal_assistant.extraction_cache.stats()
+        health["jobs"] = job_queue.stats()
+        health["status_responses"] = status_responder.stats()
+        health["startup_timings"] = legal_assistant.startup_timings
+        health["watched_tasks"] = task_notifier.watched_tasks
+    if legal_assistant and legal_assistant.retrieval_backend == "weaviate":
+        health["weaviate"] = legal_assistant.document_processor.connection.health()
+    return health
+
+async def warm_up_assistant():
+    try:
+        await asyncio.to_thread(legal_assistant.warm_up)
+    except Exception as e:
+        print(f"Warm-up failed; components will load on first use instead: {e}")
+
+async def weaviate_health_checks():
+    """Periodically verify the Weaviate connection and reconnect if it dropped"""
+    if legal_assistant.retrieval_backend != "weaviate":
+        return
+    connection = legal_assistant.document_processor.connection
+    while True:
+        await asyncio.sleep(connection.health_check_interval)
+        healthy = await asyncio.to_thread(connection.ensure_healthy)
+        if not healthy:
+            print("Weaviate connection unhealthy; searches will fail until it recovers")
 
 async def cleanup_tasks():
-    """Periodically clean up old tasks"""
+    """Periodically evict expired tasks"""
+    interval = float(os.environ.get("TASK_EVICTION_INTERVAL", "300"))
     while True:
-        await asyncio.sleep(3600)
-        current_time = time.time()
-        task_ids = list(active_tasks.keys())
-        for task_id in task_ids:
-            try:
-                timestamp = int(task_id.split("_")[1])
-                if current_time - timestamp > 86400:
-                    del active_tasks[task_id]
-            except (IndexError, ValueError):
-                pass
+        await asyncio.sleep(interval)
+        removed = await asyncio.to_thread(task_store.evict_expired)
+        if removed:
+            print(f"Evicted {removed} expired tasks")
 
 if __name__ == "__main__":
     uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,120 @@
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+SAMPLE_TEXTS = [
+    "What are my rights if my neighbor is making excessive noise at night?",
+    "Can my landlord keep my security deposit for normal wear and tear?",
+    "Elements of a breach of contract claim under New York law",
+    "42 U.S.C. § 1983 claims against municipal police departments",
+    "Is a non-compete agreement enforceable in California?",
+    "The tenant shall pay rent on the first day of each month without demand.",
+    "Negligence requires duty, breach, causation and damages.",
+    "Statute of limitations for personal injury claims in Texas",
+    "Wrongful termination after reporting workplace safety violations",
+    "The parties agree that this agreement is governed by the laws of Delaware.",
+    "How do I contest a speeding ticket in traffic court?",
+    "Custody arrangements when one parent relocates to another state",
+]
+
+
+def _rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure_backend(backend: str, documents: int, queries: int) -> Dict[str, Any]:
+    """Load one backend in this process and time imports, loading, queries and bulk encoding"""
+    start = time.perf_counter()
+    from processing.embeddings import create_embeddings
+    import_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    embeddings = create_embeddings(backend)
+    load_seconds = time.perf_counter() - start
+
+    embeddings.embed_query("warm up")
+    latencies = []
+    for i in range(queries):
+        start = time.perf_counter()
+        embeddings.embed_query(SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    corpus = [SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)] * 8 for i in range(documents)]
+    start = time.perf_counter()
+    embeddings.embed_documents(corpus)
+    encode_seconds = time.perf_counter() - start
+
+    return {
+        "backend": backend,
+        "import_s": import_seconds,
+        "load_s": load_seconds,
+        "query_p50_ms": float(np.percentile(latencies, 50)),
+        "query_p95_ms": float(np.percentile(latencies, 95)),
+        "docs_per_s": documents / encode_seconds,
+        "peak_rss_mb": _rss_mb(),
+    }
+
+
+def check_parity(candidates: List[str], min_cosine: Optional[float] = None, min_agreement: Optional[float] = None) -> List[str]:
+    """Compare each candidate backend against torch; returns the threshold failures"""
+    from processing.embeddings import (
+        PARITY_MIN_COSINE, PARITY_MIN_NEIGHBOUR_AGREEMENT, create_embeddings, embedding_parity, parity_failures
+    )
+
+    min_cosine = PARITY_MIN_COSINE if min_cosine is None else min_cosine
+    min_agreement = PARITY_MIN_NEIGHBOUR_AGREEMENT if min_agreement is None else min_agreement
+
+    reference = create_embeddings("torch")
+    failures = []
+    print(f"\n=== PARITY vs torch ({len(SAMPLE_TEXTS)} texts) ===")
+    for backend in candidates:
+        parity = embedding_parity(reference, create_embeddings(backend), SAMPLE_TEXTS)
+        print(
+            f"{backend:<10} min cosine {parity['min_cosine']:.5f}  mean cosine {parity['mean_cosine']:.5f}  "
+            f"nearest-neighbour agreement {parity['neighbour_agreement']:.0%}"
+        )
+        failures.extend(f"{backend}: {failure}" for failure in parity_failures(parity, min_cosine, min_agreement))
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedding backend benchmark")
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--documents", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--min-cosine", type=float,
+                        help="Fail if any text's embedding drifts below this cosine similarity to torch (default 0.99)")
+    parser.add_argument("--min-agreement", type=float,
+                        help="Fail if fewer nearest neighbours than this fraction match torch (default 1.0)")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(measure_backend(args.worker, args.documents, args.queries)))
+        raise SystemExit(0)
+
+    # Each backend runs in a fresh interpreter so import time and RSS are not shared
+    print(f"{'backend':<10} {'import s':>9} {'load s':>7} {'q p50 ms':>9} {'q p95 ms':>9} {'docs/s':>8} {'peak RSS MB':>12}")
+    for backend in args.backends:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.embedding_benchmark", "--worker", backend,
+             "--documents", str(args.documents), "--queries", str(args.queries)],
+            capture_output=True, text=True, check=True
+        ).stdout.strip().splitlines()[-1]
+        stats = json.loads(output)
+        print(
+            f"{backend:<10} {stats['import_s']:>9.2f} {stats['load_s']:>7.2f} {stats['query_p50_ms']:>9.2f} "
+            f"{stats['query_p95_ms']:>9.2f} {stats['docs_per_s']:>8.0f} {stats['peak_rss_mb']:>12.0f}"
+        )
+
+    failures = check_parity([backend for backend in args.backends if backend != "torch"], args.min_cosine, args.min_agreement)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
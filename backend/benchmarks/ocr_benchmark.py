@@ -0,0 +1,97 @@
+import os
+import re
+import time
+import shutil
+import argparse
+import difflib
+import tempfile
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pytesseract
+from PIL import Image
+from pypdf import PdfReader
+
+from processing.ocr_preprocessing import OCRPreprocessor
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def character_accuracy(text: str, reference: str) -> float:
+    """Share of reference characters recovered, after collapsing whitespace and case"""
+    matcher = difflib.SequenceMatcher(None, _normalize(text), _normalize(reference), autojunk=False)
+    matched = sum(block.size for block in matcher.get_matching_blocks())
+    return matched / max(1, len(_normalize(reference)))
+
+
+def measure(image: Image.Image, preprocessor: Optional[OCRPreprocessor], reference: Optional[str], repeats: int) -> Dict[str, Any]:
+    latencies, text = [], ""
+    for _ in range(repeats):
+        start = time.perf_counter()
+        prepared = preprocessor(image) if preprocessor else image
+        text = pytesseract.image_to_string(prepared)
+        latencies.append(time.perf_counter() - start)
+    return {
+        "pixels_mp": (prepared.width * prepared.height) / 1e6,
+        "seconds": float(np.median(latencies)),
+        "chars": len(text),
+        "accuracy": character_accuracy(text, reference) if reference else None,
+    }
+
+
+def placeholder_dpi_sample(path: str, directory: str) -> str:
+    """JPEG copy of an image tagged 72 DPI, as phone cameras write it, to check the DPI is not believed"""
+    sample_path = os.path.join(directory, "sample-72dpi.jpg")
+    Image.open(path).convert("RGB").save(sample_path, "JPEG", quality=90, dpi=(72, 72))
+    return sample_path
+
+
+def load_reference(args: argparse.Namespace) -> Optional[str]:
+    if args.reference:
+        with open(args.reference, encoding="utf-8") as f:
+            return f.read()
+    if args.reference_pdf:
+        return PdfReader(args.reference_pdf).pages[args.reference_page].extract_text()
+    return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OCR latency and accuracy with and without preprocessing")
+    parser.add_argument("images", nargs="*", default=["../data/1.png"])
+    parser.add_argument("--reference", help="Ground-truth text file for the images")
+    parser.add_argument("--reference-pdf", default="../data/2.pdf", help="PDF whose text layer is the ground truth")
+    parser.add_argument("--reference-page", type=int, default=0)
+    parser.add_argument("--upscale", type=float, default=1.0, help="Enlarge inputs to mimic high-megapixel phone photos")
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--skip-dpi-sample", action="store_true", help="Do not add a 72-DPI JPEG copy of the first image")
+    args = parser.parse_args()
+
+    sample_dir = tempfile.mkdtemp()
+    images: List[str] = list(args.images)
+    if not args.skip_dpi_sample:
+        images.append(placeholder_dpi_sample(images[0], sample_dir))
+
+    reference = load_reference(args)
+    variants: Dict[str, Optional[OCRPreprocessor]] = {
+        "raw": None,
+        "downscale+gray": OCRPreprocessor(binarize=False, crop=False),
+        "downscale+binarize": OCRPreprocessor(binarize=True, crop=False),
+        "downscale+binarize+crop": OCRPreprocessor(binarize=True, crop=True),
+    }
+
+    print(f"{'image':<20} {'variant':<24} {'est DPI':>8} {'MP':>6} {'seconds':>8} {'chars':>6} {'accuracy':>9}")
+    for path in images:
+        image = Image.open(path)
+        image.load()
+        if args.upscale != 1.0:
+            image = image.resize((round(image.width * args.upscale), round(image.height * args.upscale)))
+        estimated_dpi = OCRPreprocessor().estimated_dpi(image)
+
+        for name, preprocessor in variants.items():
+            stats = measure(image, preprocessor, reference, args.repeats)
+            accuracy = f"{stats['accuracy']:.1%}" if stats["accuracy"] is not None else "n/a"
+            print(f"{path[-20:]:<20} {name:<24} {estimated_dpi:>8.0f} {stats['pixels_mp']:>6.1f} {stats['seconds']:>8.2f} {stats['chars']:>6} {accuracy:>9}")
+
+    shutil.rmtree(sample_dir)
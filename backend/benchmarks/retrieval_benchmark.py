@@ -0,0 +1,151 @@
+import time
+import argparse
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from retrieval.vector_index import LocalVectorIndex, QUANTIZATION_MODES, normalize_embeddings
+from retrieval.ivf_index import IVFVectorIndex
+from retrieval.bm25_index import BM25Index
+
+
+def make_corpus(num_chunks: int, dim: int, num_topics: int = 256, seed: int = 0) -> np.ndarray:
+    """Synthetic clustered embeddings that resemble topic structure in a legal corpus"""
+    rng = np.random.default_rng(seed)
+    centers = normalize_embeddings(rng.standard_normal((num_topics, dim)).astype(np.float32))
+    assignments = rng.integers(0, num_topics, size=num_chunks)
+    noise = rng.standard_normal((num_chunks, dim)).astype(np.float32) * 0.35
+    return normalize_embeddings(centers[assignments] + noise / np.sqrt(dim) * 4)
+
+
+def make_queries(corpus: np.ndarray, num_queries: int, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(corpus), size=num_queries)
+    noise = rng.standard_normal((num_queries, corpus.shape[1])).astype(np.float32) * 0.05
+    return normalize_embeddings(corpus[picks] + noise)
+
+
+def exact_neighbours(corpus: np.ndarray, queries: np.ndarray, k: int) -> List[set]:
+    truth = []
+    for query in queries:
+        scores = corpus @ query
+        truth.append(set(np.argpartition(-scores, k - 1)[:k].tolist()))
+    return truth
+
+
+def evaluate(index: LocalVectorIndex, queries: np.ndarray, truth: List[set], k: int, **search_kwargs) -> Dict[str, Any]:
+    """Measure per-query latency and recall@k against exact search"""
+    latencies = []
+    hits = 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        results = index.search_rows(query, k, **search_kwargs)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(expected.intersection(row for row, _ in results))
+
+    latencies = np.array(latencies)
+    return {
+        "recall_at_k": hits / (len(queries) * k),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+def build_index(corpus: np.ndarray, index_cls=LocalVectorIndex, **kwargs) -> LocalVectorIndex:
+    index = index_cls(**kwargs)
+    documents = [Document(page_content="", metadata={"row": i}) for i in range(len(corpus))]
+    index.add_embeddings(documents, corpus, ids=[str(i) for i in range(len(corpus))])
+    return index
+
+
+def quantization_report(corpus: np.ndarray, queries: np.ndarray, truth: List[set], k: int, rescore_multiplier: Optional[int]):
+    """Compare memory, latency and recall of each quantization mode.
+
+    Quantized modes keep only the scan data resident; their full-precision vectors are memory-mapped
+    and read only for rescoring. The numpy int8 scan widens codes to float32 block by block, so expect
+    it to be somewhat slower than the float scan: it buys memory, not speed.
+    """
+    print(f"\n=== QUANTIZATION (k={k}) ===")
+    print(f"{'mode':<8} {'rescore':>8} {'scan MB':>9} {'full MB':>9} {'full in':>8} {'p50 ms':>8} {'p95 ms':>8} {'recall@k':>9}")
+    for mode in QUANTIZATION_MODES:
+        index = build_index(corpus, quantization=mode, rescore_multiplier=rescore_multiplier)
+        usage = index.memory_usage()
+        stats = evaluate(index, queries, truth, k)
+        print(
+            f"{mode:<8} {'x' + str(index.rescore_multiplier):>8} {usage['scan_bytes'] / 1e6:>9.1f} {usage['full_precision_bytes'] / 1e6:>9.1f} "
+            f"{'RAM' if usage['full_precision_resident'] else 'mmap':>8} "
+            f"{stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['recall_at_k']:>9.3f}"
+        )
+
+
+def ivf_report(corpus: np.ndarray, queries: np.ndarray, truth: List[set], k: int, nlist: Optional[int], quantization: str):
+    """Sweep nprobe to show the recall/latency tradeoff against a flat scan"""
+    start = time.perf_counter()
+    index = build_index(corpus, index_cls=IVFVectorIndex, quantization=quantization, nlist=nlist)
+    build_seconds = time.perf_counter() - start
+    sizes = index.list_sizes()
+
+    flat = evaluate(build_index(corpus, quantization=quantization), queries, truth, k)
+    print(f"\n=== IVF ({index.nlist} lists, {quantization}, built in {build_seconds:.1f}s, list size p50={int(np.median(sizes))} max={int(sizes.max())}) ===")
+    print(f"{'nprobe':<8} {'p50 ms':>8} {'p95 ms':>8} {'recall@k':>9}")
+    print(f"{'flat':<8} {flat['p50_ms']:>8.2f} {flat['p95_ms']:>8.2f} {flat['recall_at_k']:>9.3f}")
+    for nprobe in (1, 2, 4, 8, 16, 32, 64):
+        if nprobe > index.nlist:
+            break
+        stats = evaluate(index, queries, truth, k, nprobe=nprobe)
+        print(f"{nprobe:<8} {stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['recall_at_k']:>9.3f}")
+
+
+def bm25_report(num_chunks: int, tokens_per_chunk: int = 60, vocabulary_size: int = 200_000, num_queries: int = 200, k: int = 5):
+    """Build BM25 over a Zipf-distributed synthetic corpus and time keyword lookups"""
+    rng = np.random.default_rng(2)
+    words = np.array([f"w{i}" for i in range(vocabulary_size)])
+    ranks = np.minimum(rng.zipf(1.2, size=(num_chunks, tokens_per_chunk)), vocabulary_size) - 1
+
+    start = time.perf_counter()
+    index = BM25Index.from_texts([str(i) for i in range(num_chunks)], (" ".join(words[row]) for row in ranks))
+    build_seconds = time.perf_counter() - start
+
+    # Queries mix one common term with rarer "statute-like" terms, as legal queries do
+    queries = [
+        " ".join(words[[rng.integers(0, 20), rng.integers(100, 5000), rng.integers(5000, vocabulary_size)]])
+        for _ in range(num_queries)
+    ]
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    usage = index.memory_usage()
+    print(f"\n=== BM25 ({num_chunks} chunks, built in {build_seconds:.1f}s) ===")
+    print(f"postings: {usage['postings']} ({usage['postings_bytes'] / 1e6:.1f} MB), terms: {usage['terms']}")
+    print(f"p50 {np.percentile(latencies, 50):.2f} ms, p95 {np.percentile(latencies, 95):.2f} ms, max {max(latencies):.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local retrieval index benchmark")
+    parser.add_argument("--chunks", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--rescore-multiplier", type=int, default=None)
+    parser.add_argument("--nlist", type=int, default=None, help="IVF lists (default: 4 * sqrt(chunks))")
+    parser.add_argument("--quantization", choices=QUANTIZATION_MODES, default="int8", help="Quantization used for the IVF sweep")
+    parser.add_argument("--bm25-chunks", type=int, default=1_000_000)
+    parser.add_argument("--report", choices=["all", "quantization", "ivf", "bm25"], default="all")
+    args = parser.parse_args()
+
+    if args.report in ("all", "bm25"):
+        bm25_report(args.bm25_chunks, num_queries=args.queries, k=args.k)
+
+    if args.report in ("all", "quantization", "ivf"):
+        corpus = make_corpus(args.chunks, args.dim)
+        queries = make_queries(corpus, args.queries)
+        truth = exact_neighbours(corpus, queries, args.k)
+
+        if args.report in ("all", "quantization"):
+            quantization_report(corpus, queries, truth, args.k, args.rescore_multiplier)
+        if args.report in ("all", "ivf"):
+            ivf_report(corpus, queries, truth, args.k, args.nlist, args.quantization)
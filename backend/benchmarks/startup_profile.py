@@ -0,0 +1,119 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+from typing import Any, Dict, List, Tuple
+
+# Heavy dependencies and our own entry points, each imported cold in a fresh interpreter
+IMPORTS = [
+    "fastapi",
+    "PIL.Image",
+    "aiohttp",
+    "langchain_core.prompts",
+    "langchain_groq",
+    "langgraph.graph",
+    "tavily",
+    "weaviate",
+    "langchain_weaviate.vectorstores",
+    "langchain_community.document_loaders",
+    "langchain_huggingface",
+    "onnxruntime",
+    "processing.document_processing",
+    "agent.legal_ai_assistant",
+    "app",
+]
+
+INIT_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+from agent.legal_ai_assistant import LegalAIAssistant
+agent_imported = time.perf_counter()
+assistant = LegalAIAssistant()
+constructed = time.perf_counter()
+assistant.warm_up()
+warmed = time.perf_counter()
+print(json.dumps({
+    "import_app": imported - start,
+    "import_agent": agent_imported - imported,
+    "construct": constructed - agent_imported,
+    "warm_up": warmed - constructed,
+    "components": assistant.startup_timings,
+}))
+assistant.close()
+"""
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, float]]:
+    """(module, cumulative seconds) from python -X importtime output"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # One space after the bar, then two more per level of nesting
+        modules.append((name[1:].rstrip(), int(cumulative) / 1e6))
+    return modules
+
+
+def profile_import(module: str) -> Dict[str, Any]:
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True)
+    if completed.returncode != 0:
+        return {"module": module, "error": completed.stderr.strip().splitlines()[-1]}
+    timings = parse_importtime(completed.stderr)
+    total = next((seconds for name, seconds in timings if name.strip() == module), 0.0)
+    # Direct children of the requested import carry two spaces of indentation
+    children = sorted(((name.strip(), seconds) for name, seconds in timings if name.startswith("  ") and not name.startswith("   ")),
+                      key=lambda item: -item[1])
+    return {"module": module, "seconds": total, "slowest": children[:5]}
+
+
+def profile_init() -> Dict[str, Any]:
+    completed = subprocess.run([sys.executable, "-c", INIT_SCRIPT], capture_output=True, text=True)
+    if completed.returncode != 0:
+        return {"error": completed.stderr.strip().splitlines()[-1]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold-start import and initialization time of the backend, per component")
+    parser.add_argument("--skip-init", action="store_true", help="Only profile imports (no API keys or index needed)")
+    parser.add_argument("--import-budget", type=float, default=float(os.environ.get("STARTUP_IMPORT_BUDGET", "2.0")),
+                        help="Fail if importing app takes longer than this many seconds")
+    parser.add_argument("--ready-budget", type=float, default=float(os.environ.get("STARTUP_BUDGET", "30")),
+                        help="Fail if importing app plus building the assistant takes longer than this many seconds")
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'import':<40} {'cold s':>8}  slowest direct imports")
+    for module in IMPORTS:
+        result = profile_import(module)
+        if "error" in result:
+            print(f"{module:<40} {'-':>8}  {result['error']}")
+            continue
+        slowest = ", ".join(f"{name} {seconds:.2f}" for name, seconds in result["slowest"][:3])
+        print(f"{module:<40} {result['seconds']:>8.2f}  {slowest}")
+        if module == "app" and result["seconds"] > args.import_budget:
+            failures.append(f"importing app took {result['seconds']:.2f}s (budget {args.import_budget}s)")
+
+    if not args.skip_init:
+        init = profile_init()
+        if "error" in init:
+            print(f"\nInitialization could not run: {init['error']}")
+            failures.append("initialization failed")
+        else:
+            print(f"\n{'initialization':<40} {'s':>8}")
+            for phase in ("import_app", "import_agent", "construct", "warm_up"):
+                print(f"{phase:<40} {init[phase]:>8.2f}")
+            for component, seconds in init["components"].items():
+                print(f"  {component:<38} {seconds:>8.2f}")
+            ready = init["import_app"] + init["import_agent"] + init["construct"]
+            print(f"{'ready to serve':<40} {ready:>8.2f}")
+            if ready > args.ready_budget:
+                failures.append(f"ready to serve after {ready:.2f}s (budget {args.ready_budget}s)")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
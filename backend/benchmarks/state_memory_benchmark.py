@@ -0,0 +1,201 @@
+import os
+import sys
+import json
+import zlib
+import pickle
+import asyncio
+import argparse
+import tracemalloc
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple
+from unittest import mock
+
+from pypdf import PdfReader, PdfWriter
+from langchain_core.documents import Document
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# One answer that parses for every JSON prompt in the graph: query understanding and both evaluations.
+# A middling score sends the graph down the additional-search branch as well.
+CANNED_ANSWER = json.dumps({
+    "core_legal_issue": "termination for convenience under a services agreement",
+    "key_terms": ["termination", "notice period", "liability cap"],
+    "jurisdiction": "California",
+    "legal_domains": ["contract"],
+    "subqueries": ["notice required to terminate", "survival of indemnity obligations"],
+    "Relevance Score": 5,
+    "Information Gaps": ["remedies for wrongful termination"],
+})
+
+
+class CannedChatModel(BaseChatModel):
+    """Chat model that gives the same JSON answer to every prompt, so the graph runs without an LLM provider"""
+
+    @property
+    def _llm_type(self) -> str:
+        return "canned"
+
+    def _generate(self, messages: List[Any], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=CANNED_ANSWER))])
+
+
+class StubWebSearch:
+    """Stands in for AsyncTavilyClient with a few deterministic results per query"""
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.calls = 0
+
+    async def search(self, query: str, max_results: int = 5, search_depth: str = "basic") -> Dict[str, Any]:
+        self.calls += 1
+        key = zlib.crc32(query.encode("utf-8"))
+        return {"results": [
+            {"url": f"https://example.com/{key}/{i}", "title": f"Result {i}", "content": f"Commentary on {query}. " * 20}
+            for i in range(max_results)
+        ]}
+
+
+class StubRetriever:
+    """Stands in for the local hybrid retriever with a few chunk-sized matches per search"""
+
+    def similarity_search_multi(self, queries: List[str], k: int = 5, filters: Any = None) -> List[Tuple[Document, float]]:
+        return [
+            (Document(page_content=f"Clause {i} of the indexed agreement. " * 25, metadata={"source": "corpus.pdf", "page": i}), 1.0 / (i + 1))
+            for i in range(k)
+        ]
+
+
+class StubEmbeddings:
+    def embed_query(self, text: str) -> List[float]:
+        return [0.0]
+
+
+class StubDocumentProcessor:
+    """Stands in for DocumentProcessor so no index or embedding model has to be built"""
+
+    def __init__(self, documents_dir: str = "./notes", embedding_backend: Optional[str] = None):
+        self.embeddings = StubEmbeddings()
+
+    def create_hybrid_retriever(self, *args: Any, **kwargs: Any) -> StubRetriever:
+        return StubRetriever()
+
+    create_local_index = create_hybrid_retriever
+
+    def before_fork(self):
+        pass
+
+    def after_fork(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def make_large_pdf(path: str, copies: int) -> bytes:
+    """Repeat a sample PDF to the size of a long contract"""
+    reader = PdfReader(path)
+    writer = PdfWriter()
+    for _ in range(copies):
+        for page in reader.pages:
+            writer.add_page(page)
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def text_pdf(pages: int, lines_per_page: int = 40) -> bytes:
+    """A PDF whose pages carry a plain text layer, built without a sample file"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in range(pages):
+        lines = b" T* ".join(
+            b"(Clause %d.%d: either party may terminate this agreement on ninety days written notice.) Tj" % (page + 1, line)
+            for line in range(lines_per_page)
+        )
+        stream = b"BT /F1 9 Tf 11 TL 36 756 Td " + lines + b" ET"
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects))
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), pages)
+
+    pdf, offsets = bytearray(b"%PDF-1.4\n"), []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(pdf)
+
+
+def build_assistant() -> Any:
+    """The real assistant and graph, with the LLM, web search and retrieval index stubbed out"""
+    from agent import legal_ai_assistant
+    # The raw extracted text stays in state rather than a map-reduced brief: the worst case for state size
+    settings = {"RETRIEVAL_BACKEND": "local", "LONG_DOCUMENT_CHARS": os.environ.get("LONG_DOCUMENT_CHARS", str(10 ** 9))}
+    with mock.patch.dict(os.environ, settings), \
+            mock.patch.object(legal_ai_assistant, "ChatGroq", lambda **kwargs: CannedChatModel()), \
+            mock.patch.object(legal_ai_assistant, "AsyncTavilyClient", StubWebSearch), \
+            mock.patch.object(legal_ai_assistant, "DocumentProcessor", StubDocumentProcessor):
+        return legal_ai_assistant.LegalAIAssistant()
+
+
+def pickled_size(value: Any) -> int:
+    """Bytes a checkpointer would write for this value"""
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def run_turn(assistant: Any, upload: Any, input_type: str, text_query: str, history: List[Any]) -> Tuple[Dict[str, Any], int]:
+    """One process_query call and the peak memory traced while it ran"""
+    tracemalloc.start()
+    result = asyncio.run(assistant.process_query(upload, input_type, text_query=text_query, conversation_history=history))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Agent state and conversation history size for a large uploaded PDF, run through the real graph")
+    parser.add_argument("--pdf", default="../data/2.pdf")
+    parser.add_argument("--copies", type=int, default=25, help="Repeat the sample PDF this many times")
+    parser.add_argument("--synthetic-pages", type=int, help="Generate a text PDF of this many pages instead of using --pdf")
+    parser.add_argument("--query", default="Can either party terminate this agreement early?")
+    parser.add_argument("--max-snapshot-ratio", type=float, default=1.5,
+                        help="Fail if the final state snapshot exceeds this multiple of the extracted text size")
+    parser.add_argument("--max-history-bytes", type=int, default=16384,
+                        help="Fail if the conversation history after the follow-up turn exceeds this many pickled bytes")
+    args = parser.parse_args()
+
+    upload = text_pdf(args.synthetic_pages) if args.synthetic_pages else make_large_pdf(args.pdf, args.copies)
+    assistant = build_assistant()
+    try:
+        first, first_peak = run_turn(assistant, upload, "pdf", args.query, [])
+        # A text follow-up carries the history forward, as the chat client does
+        follow_up, follow_up_peak = run_turn(assistant, "What notice period applies?", "text", "", first["conversation_history"])
+    finally:
+        assistant.close()
+
+    text_bytes = len(first["processed_input"]["content"].encode("utf-8"))
+    final_state = {key: value for key, value in first.items() if key != "skipped_stages"}
+    snapshot_bytes = pickled_size(final_state)
+    history_bytes = pickled_size(follow_up["conversation_history"])
+    print(f"Upload {len(upload) / 1e6:.1f} MB, {first['processed_input']['metadata'].get('page_count')} pages, {text_bytes / 1e6:.2f} MB of text")
+
+    print(f"{'turn':<10} {'peak MB':>9} {'state MB':>9} {'history KB':>11} {'messages':>9}")
+    for name, result, peak in (("upload", first, first_peak), ("follow-up", follow_up, follow_up_peak)):
+        state = {key: value for key, value in result.items() if key != "skipped_stages"}
+        print(f"{name:<10} {peak / 1e6:>9.2f} {pickled_size(state) / 1e6:>9.2f} "
+              f"{pickled_size(result['conversation_history']) / 1e3:>11.1f} {len(result['conversation_history']):>9}")
+
+    failures = []
+    ratio = snapshot_bytes / text_bytes
+    if ratio > args.max_snapshot_ratio:
+        failures.append(f"final state snapshot is {ratio:.2f}x the text size (limit {args.max_snapshot_ratio}x)")
+    if history_bytes > args.max_history_bytes:
+        failures.append(f"conversation history is {history_bytes} bytes after the follow-up (limit {args.max_history_bytes})")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print(f"PASS: state is {ratio:.2f}x the text size, history {history_bytes / 1e3:.1f} KB")
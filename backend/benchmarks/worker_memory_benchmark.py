@@ -0,0 +1,95 @@
+import os
+import re
+import sys
+import time
+import signal
+import argparse
+import threading
+import subprocess
+from typing import Any, Dict, List
+
+from main import process_memory
+
+# Lines each launcher prints once a worker has finished its lifespan startup
+READY_PATTERNS = {
+    "uvicorn": re.compile(r"Application startup complete"),
+    "preload": re.compile(r"Worker \d+ ready in"),
+}
+
+
+def child_pids(pid: int) -> List[int]:
+    """Direct children of a process, read from /proc (Linux only)"""
+    pids = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children") as f:
+            pids.extend(int(child) for child in f.read().split())
+    return pids
+
+
+def launch(mode: str, workers: int, port: int, timeout: float) -> Dict[str, Any]:
+    """Start one server, wait for every worker to report ready, then snapshot the memory of all its processes"""
+    if mode == "uvicorn":
+        command = [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)]
+    else:
+        command = [sys.executable, "main.py", "--mode", "serve", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)]
+
+    started = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
+    ready_at: List[float] = []
+    all_ready = threading.Event()
+
+    def read_output():
+        for line in process.stdout:
+            if READY_PATTERNS[mode].search(line):
+                ready_at.append(time.perf_counter() - started)
+                if len(ready_at) == workers:
+                    all_ready.set()
+
+    threading.Thread(target=read_output, daemon=True).start()
+    try:
+        if not all_ready.wait(timeout):
+            raise RuntimeError(f"{mode}: only {len(ready_at)} of {workers} workers ready after {timeout:.0f}s")
+        # Let lazily allocated buffers settle before reading smaps
+        time.sleep(2)
+        supervisor = process_memory(process.pid)
+        # Workers, plus any helper process the launcher starts (uvicorn also runs a resource tracker)
+        worker_memory = [process_memory(pid) for pid in child_pids(process.pid)]
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    return {
+        "mode": mode,
+        "ready_s": ready_at,
+        "supervisor": supervisor,
+        "children": worker_memory,
+        "total_pss_mb": round(supervisor["pss_mb"] + sum(memory["pss_mb"] for memory in worker_memory), 1),
+    }
+
+
+def report(result: Dict[str, Any]):
+    print(f"\n{result['mode']}: all workers ready in {max(result['ready_s']):.1f}s "
+          f"(first {min(result['ready_s']):.1f}s), total PSS {result['total_pss_mb']:.0f} MB")
+    print(f"  {'process':<12} {'rss MB':>8} {'pss MB':>8} {'shared MB':>10} {'private MB':>11}")
+    rows = [("supervisor", result["supervisor"])] + [(f"child {index}", memory) for index, memory in enumerate(result["children"])]
+    for name, memory in rows:
+        print(f"  {name:<12} {memory['rss_mb']:>8.0f} {memory['pss_mb']:>8.0f} {memory['shared_mb']:>10.0f} {memory['private_mb']:>11.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-worker memory and startup: uvicorn --workers vs the preload-and-fork launcher")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds to wait for all workers to start")
+    args = parser.parse_args()
+
+    results = [launch(mode, args.workers, args.port, args.timeout) for mode in ("uvicorn", "preload")]
+    for result in results:
+        report(result)
+
+    baseline, preload = results
+    print(f"\nPreload-and-fork: {preload['total_pss_mb'] / baseline['total_pss_mb']:.0%} of the uvicorn total PSS, "
+          f"all workers ready in {max(preload['ready_s']):.1f}s vs {max(baseline['ready_s']):.1f}s")
@@ -1,12 +1,19 @@
 import os
+import gc
+import sys
+import time
+import signal
+import socket
 import asyncio
+import traceback
 from dotenv import load_dotenv
 import argparse
-from agent.legal_ai_assistant import LegalAIAssistant
+from typing import Dict, Optional, Union
 import uvicorn
 
 async def demo_query(query_text):
     """Demo function to test the assistant with a text query"""
+    from agent.legal_ai_assistant import LegalAIAssistant
     assistant = LegalAIAssistant()
     print(f"Processing query: '{query_text}'")
     result = await assistant.process_query(query_text)
@@ -27,20 +34,140 @@ def start_api():
     """Start the FastAPI server"""
     uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
 
+def process_memory(pid: Union[int, str] = "self") -> Dict[str, float]:
+    """Resident, proportional, shared and private memory of a process in MB, from /proc (Linux only)"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        "rss_mb": round(fields.get("Rss", 0), 1),
+        # Shared pages split evenly between the processes mapping them; sums to the real total across workers
+        "pss_mb": round(fields.get("Pss", 0), 1),
+        "shared_mb": round(fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0), 1),
+        "private_mb": round(fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0), 1),
+    }
+
+def format_memory(memory: Dict[str, float]) -> str:
+    return ", ".join(f"{name[:-3]} {value:.0f} MB" for name, value in memory.items())
+
+async def serve_worker(sock: socket.socket, forked_at: float):
+    """Run one uvicorn server on the shared listening socket and report when it is ready"""
+    import app as app_module
+    server = uvicorn.Server(uvicorn.Config(app_module.app, lifespan="on", log_level="info"))
+    serving = asyncio.create_task(server.serve(sockets=[sock]))
+    while not server.started and not serving.done():
+        await asyncio.sleep(0.05)
+    if server.started:
+        print(f"Worker {os.getpid()} ready in {time.perf_counter() - forked_at:.2f}s; {format_memory(process_memory())}")
+    await serving
+
+def serve(host: str, port: int, workers: int):
+    """Production launcher: load the models once, then fork workers that share those pages copy-on-write.
+
+    Each uvicorn worker used to build its own LegalAIAssistant, so memory and startup grew with the worker count.
+    """
+    import app as app_module
+
+    # Tokenizer thread pools started before the fork would deadlock in the workers
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    started = time.perf_counter()
+    app_module.preload_assistant()
+    print(f"Preloaded the assistant in {time.perf_counter() - started:.2f}s; {format_memory(process_memory())}")
+
+    # Reference counting still dirties shared pages, but the cyclic collector stops rewriting these headers
+    gc.collect()
+    gc.freeze()
+
+    sock = socket.create_server((host, port), backlog=2048)
+    children: Dict[int, float] = {}
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            exit_code = 0
+            try:
+                asyncio.run(serve_worker(sock, time.perf_counter()))
+            except BaseException:
+                traceback.print_exc()
+                exit_code = 1
+            finally:
+                sys.stdout.flush()
+                os._exit(exit_code)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    for _ in range(workers):
+        spawn()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    print(f"Serving on {host}:{port} with {workers} forked workers")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        uptime = time.monotonic() - children.pop(pid, time.monotonic())
+        if not stopping:
+            print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+            # Back off from a worker that dies on startup instead of fork-looping
+            if uptime < 5:
+                time.sleep(1)
+            spawn()
+    sock.close()
+
+def reindex(documents_dir: str, index_dir: Optional[str] = None):
+    """Bring the saved local index up to date with the documents, embedding only new or changed chunks"""
+    from processing.document_processing import DocumentProcessor
+    processor = DocumentProcessor(documents_dir=documents_dir)
+    index_dir = index_dir or processor.local_index_dir
+    if not index_dir:
+        sys.exit("reindex needs --index-dir or LOCAL_INDEX_DIR")
+    if os.getenv("HYBRID_SEARCH", "true").lower() == "true":
+        # Also rebuilds the BM25 index over the refreshed chunks
+        processor.create_hybrid_retriever(index_dir, refresh=True)
+    else:
+        processor.create_local_index(index_dir, refresh=True)
+
 if __name__ == "__main__":
     # Load environment variables
     load_dotenv()
     
     parser = argparse.ArgumentParser(description="Legal AI Assistant")
-    parser.add_argument("--mode", choices=["api", "demo"], default="api", 
-                        help="Run mode: 'api' to start the server, 'demo' for a demonstration")
+    parser.add_argument("--mode", choices=["api", "serve", "demo", "reindex"], default="api", 
+                        help="Run mode: 'api' to start the development server, 'serve' for preloaded forked workers, 'demo' for a demonstration, "
+                             "'reindex' to re-ingest changed documents into the local index")
     parser.add_argument("--query", type=str, help="Query text for demo mode")
+    parser.add_argument("--host", default="0.0.0.0", help="Bind address for serve mode")
+    parser.add_argument("--port", type=int, default=8000, help="Port for serve mode")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", "2")),
+                        help="Worker processes for serve mode")
+    parser.add_argument("--documents-dir", default=os.environ.get("DOCUMENTS_DIR", "./notes"), help="PDF directory for reindex mode")
+    parser.add_argument("--index-dir", help="Saved local index for reindex mode (default LOCAL_INDEX_DIR)")
     
     args = parser.parse_args()
     
     if args.mode == "api":
         start_api()
+    elif args.mode == "serve":
+        serve(args.host, args.port, args.workers)
     elif args.mode == "demo":
         if not args.query:
             args.query = "What are my rights if my neighbor is making excessive noise at night?"
-        asyncio.run(demo_query(args.query))
\ No newline at end of file
+        asyncio.run(demo_query(args.query))
+    elif args.mode == "reindex":
+        reindex(args.documents_dir, args.index_dir)
\ No newline at end of file
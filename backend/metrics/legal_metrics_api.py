@@ -1,19 +1,38 @@
 import os
 import time
+import asyncio
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from pydantic import BaseModel
 import aiohttp
 
 load_dotenv()
 
+COURTLISTENER_BASE_URL = "https://www.courtlistener.com/api/rest/v4"
+COURTLISTENER_TIMEOUT = float(os.environ.get("COURTLISTENER_TIMEOUT", "15"))
+# Shared by every fetcher, so concurrent dashboard misses cannot multiply the load on CourtListener
+courtlistener_slots = asyncio.Semaphore(int(os.environ.get("COURTLISTENER_CONCURRENCY", "4")))
+# A result with failed queries is only reused this long, so the failures are retried soon
+PARTIAL_RESULT_TTL = float(os.environ.get("PARTIAL_RESULT_TTL", "60"))
+
 class LegalMetricsResponse(BaseModel):
-    total_opinions: int
-    scotus_opinions: int
-    federal_opinions: int
-    state_opinions: int
-    recent_opinions: int
+    # None when the count query failed; the reason is under errors
+    total_opinions: Optional[int] = None
+    scotus_opinions: Optional[int] = None
+    federal_opinions: Optional[int] = None
+    state_opinions: Optional[int] = None
+    recent_opinions: Optional[int] = None
+    errors: Dict[str, str] = {}
+
+class JurisdictionsResponse(BaseModel):
+    Federal: Optional[int] = None
+    State: Optional[int] = None
+    Federal_Appellate: Optional[int] = None
+    Federal_District: Optional[int] = None
+    Federal_Special: Optional[int] = None
+    Federal_Bankruptcy: Optional[int] = None
+    errors: Dict[str, str] = {}
 
 class HighProfileCase(BaseModel):
     case_name: str
@@ -21,41 +40,93 @@ class HighProfileCase(BaseModel):
     absolute_url: Optional[str] = None
     id: str
 
+class CourtListenerError(Exception):
+    """A single CourtListener request that failed"""
+
 class CourtListenerAPIHandler:
-    """Helper class to interact with CourtListener API"""
+    """Helper class to interact with CourtListener API.
+
+    Used as an async context manager, all requests share one HTTP session.
+    """
     
-    def __init__(self, api_token=None):
+    def __init__(self, api_token=None, base_url=None):
 
         self.api_token = api_token or os.getenv("COURTLISTENER_API_TOKEN")
-        self.base_url = "https://www.courtlistener.com/api/rest/v4"
-    
-    async def make_request(self, endpoint, params=None):
-        """Make an authenticated request to the CourtListener API"""
+        self.base_url = (base_url or os.getenv("COURTLISTENER_BASE_URL", COURTLISTENER_BASE_URL)).rstrip("/")
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self):
+        self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=COURTLISTENER_TIMEOUT))
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+        self.session = None
+
+    async def fetch(self, endpoint, params=None):
+        """Authenticated GET against the CourtListener API; raises CourtListenerError on failure"""
         headers = {
             "Authorization": f"Token {self.api_token}"
         }
         
         url = f"{self.base_url}/{endpoint}"
+        session = self.session or aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=COURTLISTENER_TIMEOUT))
         try:
-            async with aiohttp.ClientSession() as session:
+            async with courtlistener_slots:
                 async with session.get(url, headers=headers, params=params) as response:
                     response.raise_for_status()
                     return await response.json()
-        except Exception as e:
+        except aiohttp.ClientResponseError as e:
+            raise CourtListenerError(f"HTTP {e.status} from {endpoint}") from e
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise CourtListenerError(f"{type(e).__name__} requesting {endpoint}: {e}") from e
+        finally:
+            if session is not self.session:
+                await session.close()
+    
+    async def make_request(self, endpoint, params=None):
+        """Make an authenticated request to the CourtListener API"""
+        try:
+            return await self.fetch(endpoint, params)
+        except CourtListenerError as e:
             print(f"CourtListener API Error: {str(e)}")
             return None
+
+    async def count(self, endpoint, params=None):
+        """Number of items matching the parameters; raises CourtListenerError on failure"""
+        result = await self.fetch(endpoint, {**(params or {}), "count": "on"})
+        if not isinstance(result, dict) or "count" not in result:
+            raise CourtListenerError(f"No count in the response from {endpoint}")
+        return result["count"]
     
     async def get_count(self, endpoint, params=None):
         """Get the count of items that match the given parameters"""
-        if params is None:
-            params = {}
-        
-        params["count"] = "on"
-        result = await self.make_request(endpoint, params)
-        
-        if result:
-            return result.get("count", 0)
-        return 0
+        try:
+            return await self.count(endpoint, params)
+        except CourtListenerError as e:
+            print(f"CourtListener API Error: {str(e)}")
+            return 0
+
+    async def get_counts(self, queries: Dict[str, Tuple[str, Dict[str, str]]]) -> Dict[str, Any]:
+        """Run named count queries concurrently.
+
+        Failed queries come back as None, with the reason under "errors", instead of as 0.
+        """
+        names = list(queries)
+        results = await asyncio.gather(*(self.count(*queries[name]) for name in names), return_exceptions=True)
+        counts: Dict[str, Any] = {}
+        errors: Dict[str, str] = {}
+        for name, result in zip(names, results):
+            if isinstance(result, CourtListenerError):
+                counts[name] = None
+                errors[name] = str(result)
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                counts[name] = result
+        if errors:
+            print(f"CourtListener: {len(errors)} of {len(names)} count queries failed")
+        return {**counts, "errors": errors}
     
     async def get_recent_items(self, endpoint, days=30, order_by="-date_filed", limit=5, fields=None):
         """Get recent items from the specified endpoint"""
@@ -103,40 +174,36 @@ async def get_cached_data(cache_obj, fetch_func, *args, **kwargs):
         data = await fetch_func(*args, **kwargs)
         cache_obj["data"] = data
         cache_obj["timestamp"] = current_time
+        if isinstance(data, dict) and data.get("errors"):
+            # Back-dated so a partial result expires after PARTIAL_RESULT_TTL instead of the full TTL
+            cache_obj["timestamp"] = current_time - max(cache_obj["ttl"] - PARTIAL_RESULT_TTL, 0)
         return data
     
     return cache_obj["data"]
 
 async def fetch_court_metrics():
     """Fetch court metrics from CourtListener API"""
-    api = CourtListenerAPIHandler()
-    
-    metrics = {
-        "total_opinions": await api.get_count("opinions/"),
-        "scotus_opinions": await api.get_count("opinions/", {"cluster__docket__court": "scotus"}),
-        "federal_opinions": await api.get_count("opinions/", {"court__jurisdiction": "F"}),
-        "state_opinions": await api.get_count("opinions/", {"court__jurisdiction": "S"}),
-    }
-
     thirty_days_ago = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
-    metrics["recent_opinions"] = await api.get_count("opinions/", {"date_filed__gte": thirty_days_ago})
-    
-    return metrics
+    async with CourtListenerAPIHandler() as api:
+        return await api.get_counts({
+            "total_opinions": ("opinions/", {}),
+            "scotus_opinions": ("opinions/", {"cluster__docket__court": "scotus"}),
+            "federal_opinions": ("opinions/", {"court__jurisdiction": "F"}),
+            "state_opinions": ("opinions/", {"court__jurisdiction": "S"}),
+            "recent_opinions": ("opinions/", {"date_filed__gte": thirty_days_ago}),
+        })
 
 async def fetch_jurisdictions_breakdown():
     """Fetch jurisdictions breakdown from CourtListener API"""
-    api = CourtListenerAPIHandler()
-    
-    jurisdictions = {
-        "Federal": await api.get_count("opinions/", {"court__jurisdiction": "F"}),
-        "State": await api.get_count("opinions/", {"court__jurisdiction": "S"}),
-        "Federal_Appellate": await api.get_count("opinions/", {"court__jurisdiction": "FA"}),
-        "Federal_District": await api.get_count("opinions/", {"court__jurisdiction": "FD"}),
-        "Federal_Special": await api.get_count("opinions/", {"court__jurisdiction": "FS"}),
-        "Federal_Bankruptcy": await api.get_count("opinions/", {"court__jurisdiction": "FB"}),
-    }
-    
-    return jurisdictions
+    async with CourtListenerAPIHandler() as api:
+        return await api.get_counts({
+            "Federal": ("opinions/", {"court__jurisdiction": "F"}),
+            "State": ("opinions/", {"court__jurisdiction": "S"}),
+            "Federal_Appellate": ("opinions/", {"court__jurisdiction": "FA"}),
+            "Federal_District": ("opinions/", {"court__jurisdiction": "FD"}),
+            "Federal_Special": ("opinions/", {"court__jurisdiction": "FS"}),
+            "Federal_Bankruptcy": ("opinions/", {"court__jurisdiction": "FB"}),
+        })
 
 async def fetch_high_profile_cases(limit=5):
     """Fetch high-profile cases from CourtListener API"""
@@ -163,7 +230,7 @@ def register_legal_metrics_endpoints(app):
         metrics = await get_cached_data(legal_metrics_cache, fetch_court_metrics)
         return metrics
 
-    @app.get("/api/jurisdictions", response_model=Dict[str, int])
+    @app.get("/api/jurisdictions", response_model=JurisdictionsResponse)
     async def get_jurisdictions():
         """Get jurisdictions breakdown"""
         jurisdictions = await get_cached_data(jurisdictions_cache, fetch_jurisdictions_breakdown)
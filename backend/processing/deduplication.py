@@ -0,0 +1,154 @@
+import re
+import hashlib
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from retrieval.metadata_filter import FILTER_FIELDS
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def _normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text.lower()).strip()
+
+
+def _shingle_hashes(text: str, shingle_size: int) -> np.ndarray:
+    """32-bit hashes of the word shingles in a chunk"""
+    words = text.split(" ")
+    if len(words) < shingle_size:
+        shingles = {text}
+    else:
+        shingles = {" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)}
+    return np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles],
+        dtype=np.uint64
+    )
+
+
+class _UnionFind:
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+
+    def find(self, item: int) -> int:
+        while self.parent[item] != item:
+            self.parent[item] = self.parent[self.parent[item]]
+            item = self.parent[item]
+        return item
+
+    def union(self, a: int, b: int):
+        root_a, root_b = self.find(a), self.find(b)
+        # Keep the earliest chunk as the representative
+        if root_a != root_b:
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+
+class NearDuplicateDetector:
+    """MinHash + LSH detection of near-duplicate chunks"""
+
+    def __init__(self, threshold: float = 0.85, num_perm: int = 128, bands: int = 16, shingle_size: int = 5, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.shingle_size = shingle_size
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, int(MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, int(MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = _shingle_hashes(text, self.shingle_size)
+        # Multiplication wraps modulo 2**64, as in the usual MinHash implementations
+        permuted = ((hashes[:, None] * self._a + self._b) % MERSENNE_PRIME) & MAX_HASH
+        return permuted.min(axis=0)
+
+    def find_clusters(self, texts: List[str]) -> List[int]:
+        """Return, for each text, the index of the text it collapses into (itself if unique)"""
+        normalized = [_normalize_text(text) for text in texts]
+        union_find = _UnionFind(len(texts))
+
+        # Exact duplicates are common in boilerplate and need no signature
+        first_seen: Dict[str, int] = {}
+        unique_positions = []
+        for position, text in enumerate(normalized):
+            if text in first_seen:
+                union_find.union(first_seen[text], position)
+            else:
+                first_seen[text] = position
+                unique_positions.append(position)
+
+        signatures = np.array([self.signature(normalized[p]) for p in unique_positions]) if unique_positions else None
+        buckets: Dict[Tuple[int, bytes], List[int]] = {}
+        for row, position in enumerate(unique_positions):
+            for band in range(self.bands):
+                key = (band, signatures[row, band * self.rows_per_band:(band + 1) * self.rows_per_band].tobytes())
+                buckets.setdefault(key, []).append(row)
+
+        checked = set()
+        for rows in buckets.values():
+            for i in range(1, len(rows)):
+                pair = (rows[0], rows[i])
+                if pair in checked:
+                    continue
+                checked.add(pair)
+                similarity = float(np.mean(signatures[rows[0]] == signatures[rows[i]]))
+                if similarity >= self.threshold:
+                    union_find.union(unique_positions[rows[0]], unique_positions[rows[i]])
+
+        return [union_find.find(position) for position in range(len(texts))]
+
+
+def _merge_tags(metadatas: List[Dict[str, Any]], field: str) -> List[str]:
+    """Union of a tag field over a duplicate cluster, in first-seen order"""
+    merged = []
+    for metadata in metadatas:
+        values = metadata.get(field)
+        for value in [values] if isinstance(values, str) else values or []:
+            if value not in merged:
+                merged.append(value)
+    return merged
+
+
+def deduplicate_chunks(chunks: List[Any], detector: NearDuplicateDetector) -> Tuple[List[Any], Dict[str, Any]]:
+    """Collapse near-duplicate chunks into their first occurrence with merged source/page and tag metadata"""
+    representatives = detector.find_clusters([chunk.page_content for chunk in chunks])
+
+    members: Dict[int, List[int]] = {}
+    for position, representative in enumerate(representatives):
+        members.setdefault(representative, []).append(position)
+
+    kept = []
+    for representative, positions in members.items():
+        chunk = chunks[representative]
+        if len(positions) > 1:
+            sources = []
+            for position in positions:
+                metadata = chunks[position].metadata
+                reference = f"{metadata.get('source', 'Unknown')} (Page {metadata.get('page', 0)})"
+                if reference not in sources:
+                    sources.append(reference)
+            chunk.metadata["sources"] = sources
+            chunk.metadata["duplicate_count"] = len(positions)
+            # A filter on any member's jurisdiction or domain must still find the surviving chunk
+            for field in FILTER_FIELDS:
+                merged = _merge_tags([chunks[position].metadata for position in positions], field)
+                if merged:
+                    chunk.metadata[field] = merged
+        kept.append(chunk)
+
+    input_chars = sum(len(chunk.page_content) for chunk in chunks)
+    output_chars = sum(len(chunk.page_content) for chunk in kept)
+    stats = {
+        "input_chunks": len(chunks),
+        "output_chunks": len(kept),
+        "removed_chunks": len(chunks) - len(kept),
+        "duplicate_clusters": sum(1 for positions in members.values() if len(positions) > 1),
+        "input_chars": input_chars,
+        "output_chars": output_chars,
+        "chunk_reduction": (len(chunks) - len(kept)) / len(chunks) if chunks else 0.0,
+    }
+    return kept, stats
@@ -1,27 +1,62 @@
 import os
+import re
+import hashlib
 import dotenv
-from typing import List, Any
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple, TYPE_CHECKING
 
-import weaviate
-from weaviate.classes.init import Auth
-
-from langchain_community.document_loaders import PyPDFLoader, DirectoryLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_weaviate.vectorstores import WeaviateVectorStore
-from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_core.documents import Document
+
+from processing.embeddings import LazyEmbeddings
+from processing.metadata_tagging import LegalMetadataTagger
+from processing.deduplication import NearDuplicateDetector, deduplicate_chunks
+from retrieval.vector_index import LocalVectorIndex
+from retrieval.ivf_index import IVFVectorIndex
+from retrieval.bm25_index import BM25Index
+from retrieval.hybrid_retriever import HybridRetriever
+from retrieval.multi_query import merge_multi_query_results
+
+if TYPE_CHECKING:
+    from langchain_weaviate.vectorstores import WeaviateVectorStore
+    from processing.weaviate_connection import WeaviateConnection
+
+LOCAL_INDEX_TYPES = {
+    "flat": LocalVectorIndex,
+    "ivf": IVFVectorIndex,
+}
 
 dotenv.load_dotenv()
 
 class DocumentProcessor:
     """Process legal documents and create vector store"""
     
-    def __init__(self, documents_dir: str = "./notes"):
+    def __init__(self, documents_dir: str = "./notes", embedding_backend: Optional[str] = None):
         self.documents_dir = documents_dir
         self.weaviate_url = os.environ.get("WEAVIATE_URL")
         self.weaviate_api_key = os.environ.get("WEAVIATE_API_KEY")
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2"
+        self.ingest_batch_size = int(os.environ.get("INGEST_BATCH_SIZE", "256"))
+        self._connection = None
+        # Hybrid searches for the subqueries of one question run in parallel over the shared client
+        self.search_concurrency = int(os.environ.get("WEAVIATE_SEARCH_CONCURRENCY", "4"))
+        self._search_executor = None
+        self._search_executor_lock = threading.Lock()
+        self.index_name = "LegalDocuments"
+        self.local_index_dir = os.environ.get("LOCAL_INDEX_DIR")
+        # Where quantized indexes keep their full-precision vectors on disk; the system temp dir by default
+        self.local_index_spill_dir = os.environ.get("LOCAL_INDEX_SPILL_DIR")
+        self.vector_quantization = os.environ.get("VECTOR_QUANTIZATION", "int8")
+        self.local_index_type = os.environ.get("LOCAL_INDEX_TYPE", "flat")
+        self.ivf_nprobe = int(os.environ.get("IVF_NPROBE", "8"))
+        self.deduplicate = os.environ.get("DEDUPLICATE_CHUNKS", "true").lower() == "true"
+        self.duplicate_detector = NearDuplicateDetector(
+            threshold=float(os.environ.get("DEDUPLICATION_THRESHOLD", "0.85"))
         )
+        self.last_deduplication_stats = None
+        self.metadata_tagger = LegalMetadataTagger()
+        # The model loads on first use; the local backend with a saved index may not need it until the first query
+        self.embeddings = LazyEmbeddings(embedding_backend)
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=200
@@ -29,6 +64,8 @@ class DocumentProcessor:
         
     def load_documents(self) -> List[Any]:
         """Load documents from the directory"""
+        # langchain_community is slow to import and only needed when (re)building an index
+        from langchain_community.document_loaders import PyPDFLoader, DirectoryLoader
         try:
             loader = DirectoryLoader(
                 self.documents_dir,
@@ -42,39 +79,214 @@ class DocumentProcessor:
             print(f"Error loading documents: {e}")
             return []
     
-    def process_documents(self) -> List[Any]:
-        """Split documents into chunks"""
+    def process_documents(self, deduplicate: Optional[bool] = None) -> List[Any]:
+        """Split documents into chunks, collapsing near-duplicate chunks"""
         documents = self.load_documents()
+        tags_by_source = self.metadata_tagger.tag_documents(documents)
+        print(f"Tagged {len(tags_by_source)} sources with jurisdiction and legal domain metadata")
         chunks = self.text_splitter.split_documents(documents)
         print(f"Split into {len(chunks)} chunks")
+
+        if self.deduplicate if deduplicate is None else deduplicate:
+            chunks, stats = deduplicate_chunks(chunks, self.duplicate_detector)
+            self.last_deduplication_stats = stats
+            print(
+                f"Removed {stats['removed_chunks']} near-duplicate chunks in {stats['duplicate_clusters']} clusters "
+                f"({stats['chunk_reduction']:.1%} fewer chunks, {stats['input_chars'] - stats['output_chars']} fewer characters to embed)"
+            )
+
+        for chunk in chunks:
+            chunk.metadata["chunk_id"] = self.chunk_id(chunk)
         return chunks
+
+    @staticmethod
+    def chunk_id(chunk: Any) -> str:
+        """Stable id for a chunk so re-ingestion replaces rather than duplicates it"""
+        key = f"{chunk.metadata.get('source', '')}:{chunk.metadata.get('page', '')}:{chunk.page_content}"
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
     
-    def create_vector_store(self) -> WeaviateVectorStore:
-        """Create and populate vector store with documents using LangChain's WeaviateVectorStore"""
-        
-        client = weaviate.connect_to_weaviate_cloud(
-            cluster_url=self.weaviate_url,
-            auth_credentials=Auth.api_key(self.weaviate_api_key),
-        )
-        
+    @property
+    def connection(self) -> "WeaviateConnection":
+        """Shared Weaviate connection, opened on first use"""
+        if self._connection is None:
+            from processing.weaviate_connection import WeaviateConnection
+            self._connection = WeaviateConnection(url=self.weaviate_url, api_key=self.weaviate_api_key)
+        return self._connection
+
+    def create_vector_store(self, index_name: str = "LegalDocuments") -> "WeaviateVectorStore":
+        """Create and populate the Weaviate collection with batched imports"""
+        # Weaviate client modules load only for the Weaviate backend
+        from weaviate.classes.config import Configure, Property, DataType
+        from weaviate.util import generate_uuid5
+        from langchain_weaviate.vectorstores import WeaviateVectorStore
+        from processing.weaviate_connection import batch_import
+
+        client = self.connection.client
         chunks = self.process_documents()
-        
-        if client.collections.exists("LegalDocuments"):
-            client.collections.delete("LegalDocuments")
-        
-        vector_store = WeaviateVectorStore.from_documents(
-            documents=chunks,
-            embedding=self.embeddings,
+        self.index_name = index_name
+
+        if client.collections.exists(index_name):
+            client.collections.delete(index_name)
+        collection = client.collections.create(
+            index_name,
+            vectorizer_config=Configure.Vectorizer.none(),
+            properties=[
+                Property(name="content", data_type=DataType.TEXT),
+                Property(name="source", data_type=DataType.TEXT),
+                Property(name="page", data_type=DataType.INT),
+                Property(name="chunk_id", data_type=DataType.TEXT),
+                Property(name="jurisdiction", data_type=DataType.TEXT_ARRAY),
+                Property(name="legal_domains", data_type=DataType.TEXT_ARRAY),
+            ]
+        )
+
+        stats = {"imported": 0, "failed": 0}
+        for start in range(0, len(chunks), self.ingest_batch_size):
+            batch = chunks[start:start + self.ingest_batch_size]
+            vectors = self.embeddings.embed_documents([chunk.page_content for chunk in batch])
+            objects = [
+                {
+                    "uuid": generate_uuid5(chunk.metadata["chunk_id"]),
+                    "vector": vector,
+                    "properties": {"content": chunk.page_content, **self._weaviate_properties(chunk.metadata)}
+                }
+                for chunk, vector in zip(batch, vectors)
+            ]
+            for key, value in batch_import(collection, objects).items():
+                stats[key] += value
+
+        print(f"Successfully imported {stats['imported']} chunks into Weaviate ({stats['failed']} failed)")
+        return WeaviateVectorStore(
             client=client,
-            index_name="LegalDocuments", 
+            index_name=index_name,
             text_key="content",
-            by_text=False
+            embedding=self.embeddings
         )
-        
-        print(f"Successfully imported {len(chunks)} chunks into Weaviate")
-        return vector_store
-    
-    def query_store(self, query: str, vector_store: WeaviateVectorStore, k: int = 5):
+
+    @staticmethod
+    def _weaviate_properties(metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """Metadata as Weaviate property names (letters, digits and underscores only)"""
+        return {re.sub(r"\W", "_", key): value for key, value in metadata.items() if value is not None}
+
+    @property
+    def search_executor(self) -> ThreadPoolExecutor:
+        with self._search_executor_lock:
+            if self._search_executor is None:
+                self._search_executor = ThreadPoolExecutor(self.search_concurrency, thread_name_prefix="weaviate-search")
+            return self._search_executor
+
+    def _shutdown_search_executor(self):
+        with self._search_executor_lock:
+            executor, self._search_executor = self._search_executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def before_fork(self):
+        # Threads do not survive a fork; the executor is recreated on the next search
+        self._shutdown_search_executor()
+        if self._connection is not None:
+            self._connection.suspend()
+
+    def after_fork(self):
+        if self._connection is not None:
+            self._connection.resume()
+
+    def close(self):
+        """Release the Weaviate connection and the search threads"""
+        self._shutdown_search_executor()
+        if self._connection is not None:
+            self._connection.close()
+
+    def create_local_index(self, index_dir: Optional[str] = None, quantization: Optional[str] = None, refresh: bool = False) -> LocalVectorIndex:
+        """Create the in-process retrieval index, reusing a persisted one when available"""
+        index_dir = index_dir or self.local_index_dir
+        quantization = quantization or self.vector_quantization
+        index_cls = LOCAL_INDEX_TYPES[self.local_index_type]
+
+        if index_dir and os.path.exists(os.path.join(index_dir, "index.json")):
+            index = index_cls.load(index_dir, embeddings=self.embeddings, spill_dir=self.local_index_spill_dir)
+            print(f"Loaded local index with {len(index)} chunks from {index_dir}")
+            if refresh:
+                self.sync_local_index(index, self.process_documents())
+                index.save(index_dir)
+            return index
+
+        kwargs = {"nprobe": self.ivf_nprobe} if index_cls is IVFVectorIndex else {}
+        index = index_cls(embeddings=self.embeddings, quantization=quantization, spill_dir=self.local_index_spill_dir, **kwargs)
+        index.add_documents(self.process_documents())
+        if index_dir:
+            index.save(index_dir)
+
+        usage = index.memory_usage()
+        print(f"Indexed {len(index)} chunks locally ({self.local_index_type}, {quantization}, {usage['scan_bytes']} scan bytes)")
+        return index
+
+    def sync_local_index(self, index: LocalVectorIndex, chunks: List[Any]) -> Dict[str, int]:
+        """Re-ingest into an existing index, embedding only chunks whose content changed"""
+        incoming = {chunk.metadata["chunk_id"]: chunk for chunk in chunks}
+        sources = {chunk.metadata.get("source") for chunk in chunks}
+
+        stale = [
+            doc_id for doc_id, doc in zip(index.ids, index.documents)
+            if doc is not None and doc.metadata.get("source") in sources and doc_id not in incoming
+        ]
+        index.delete(stale)
+
+        new_chunks = [chunk for doc_id, chunk in incoming.items() if doc_id not in index]
+        index.add_documents(new_chunks)
+        if stale:
+            index.compact()
+
+        stats = {"added": len(new_chunks), "removed": len(stale), "unchanged": len(incoming) - len(new_chunks)}
+        print(f"Re-ingested local index: {stats}")
+        return stats
+
+    def build_keyword_index(self, vector_index: LocalVectorIndex) -> BM25Index:
+        """Build the BM25 index over the same live chunks as the vector index"""
+        live = [(doc_id, doc) for doc_id, doc in zip(vector_index.ids, vector_index.documents) if doc is not None]
+        return BM25Index.from_texts([doc_id for doc_id, _ in live], (doc.page_content for _, doc in live))
+
+    def create_hybrid_retriever(self, index_dir: Optional[str] = None, refresh: bool = False) -> HybridRetriever:
+        """Create the local vector index plus a BM25 index fused with reciprocal rank fusion"""
+        index_dir = index_dir or self.local_index_dir
+        vector_index = self.create_local_index(index_dir, refresh=refresh)
+
+        bm25_dir = os.path.join(index_dir, "bm25") if index_dir else None
+        bm25_index = BM25Index.load(bm25_dir) if BM25Index.exists(bm25_dir) else None
+        if bm25_index is None or refresh or len(bm25_index) != len(vector_index):
+            bm25_index = self.build_keyword_index(vector_index)
+            if bm25_dir:
+                bm25_index.save(bm25_dir)
+
+        return HybridRetriever(vector_index, bm25_index)
+
+    def search_collection_multi(self, queries: List[str], k: int = 5, filters: Any = None) -> List[Tuple[Document, float]]:
+        """Vector-search the Weaviate collection for several queries embedded in one batch, searching them concurrently"""
+        from weaviate.classes.query import MetadataQuery
+        collection = self.connection.client.collections.get(self.index_name)
+
+        def search(vector: List[float]) -> List[Tuple[Document, float]]:
+            response = collection.query.near_vector(
+                near_vector=vector,
+                limit=k,
+                filters=filters,
+                return_metadata=MetadataQuery(distance=True)
+            )
+            results = []
+            for obj in response.objects:
+                properties = dict(obj.properties)
+                # Cosine distance turned into the similarity the local indexes report, so higher is better everywhere
+                results.append((Document(page_content=properties.pop("content", ""), metadata=properties), 1.0 - obj.metadata.distance))
+            return results
+
+        vectors = self.embeddings.embed_documents(queries)
+        if len(queries) <= 1 or self.search_concurrency <= 1:
+            per_query = [search(vector) for vector in vectors]
+        else:
+            per_query = list(self.search_executor.map(search, vectors))
+        return merge_multi_query_results(per_query, k)
+
+    def query_store(self, query: str, vector_store: "WeaviateVectorStore", k: int = 5):
         """Query the vector store for similar documents"""
         docs = vector_store.similarity_search(query, k=k)
         return docs
\ No newline at end of file
@@ -0,0 +1,155 @@
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# Exported graphs published alongside the model on the Hugging Face Hub
+ONNX_MODEL_FILES = {
+    "onnx": "onnx/model.onnx",
+    "onnx-int8": "onnx/model_quint8_avx2.onnx",
+}
+
+# An alternative runtime may replace torch only if it stays this close to torch's embeddings
+PARITY_MIN_COSINE = 0.99
+PARITY_MIN_NEIGHBOUR_AGREEMENT = 1.0
+
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence embeddings from an exported ONNX graph, without importing PyTorch"""
+
+    def __init__(
+        self,
+        model_name: str = EMBEDDING_MODEL_NAME,
+        model_file: str = ONNX_MODEL_FILES["onnx"],
+        batch_size: int = 32,
+        max_length: int = 256,
+        num_threads: Optional[int] = None
+    ):
+        try:
+            import onnxruntime as ort
+            from huggingface_hub import hf_hub_download
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError("The ONNX embedding backend needs onnxruntime, tokenizers and huggingface_hub installed") from e
+
+        self.model_name = model_name
+        self.model_file = model_file
+        self.batch_size = batch_size
+
+        self.tokenizer = Tokenizer.from_file(hf_hub_download(model_name, "tokenizer.json"))
+        # Same truncation as the sentence-transformers config for this model
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            hf_hub_download(model_name, model_file),
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Mean-pool token embeddings over the attention mask and L2-normalize"""
+        encodings = self.tokenizer.encode_batch(texts)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        token_embeddings = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+
+        mask = feeds["attention_mask"][:, :, None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self._encode(texts[start:start + self.batch_size]).tolist())
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
+
+
+def create_embeddings(backend: Optional[str] = None) -> Embeddings:
+    """Build the embedding model for the selected runtime backend"""
+    backend = backend or os.environ.get("EMBEDDING_BACKEND", "torch")
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unsupported embedding backend: {backend}")
+
+    if backend == "torch":
+        # Imported here so the ONNX backends never pull in PyTorch
+        from langchain_huggingface import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+
+    model_file = os.environ.get("ONNX_MODEL_FILE", ONNX_MODEL_FILES[backend])
+    return OnnxEmbeddings(model_file=model_file)
+
+
+class LazyEmbeddings(Embeddings):
+    """Loads the embedding model on the first embed call instead of at construction"""
+
+    def __init__(self, backend: Optional[str] = None):
+        self.backend = backend
+        self._model: Optional[Embeddings] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    @property
+    def model(self) -> Embeddings:
+        with self._lock:
+            if self._model is None:
+                self._model = create_embeddings(self.backend)
+            return self._model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.model.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.model.embed_query(text)
+
+
+def embedding_parity(reference: Embeddings, candidate: Embeddings, texts: List[str]) -> Dict[str, Any]:
+    """Compare two embedding backends on the same texts by cosine similarity and top-1 agreement"""
+    ref = np.asarray(reference.embed_documents(texts), dtype=np.float32)
+    cand = np.asarray(candidate.embed_documents(texts), dtype=np.float32)
+    ref /= np.linalg.norm(ref, axis=1, keepdims=True)
+    cand /= np.linalg.norm(cand, axis=1, keepdims=True)
+
+    cosine = (ref * cand).sum(axis=1)
+    # Each text's nearest neighbour among the others should not change between backends
+    ref_sim, cand_sim = ref @ ref.T, cand @ cand.T
+    np.fill_diagonal(ref_sim, -np.inf)
+    np.fill_diagonal(cand_sim, -np.inf)
+    neighbour_agreement = float(np.mean(ref_sim.argmax(axis=1) == cand_sim.argmax(axis=1)))
+
+    return {
+        "texts": len(texts),
+        "min_cosine": float(cosine.min()),
+        "mean_cosine": float(cosine.mean()),
+        "neighbour_agreement": neighbour_agreement,
+    }
+
+
+def parity_failures(parity: Dict[str, Any], min_cosine: float = PARITY_MIN_COSINE,
+                    min_neighbour_agreement: float = PARITY_MIN_NEIGHBOUR_AGREEMENT) -> List[str]:
+    """Reasons an embedding_parity result falls short of the thresholds; empty when it passes"""
+    failures = []
+    if parity["min_cosine"] < min_cosine:
+        failures.append(f"min cosine {parity['min_cosine']:.5f} < {min_cosine}")
+    if parity["neighbour_agreement"] < min_neighbour_agreement:
+        failures.append(f"nearest-neighbour agreement {parity['neighbour_agreement']:.0%} < {min_neighbour_agreement:.0%}")
+    return failures
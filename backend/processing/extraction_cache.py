@@ -0,0 +1,126 @@
+import os
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Union
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class ExtractionCache:
+    """Extracted document text keyed by a hash of the uploaded bytes, in a memory LRU over a size-capped disk tier"""
+
+    def __init__(
+        self,
+        namespace: str = "",
+        max_items: Optional[int] = None,
+        cache_dir: Optional[str] = None,
+        max_disk_bytes: Optional[int] = None
+    ):
+        # The namespace folds in extraction settings, so changing OCR options never serves stale text
+        self.namespace = namespace
+        self.max_items = max_items if max_items is not None else int(os.environ.get("EXTRACTION_CACHE_ITEMS", "128"))
+        self.cache_dir = cache_dir or os.environ.get("EXTRACTION_CACHE_DIR")
+        self.max_disk_bytes = max_disk_bytes or int(os.environ.get("EXTRACTION_CACHE_MAX_BYTES", str(1024 ** 3)))
+
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = None
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key_for(self, input_type: str, data: Union[str, bytes, bytearray, memoryview]) -> str:
+        """Content address of an upload; paths are hashed by their bytes, not their name"""
+        digest = hashlib.blake2b(f"{self.namespace}:{input_type}:".encode("utf-8"), digest_size=20)
+        if isinstance(data, str):
+            with open(data, "rb") as f:
+                for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+        else:
+            digest.update(data)
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits["memory"] += 1
+                return self._memory[key]
+
+        if self.cache_dir and os.path.exists(self._path(key)):
+            try:
+                with open(self._path(key), "rb") as f:
+                    extraction = pickle.load(f)
+                # Touch the file so disk eviction is least-recently-used rather than oldest-written
+                os.utime(self._path(key))
+            except (OSError, pickle.UnpicklingError, EOFError) as e:
+                print(f"Discarding unreadable extraction cache entry {key}: {e}")
+                self._remove(key)
+            else:
+                self._remember(key, extraction)
+                self.hits["disk"] += 1
+                return extraction
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, extraction: Dict[str, Any]):
+        self._remember(key, extraction)
+        if not self.cache_dir:
+            return
+
+        tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(extraction, f, protocol=pickle.HIGHEST_PROTOCOL)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, self._path(key))
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += size
+        self._evict_disk()
+
+    def _remember(self, key: str, extraction: Dict[str, Any]):
+        with self._lock:
+            self._memory[key] = extraction
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    def _remove(self, key: str):
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _evict_disk(self):
+        """Drop least-recently-used files until the disk tier fits its byte budget"""
+        with self._lock:
+            if self._disk_bytes is not None and self._disk_bytes <= self.max_disk_bytes:
+                return
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".pkl"):
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                    entries.append((stat.st_mtime, stat.st_size, name))
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.max_disk_bytes:
+                    break
+                os.unlink(os.path.join(self.cache_dir, name))
+                total -= size
+            self._disk_bytes = total
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "memory_items": len(self._memory),
+            "disk_bytes": self._disk_bytes,
+            "memory_hits": self.hits["memory"],
+            "disk_hits": self.hits["disk"],
+            "misses": self.misses,
+        }
@@ -0,0 +1,192 @@
+import os
+import time
+import asyncio
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Set
+
+_worker_handler = None
+
+
+class ExtractionQueueFull(RuntimeError):
+    """Raised when the extraction queue is at capacity"""
+
+
+class ExtractionTimeout(TimeoutError):
+    """Raised when one extraction job runs past its timeout"""
+
+
+def extraction_workers() -> int:
+    """Extraction processes to run: EXTRACTION_WORKERS, or up to four on a machine with the cores"""
+    return int(os.environ.get("EXTRACTION_WORKERS", min(4, os.cpu_count() or 1)))
+
+
+def _extract(input_type: str, data: Any, text_query: str) -> Dict[str, Any]:
+    """Run one OCR / PDF extraction inside a worker process"""
+    global _worker_handler
+    if _worker_handler is None:
+        from processing.multimodal_handler import MultimodalInputHandler
+        _worker_handler = MultimodalInputHandler()
+    return _worker_handler.process_input(data, input_type, text_query=text_query)
+
+
+class ExtractionPool:
+    """Process pool for CPU-heavy OCR and PDF extraction, kept off the API event loop"""
+
+    def __init__(self, max_workers: Optional[int] = None, max_queue: Optional[int] = None, timeout: Optional[float] = None,
+                 job: Callable[[str, Any, str], Dict[str, Any]] = _extract):
+        # Sized independently of the API workers: extraction is CPU-bound, the API is I/O-bound
+        self.max_workers = max_workers or extraction_workers()
+        self.max_queue = max_queue if max_queue is not None else int(os.environ.get("EXTRACTION_QUEUE_SIZE", "32"))
+        self.timeout = timeout or float(os.environ.get("EXTRACTION_TIMEOUT", "120"))
+        self.job = job
+
+        self._executor = None
+        # Futures not yet known to be done, per pool, so a retired pool is torn down only once its healthy jobs finish
+        self._futures: Dict[ProcessPoolExecutor, Set[Any]] = {}
+        self._stuck: Set[Any] = set()
+        # Shutting a pool down forgets its processes, so retired pools keep their own list
+        self._retired: Dict[ProcessPoolExecutor, List[Any]] = {}
+        self._pending = 0
+        self._latencies = deque(maxlen=1000)
+        self._counts = {"completed": 0, "failed": 0, "timed_out": 0, "cancelled": 0, "rejected": 0, "recycled": 0}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Spawned workers import only the extraction code, not the embedding model or the agent graph
+            self._executor = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    @staticmethod
+    def _processes(executor: ProcessPoolExecutor) -> List[Any]:
+        return list((getattr(executor, "_processes", None) or {}).values())
+
+    @staticmethod
+    def _terminate(executor: ProcessPoolExecutor, processes: List[Any]) -> int:
+        executor.shutdown(wait=False)
+        for process in processes:
+            process.terminate()
+        return len(processes)
+
+    def _recycle(self, executor: Optional[ProcessPoolExecutor]):
+        """Replace a broken pool; its workers are dead or about to be"""
+        # Jobs failing together on one broken pool must not tear down its replacement
+        if executor is None or executor is not self._executor:
+            return
+        self._executor = None
+        self._futures.pop(executor, None)
+        count = self._terminate(executor, self._processes(executor))
+        self._counts["recycled"] += 1
+        print(f"Recycled {count} extraction workers")
+
+    def _retire(self, executor: ProcessPoolExecutor):
+        """Send new jobs to a fresh pool, leaving a pool with a stuck job to finish its other jobs.
+
+        A process pool cannot kill one worker without failing every job in it, so the stuck worker is
+        terminated with the pool once the rest of its jobs are done; until then both pools hold processes.
+        """
+        if executor is self._executor:
+            self._executor = None
+            self._retired[executor] = self._processes(executor)
+            # Jobs already queued on the old pool still run there, on its healthy workers
+            executor.shutdown(wait=False)
+        self._reap()
+
+    def _reap(self):
+        """Terminate retired pools whose only unfinished jobs are the stuck ones, or whose every worker is stuck"""
+        for executor in list(self._retired):
+            futures = self._futures.get(executor, set())
+            stuck = futures & self._stuck
+            # With every worker stuck, the other jobs are still queued; terminating fails them over to the fresh pool
+            if len(stuck) < self.max_workers and any(not future.done() and future not in stuck for future in futures):
+                continue
+            processes = self._retired.pop(executor)
+            self._futures.pop(executor, None)
+            self._stuck -= futures
+            count = self._terminate(executor, processes)
+            self._counts["recycled"] += 1
+            print(f"Recycled {count} extraction workers after a timed-out job")
+
+    @property
+    def queue_depth(self) -> int:
+        """Jobs waiting for a free worker"""
+        return max(0, self._pending - self.max_workers)
+
+    @property
+    def is_full(self) -> bool:
+        return self.queue_depth >= self.max_queue
+
+    async def run(self, input_type: str, data: Any, text_query: Optional[str] = "", timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Extract text from an image or PDF in the pool, bounded by the queue size and a per-job timeout"""
+        if self.is_full:
+            self._counts["rejected"] += 1
+            raise ExtractionQueueFull(f"Extraction queue is full ({self.max_queue} jobs waiting)")
+
+        timeout = timeout or self.timeout
+        self._pending += 1
+        start = time.perf_counter()
+        future = executor = None
+        try:
+            for attempt in range(2):
+                future = None
+                executor = self._get_executor()
+                try:
+                    future = executor.submit(self.job, input_type, data, text_query or "")
+                    self._futures.setdefault(executor, set()).add(future)
+                    result = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+                    break
+                except BrokenProcessPool:
+                    # A worker died; resubmit once on fresh workers
+                    self._recycle(executor)
+                    if attempt:
+                        raise
+        except asyncio.TimeoutError:
+            self._counts["timed_out"] += 1
+            if future is not None and future.running():
+                # Only a pool process can stop a running job; other jobs in that pool are left to finish
+                self._stuck.add(future)
+                self._retire(executor)
+            raise ExtractionTimeout(f"{input_type} extraction exceeded {timeout:.0f}s")
+        except asyncio.CancelledError:
+            # Queued jobs are dropped; a job already running finishes and is discarded
+            self._counts["cancelled"] += 1
+            if future is not None:
+                future.cancel()
+            raise
+        except Exception:
+            self._counts["failed"] += 1
+            raise
+        finally:
+            self._pending -= 1
+            if executor in self._futures:
+                self._futures[executor] = {pending for pending in self._futures[executor] if not pending.done()}
+            self._reap()
+
+        self._counts["completed"] += 1
+        self._latencies.append(time.perf_counter() - start)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, job outcomes and recent job latency"""
+        latencies = sorted(self._latencies)
+        percentile = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else None
+        return {
+            "workers": self.max_workers,
+            "running": min(self._pending, self.max_workers),
+            "queue_depth": self.queue_depth,
+            "retired_pools": len(self._retired),
+            "max_queue": self.max_queue,
+            **self._counts,
+            "latency_p50_s": percentile(0.5),
+            "latency_p95_s": percentile(0.95),
+        }
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        for executor, processes in self._retired.items():
+            self._terminate(executor, processes)
+        self._retired, self._futures, self._stuck = {}, {}, set()
@@ -0,0 +1,124 @@
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+US_STATES = [
+    "Alabama", "Alaska", "Arizona", "Arkansas", "California", "Colorado", "Connecticut", "Delaware",
+    "Florida", "Georgia", "Hawaii", "Idaho", "Illinois", "Indiana", "Iowa", "Kansas", "Kentucky",
+    "Louisiana", "Maine", "Maryland", "Massachusetts", "Michigan", "Minnesota", "Mississippi",
+    "Missouri", "Montana", "Nebraska", "Nevada", "New Hampshire", "New Jersey", "New Mexico",
+    "New York", "North Carolina", "North Dakota", "Ohio", "Oklahoma", "Oregon", "Pennsylvania",
+    "Rhode Island", "South Carolina", "South Dakota", "Tennessee", "Texas", "Utah", "Vermont",
+    "Virginia", "Washington", "West Virginia", "Wisconsin", "Wyoming",
+]
+
+JURISDICTION_KEYWORDS = {
+    "federal": ["federal", "u.s.c", "united states code", "supreme court of the united states", "circuit court of appeals", "congress"],
+    **{state.lower().replace(" ", "_"): [state.lower()] for state in US_STATES},
+}
+
+DOMAIN_KEYWORDS = {
+    "criminal": ["criminal", "crime", "prosecution", "felony", "misdemeanor", "sentencing", "defendant"],
+    "contract": ["contract", "agreement", "breach", "consideration", "offer and acceptance", "non-compete"],
+    "property": ["property", "landlord", "tenant", "lease", "eviction", "real estate", "easement", "deposit"],
+    "tort": ["tort", "negligence", "liability", "damages", "injury", "nuisance", "defamation"],
+    "family": ["divorce", "custody", "child support", "marriage", "alimony", "adoption"],
+    "employment": ["employment", "employer", "employee", "wage", "termination", "discrimination", "workplace"],
+    "constitutional": ["constitution", "constitutional", "amendment", "due process", "equal protection", "first amendment"],
+    "administrative": ["agency", "regulation", "administrative", "rulemaking", "licensing"],
+    "corporate": ["corporation", "shareholder", "securities", "merger", "fiduciary", "board of directors"],
+    "civil_procedure": ["civil procedure", "jurisdiction", "pleading", "discovery", "motion to dismiss", "summary judgment"],
+}
+
+DEFAULT_TAG = "general"
+
+
+def _count_hits(text: str, keywords: Dict[str, List[str]]) -> Counter:
+    hits = Counter()
+    for tag, words in keywords.items():
+        for word in words:
+            count = len(re.findall(rf"\b{re.escape(word)}", text))
+            if count:
+                hits[tag] += count
+    return hits
+
+
+class LegalMetadataTagger:
+    """Tag source documents with jurisdiction and legal-domain metadata for filtered retrieval.
+
+    Both tags are lists: a chunk merged from duplicates in several sources carries every source's tags.
+    """
+
+    def __init__(self, sample_chars: int = 50000, min_hits: int = 2, max_domains: int = 3):
+        self.sample_chars = sample_chars
+        self.min_hits = min_hits
+        self.max_domains = max_domains
+
+    def classify(self, source: str, text: str) -> Dict[str, Any]:
+        # The path often names the jurisdiction (e.g. notes/california/...), so it counts extra
+        path = re.sub(r"[_\-/\\.]+", " ", source.lower())
+        sample = f"{path} {path} {path} {text[:self.sample_chars].lower()}"
+
+        jurisdictions = _count_hits(sample, JURISDICTION_KEYWORDS)
+        jurisdiction, hits = jurisdictions.most_common(1)[0] if jurisdictions else (DEFAULT_TAG, 0)
+        if hits < self.min_hits:
+            jurisdiction = DEFAULT_TAG
+
+        domains = _count_hits(sample, DOMAIN_KEYWORDS)
+        top = domains.most_common(1)[0][1] if domains else 0
+        legal_domains = [
+            domain for domain, count in domains.most_common(self.max_domains)
+            if count >= max(self.min_hits, 0.2 * top)
+        ]
+
+        return {"jurisdiction": [jurisdiction], "legal_domains": legal_domains or [DEFAULT_TAG]}
+
+    def tag_documents(self, documents: List[Any]) -> Dict[str, Dict[str, Any]]:
+        """Tag every page of a source with the classification of the whole source"""
+        pages_by_source: Dict[str, List[Any]] = {}
+        for doc in documents:
+            pages_by_source.setdefault(doc.metadata.get("source", ""), []).append(doc)
+
+        tags_by_source = {}
+        for source, pages in pages_by_source.items():
+            text = "\n".join(page.page_content for page in pages)
+            tags = self.classify(source, text)
+            for page in pages:
+                page.metadata.update(tags)
+            tags_by_source[source] = tags
+        return tags_by_source
+
+
+def _as_list(value: Union[str, Iterable[str], None]) -> List[str]:
+    if not value:
+        return []
+    if isinstance(value, str):
+        return re.split(r"\s*(?:,|;|/|\band\b)\s*", value)
+    return [str(item) for item in value]
+
+
+def _match_tags(values: List[str], keywords: Dict[str, List[str]]) -> List[str]:
+    tags = []
+    for value in values:
+        text = value.lower().replace("_", " ")
+        for tag, words in keywords.items():
+            names = [tag.replace("_", " ")] + words
+            if tag not in tags and any(re.search(rf"\b{re.escape(name)}\b", text) for name in names):
+                tags.append(tag)
+    return tags
+
+
+def filters_from_query(query_details: Dict[str, Any]) -> Optional[Dict[str, List[str]]]:
+    """Map the LLM's free-text jurisdiction/legal_domains onto the ingestion tag vocabulary"""
+    filters = {}
+
+    jurisdictions = _match_tags(_as_list(query_details.get("jurisdiction")), JURISDICTION_KEYWORDS)
+    if jurisdictions:
+        # Untagged general material applies everywhere, and federal law applies in every state
+        filters["jurisdiction"] = jurisdictions + [tag for tag in ("federal", DEFAULT_TAG) if tag not in jurisdictions]
+
+    domains = _match_tags(_as_list(query_details.get("legal_domains")), DOMAIN_KEYWORDS)
+    if domains:
+        filters["legal_domains"] = domains + [DEFAULT_TAG]
+
+    return filters or None
@@ -1,9 +1,15 @@
 import os
-from typing import Dict, Any, Optional, List, Union
+import time
 import tempfile
-from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Union, Iterator, BinaryIO, Callable, Tuple
+from PIL import Image, ImageSequence
 import pytesseract
-from langchain_community.document_loaders import PyPDFLoader
+from pdf2image import convert_from_path
+from pypdf import PdfReader
+from langchain_core.documents import Document
+from processing.ocr_preprocessing import OCRPreprocessor
+from processing.extraction_pool import extraction_workers
 from io import BytesIO
 
 class MultimodalInputHandler:
@@ -12,8 +18,23 @@ class MultimodalInputHandler:
     def __init__(self):
         # Configure pytesseract path if needed
         # pytesseract.pytesseract.tesseract_cmd = r'<path_to_tesseract_executable>'
-        pass
+
+        # tesseract and pdftoppm run as subprocesses, so a thread per page spreads the work across cores.
+        # Every extraction worker runs its own page threads, so by default they split the cores between them.
+        self.ocr_workers = int(os.environ.get("OCR_PAGE_WORKERS", max(1, (os.cpu_count() or 1) // extraction_workers())))
+        self.max_ocr_pages = int(os.environ.get("MAX_OCR_PAGES", "50"))
+        self.ocr_dpi = int(os.environ.get("OCR_DPI", "300"))
+        self.min_page_text_chars = int(os.environ.get("MIN_PAGE_TEXT_CHARS", "25"))
+        self.preprocessor = OCRPreprocessor() if os.environ.get("OCR_PREPROCESS", "true").lower() == "true" else None
+        if self.ocr_workers > 1 or extraction_workers() > 1:
+            # Page- and document-level parallelism replace tesseract's own threading, which would oversubscribe the cores
+            os.environ.setdefault("OMP_THREAD_LIMIT", "1")
     
+    def settings_fingerprint(self) -> str:
+        """Options that change the extracted text, folded into extraction cache keys"""
+        preprocessing = sorted(vars(self.preprocessor).items()) if self.preprocessor else None
+        return repr((self.max_ocr_pages, self.ocr_dpi, self.min_page_text_chars, preprocessing))
+
     def process_text(self, text: str) -> Dict[str, Any]:
         """Process plain text input"""
         return {
@@ -31,74 +52,135 @@ class MultimodalInputHandler:
         else:
             image = image_data
             
-        extracted_text = pytesseract.image_to_string(image)
-        content = extracted_text
-        if text_query:
-            content = f"Image content: {extracted_text}\n\nUser query: {text_query}"
+        # Multi-page TIFFs hold one scanned page per frame
+        frame_count = getattr(image, "n_frames", 1)
+        frames = [frame.copy() for _, frame in zip(range(self.max_ocr_pages), ImageSequence.Iterator(image))]
+        results = self._run_pages([lambda frame=frame: self.ocr(frame) for frame in frames])
+
+        extracted_text = "\n\n".join(text for text, _ in results)
         
-        return {
+        return self.attach_query({
             "type": "image",
-            "content": content,
+            "content": extracted_text,
             "metadata": {
                 "original_format": "image",
                 "image_size": image.size,
                 "extracted_text": extracted_text,
-                "user_query": text_query,
-                "image_mode": image.mode
+                "image_mode": image.mode,
+                "frame_count": frame_count,
+                "ocr_skipped_pages": frame_count - len(frames),
+                "page_stats": [{"page": page, "method": "ocr", "seconds": seconds} for page, (_, seconds) in enumerate(results)]
             }
-        }
-    
-    def process_pdf(self, pdf_data: Union[str, bytes], text_query: Optional[str] = "") -> Dict[str, Any]:
-        """Process PDF input"""
-        if isinstance(pdf_data, bytes):
-            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_file:
-                temp_file.write(pdf_data)
-                temp_file_path = temp_file.name
-                
-            try:
-                loader = PyPDFLoader(temp_file_path)
-                documents = loader.load()
-
-                full_text = "\n".join(doc.page_content for doc in documents)
-                content = full_text
-                if text_query:
-                    content = f"PDF content: {full_text}\n\nUser query: {text_query}"
-                
-                return {
-                    "type": "pdf",
-                    "content": content,
-                    "metadata": {
-                        "original_format": "pdf",
-                        "page_count": len(documents),
-                        "documents": documents,
-                        "extracted_text": full_text,
-                        "user_query": text_query
-                    }
-                }
-            finally:
-                os.unlink(temp_file_path)
+        }, text_query)
+
+    def ocr(self, image: Image.Image) -> str:
+        """OCR one page image, preprocessed unless disabled"""
+        if self.preprocessor is not None:
+            image = self.preprocessor(image)
+        return pytesseract.image_to_string(image)
+
+    def _run_pages(self, jobs: List[Callable[[], str]]) -> List[Tuple[str, float]]:
+        """Run per-page extraction jobs in parallel and return (text, seconds) in page order"""
+        def timed(job: Callable[[], str]) -> Tuple[str, float]:
+            start = time.perf_counter()
+            text = job()
+            return text, time.perf_counter() - start
+
+        if len(jobs) <= 1 or self.ocr_workers <= 1:
+            return [timed(job) for job in jobs]
+        with ThreadPoolExecutor(max_workers=min(self.ocr_workers, len(jobs))) as executor:
+            return list(executor.map(timed, jobs))
+
+    def _ocr_scanned_pages(self, pdf_data: Union[str, bytes, bytearray, memoryview, BinaryIO], pages: List[Document]) -> List[float]:
+        """Rasterize and OCR pages that have no usable text layer, replacing their text in place"""
+        if isinstance(pdf_data, str):
+            return self._ocr_pdf_file(pdf_data, pages)
+
+        if not isinstance(pdf_data, (bytes, bytearray, memoryview)):
+            pdf_data.seek(0)
+            pdf_data = pdf_data.read()
+        # pdftoppm needs a file; write it once rather than once per page
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as pdf_file:
+            pdf_file.write(pdf_data)
+            pdf_file.flush()
+            return self._ocr_pdf_file(pdf_file.name, pages)
+
+    def _ocr_pdf_file(self, path: str, pages: List[Document]) -> List[float]:
+        def ocr_page(page_number: int) -> str:
+            images = convert_from_path(path, dpi=self.ocr_dpi, first_page=page_number + 1, last_page=page_number + 1)
+            return "\n".join(self.ocr(image) for image in images)
+
+        results = self._run_pages([lambda page=page: ocr_page(page.metadata["page"]) for page in pages])
+        for page, (text, _) in zip(pages, results):
+            page.page_content = text
+            page.metadata["ocr"] = True
+        return [seconds for _, seconds in results]
+
+    def iter_pdf_pages(self, pdf_data: Union[str, bytes, bytearray, memoryview, BinaryIO], source: str = "upload.pdf") -> Iterator[Document]:
+        """Yield one Document per PDF page, reading the text layer from a path, buffer or file object.
+
+        pypdf parses the page tree up front, so this saves no memory over a list; it only spares
+        callers that stop early the text extraction of the remaining pages.
+        """
+        if isinstance(pdf_data, str):
+            stream, source = open(pdf_data, "rb"), pdf_data
+        elif isinstance(pdf_data, (bytes, bytearray, memoryview)):
+            # Parse straight from the uploaded buffer; no temp file and no second copy for bytes
+            stream = BytesIO(pdf_data)
         else:
-            loader = PyPDFLoader(pdf_data)
-            documents = loader.load()
-            
-            full_text = "\n".join(doc.page_content for doc in documents)
+            stream = pdf_data
+            stream.seek(0)
 
-            content = full_text
-            if text_query:
-                content = f"PDF content: {full_text}\n\nUser query: {text_query}"
-            
-            return {
-                "type": "pdf",
-                "content": content,
-                "metadata": {
-                    "original_format": "pdf",
-                    "page_count": len(documents),
-                    "documents": documents,
-                    "extracted_text": full_text,
-                    "user_query": text_query
-                }
+        try:
+            reader = PdfReader(stream)
+            for page_number, page in enumerate(reader.pages):
+                yield Document(page_content=page.extract_text() or "", metadata={"source": source, "page": page_number})
+        finally:
+            if isinstance(pdf_data, str):
+                stream.close()
+
+    def process_pdf(self, pdf_data: Union[str, bytes, bytearray, memoryview, BinaryIO], text_query: Optional[str] = "") -> Dict[str, Any]:
+        """Process PDF input"""
+        # Every page is kept: the brief builder needs the page Documents and the prompt needs all of the text
+        documents, page_stats = [], []
+        start = time.perf_counter()
+        for page in self.iter_pdf_pages(pdf_data):
+            documents.append(page)
+            page_stats.append({"page": page.metadata["page"], "method": "text", "seconds": time.perf_counter() - start})
+            start = time.perf_counter()
+
+        # Scanned filings have no text layer; OCR just those pages, up to the per-document cap
+        scanned = [page for page in documents if len(page.page_content.strip()) < self.min_page_text_chars]
+        ocr_pages = scanned[:self.max_ocr_pages]
+        if ocr_pages:
+            for page, seconds in zip(ocr_pages, self._ocr_scanned_pages(pdf_data, ocr_pages)):
+                page_stats[page.metadata["page"]].update(method="ocr", seconds=seconds)
+
+        # The page Documents already hold the text; join it once for the prompt instead of keeping a second full copy
+        content = "\n".join(page.page_content for page in documents)
+
+        return self.attach_query({
+            "type": "pdf",
+            "content": content,
+            "metadata": {
+                "original_format": "pdf",
+                "page_count": len(documents),
+                "documents": documents,
+                "ocr_page_count": len(ocr_pages),
+                "ocr_skipped_pages": len(scanned) - len(ocr_pages),
+                "page_stats": page_stats
             }
-    
+        }, text_query)
+
+    @staticmethod
+    def attach_query(extraction: Dict[str, Any], text_query: Optional[str] = "") -> Dict[str, Any]:
+        """Combine extracted document text with the user's question, leaving the extraction itself untouched"""
+        content = extraction["content"]
+        if text_query:
+            label = "Image content" if extraction["type"] == "image" else "PDF content"
+            content = f"{label}: {content}\n\nUser query: {text_query}"
+        return {**extraction, "content": content, "metadata": {**extraction["metadata"], "user_query": text_query}}
+
     def process_input(self, input_data: Any, input_type: str, text_query: Optional[str] = "") -> Dict[str, Any]:
         """Process any input based on its type"""
         if input_type == "text":
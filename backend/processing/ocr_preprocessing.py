@@ -0,0 +1,81 @@
+import os
+from typing import Optional
+
+import numpy as np
+from PIL import Image, ImageOps
+
+# Phone photos carry no usable DPI, so assume the long side spans a letter/A4 page
+DEFAULT_PAGE_INCHES = 11.0
+# Cameras and image editors write 72 or 96 as a screen default; it says nothing about the page
+PLACEHOLDER_DPI_MAX = 96
+# A stated DPI implying a page longer than this (tabloid) is not believed either
+MAX_PAGE_INCHES = 17.0
+
+
+def _otsu_threshold(gray: np.ndarray) -> int:
+    """Grey level that best separates ink from paper"""
+    histogram = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    levels = np.arange(256)
+    weight_dark = np.cumsum(histogram)
+    weight_light = weight_dark[-1] - weight_dark
+    mean_dark = np.cumsum(histogram * levels) / np.maximum(weight_dark, 1)
+    mean_light = ((histogram * levels).sum() - np.cumsum(histogram * levels)) / np.maximum(weight_light, 1)
+    between = weight_dark * weight_light * (mean_dark - mean_light) ** 2
+    return int(np.argmax(between))
+
+
+class OCRPreprocessor:
+    """Normalize document photos before OCR: orientation, resolution, contrast and framing"""
+
+    def __init__(
+        self,
+        target_dpi: Optional[int] = None,
+        page_inches: float = DEFAULT_PAGE_INCHES,
+        grayscale: bool = True,
+        binarize: Optional[bool] = None,
+        crop: Optional[bool] = None,
+        crop_margin: int = 20
+    ):
+        self.target_dpi = target_dpi or int(os.environ.get("OCR_TARGET_DPI", "300"))
+        self.page_inches = page_inches
+        self.grayscale = grayscale
+        self.binarize = binarize if binarize is not None else os.environ.get("OCR_BINARIZE", "true").lower() == "true"
+        self.crop = crop if crop is not None else os.environ.get("OCR_CROP", "false").lower() == "true"
+        self.crop_margin = crop_margin
+
+    def estimated_dpi(self, image: Image.Image) -> float:
+        """Stated DPI when it is plausible for the pixel size, otherwise a page-size estimate"""
+        long_side = max(image.size)
+        dpi = image.info.get("dpi")
+        if dpi and dpi[0] > PLACEHOLDER_DPI_MAX:
+            return max(float(dpi[0]), long_side / MAX_PAGE_INCHES)
+        return long_side / self.page_inches
+
+    def __call__(self, image: Image.Image) -> Image.Image:
+        # Phones store rotation in EXIF instead of rotating the pixels
+        image = ImageOps.exif_transpose(image)
+
+        # Tesseract time grows with pixel count; ~300 DPI is where its accuracy levels off
+        scale = self.target_dpi / self.estimated_dpi(image)
+        if scale < 1:
+            size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+            # reducing_gap box-reduces first, which is much cheaper than a full Lanczos pass on 12+ MP
+            image = image.resize(size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+        if not (self.grayscale or self.binarize or self.crop):
+            return image
+        gray = ImageOps.autocontrast(image.convert("L"))
+        if not (self.binarize or self.crop):
+            return gray
+
+        pixels = np.asarray(gray)
+        ink = pixels <= _otsu_threshold(pixels)
+        if self.crop and ink.any():
+            rows, cols = np.flatnonzero(ink.any(axis=1)), np.flatnonzero(ink.any(axis=0))
+            top, bottom = max(0, rows[0] - self.crop_margin), min(ink.shape[0], rows[-1] + self.crop_margin + 1)
+            left, right = max(0, cols[0] - self.crop_margin), min(ink.shape[1], cols[-1] + self.crop_margin + 1)
+            ink, gray = ink[top:bottom, left:right], gray.crop((left, top, right, bottom))
+
+        if self.binarize:
+            return Image.fromarray(np.where(ink, 0, 255).astype(np.uint8))
+        return gray
@@ -0,0 +1,217 @@
+import os
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import magic
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+
+# libmagic needs only the first couple of KB to recognise a file
+SNIFF_BYTES = 8192
+ALLOWED_MIME_TYPES = {
+    "image": {"image/jpeg", "image/png", "image/tiff", "image/gif", "image/bmp", "image/webp"},
+    "pdf": {"application/pdf"},
+}
+SPOOL_SUFFIXES = {"image": ".img", "pdf": ".pdf"}
+# Multipart boundaries and the other form fields ride along with the file
+FORM_OVERHEAD_BYTES = 64 * 1024
+# Text fields (the query and the conversation history) are held in memory
+MAX_FIELD_BYTES = 1024 * 1024
+
+
+class UploadRejected(Exception):
+    """An upload turned away before extraction; status_code is 400, 413 or 415"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def check_upload_type(head: bytes, input_type: str) -> str:
+    """Trust the file's magic bytes, not its name or declared content type"""
+    mime_type = magic.from_buffer(head, mime=True)
+    if mime_type not in ALLOWED_MIME_TYPES[input_type]:
+        raise UploadRejected(415, f"Uploaded file is {mime_type}, expected {input_type}")
+    return mime_type
+
+
+def discard_upload(contents: Union[bytes, str, None]):
+    """Remove a spooled upload that will not be processed"""
+    if isinstance(contents, str) and os.path.exists(contents):
+        os.unlink(contents)
+
+
+class _UploadSink:
+    """File part of an upload: kept in memory up to the spool threshold, then written to one temp file"""
+
+    def __init__(self, input_type: str, max_bytes: int, spool_threshold: int):
+        self.input_type = input_type
+        self.max_bytes = max_bytes
+        self.spool_threshold = spool_threshold
+        self.chunks: List[bytes] = []
+        self.size = 0
+        self.checked = False
+        self.spooled: Optional[Any] = None
+
+    def _check_type(self):
+        if not self.checked:
+            check_upload_type(b"".join(self.chunks)[:SNIFF_BYTES], self.input_type)
+            self.checked = True
+
+    def write(self, data: bytes):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise UploadRejected(413, f"Upload exceeds the {self.max_bytes // (1024 * 1024)} MB limit")
+        if self.spooled is not None:
+            self.spooled.write(data)
+            return
+        self.chunks.append(data)
+        if self.size >= SNIFF_BYTES:
+            self._check_type()
+        if self.size > self.spool_threshold:
+            self._check_type()
+            self.spooled = tempfile.NamedTemporaryFile(suffix=SPOOL_SUFFIXES[self.input_type], delete=False)
+            self.spooled.writelines(self.chunks)
+            self.chunks = []
+
+    def finish(self) -> Union[bytes, str]:
+        if self.spooled is not None:
+            self.spooled.close()
+            return self.spooled.name
+        self._check_type()
+        # One join at the end; the chunks are dropped straight after
+        contents, self.chunks = b"".join(self.chunks), []
+        return contents
+
+    def discard(self):
+        if self.spooled is not None:
+            self.spooled.close()
+            os.unlink(self.spooled.name)
+            self.spooled = None
+        self.chunks = []
+
+
+async def receive_upload(
+    request: Any,
+    file_field: str,
+    input_type: str,
+    max_bytes: int,
+    spool_threshold: int
+) -> Tuple[Union[bytes, str], Optional[str], Dict[str, str]]:
+    """Parse a multipart upload straight off the request stream.
+
+    Returns the file (bytes, or the path of a temp file once it passes spool_threshold), its filename
+    and the text fields. The file's type is checked on its first bytes and its size as it arrives,
+    and no other copy of it is made, as Starlette's own form parsing would.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise UploadRejected(400, "Expected a multipart/form-data upload")
+
+    fields: Dict[str, str] = {}
+    part: Dict[str, Any] = {}
+    header = {"name": b"", "value": b""}
+    sink: Optional[_UploadSink] = None
+    filename: Optional[str] = None
+
+    def on_part_begin():
+        part.clear()
+        part.update(headers={}, data=bytearray(), sink=None)
+
+    def on_header_field(data: bytes, start: int, end: int):
+        header["name"] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int):
+        header["value"] += data[start:end]
+
+    def on_header_end():
+        part["headers"][header["name"].lower()] = header["value"]
+        header["name"], header["value"] = b"", b""
+
+    def on_headers_finished():
+        nonlocal sink, filename
+        _, disposition = parse_options_header(part["headers"].get(b"content-disposition", b""))
+        part["name"] = disposition.get(b"name", b"").decode("utf-8", "replace")
+        if b"filename" in disposition and part["name"] == file_field:
+            if sink is not None:
+                raise UploadRejected(400, f"Only one {file_field} file is accepted")
+            filename = disposition[b"filename"].decode("utf-8", "replace")
+            sink = part["sink"] = _UploadSink(input_type, max_bytes, spool_threshold)
+        elif b"filename" in disposition:
+            part["ignored"] = True
+
+    def on_part_data(data: bytes, start: int, end: int):
+        if part.get("ignored"):
+            return
+        if part["sink"] is not None:
+            part["sink"].write(data[start:end])
+            return
+        if len(part["data"]) + end - start > MAX_FIELD_BYTES:
+            raise UploadRejected(413, f"Form field {part['name']} is too large")
+        part["data"] += data[start:end]
+
+    def on_part_end():
+        if part["sink"] is None and not part.get("ignored"):
+            fields[part["name"]] = part["data"].decode("utf-8", "replace")
+
+    parser = MultipartParser(options[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+    })
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+        parser.finalize()
+        if sink is None:
+            raise UploadRejected(400, f"No {file_field} file in the upload")
+        return sink.finish(), filename, fields
+    except BaseException as e:
+        if sink is not None:
+            sink.discard()
+        if isinstance(e, MultipartParseError):
+            raise UploadRejected(400, f"Malformed multipart upload: {e}") from e
+        raise
+
+
+class UploadSizeLimitMiddleware:
+    """Refuse oversized upload requests while the body is still arriving, before it is parsed or spooled"""
+
+    def __init__(self, app: Any, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope.get("path")) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        limit += FORM_OVERHEAD_BYTES
+        detail = f"Request body exceeds the {limit // (1024 * 1024)} MB limit"
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            # Chunked bodies carry no length up front, so count them as they stream in
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,141 @@
+import os
+import time
+import threading
+from typing import Any, Dict, List, Optional
+
+
+class WeaviateConnection:
+    """Long-lived Weaviate client with health checks and reconnects"""
+
+    def __init__(
+        self,
+        mode: Optional[str] = None,
+        url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        health_check_interval: float = 30.0,
+        max_reconnect_attempts: int = 3
+    ):
+        self.mode = mode or os.environ.get("WEAVIATE_MODE", "cloud")
+        self.url = url or os.environ.get("WEAVIATE_URL")
+        self.api_key = api_key or os.environ.get("WEAVIATE_API_KEY")
+        self.health_check_interval = health_check_interval
+        self.max_reconnect_attempts = max_reconnect_attempts
+
+        # One client per process: the v4 client pools HTTP connections and multiplexes gRPC calls
+        self._client = None
+        self._last_health_check = 0.0
+        self._lock = threading.RLock()
+
+    def _create_client(self):
+        """Open a client for the configured deployment"""
+        import weaviate
+        from weaviate.classes.init import Auth, AdditionalConfig, Timeout
+
+        additional_config = AdditionalConfig(timeout=Timeout(init=30, query=60, insert=120))
+        if self.mode == "embedded":
+            # In-process Weaviate binary, used for local development and tests
+            return weaviate.connect_to_embedded(additional_config=additional_config)
+        if self.mode == "local":
+            return weaviate.connect_to_local(
+                host=os.environ.get("WEAVIATE_HOST", "localhost"),
+                port=int(os.environ.get("WEAVIATE_PORT", "8080")),
+                grpc_port=int(os.environ.get("WEAVIATE_GRPC_PORT", "50051")),
+                additional_config=additional_config
+            )
+        return weaviate.connect_to_weaviate_cloud(
+            cluster_url=self.url,
+            auth_credentials=Auth.api_key(self.api_key),
+            additional_config=additional_config
+        )
+
+    @property
+    def client(self):
+        """The shared client, connected and recently health-checked"""
+        with self._lock:
+            if self._client is None:
+                self._client = self._create_client()
+                self._last_health_check = time.monotonic()
+                print(f"Connected to Weaviate ({self.mode})")
+                return self._client
+            client = self._client
+            stale = time.monotonic() - self._last_health_check > self.health_check_interval
+        if stale:
+            self.ensure_healthy()
+        return client
+
+    def is_healthy(self) -> bool:
+        with self._lock:
+            if self._client is None:
+                return False
+            try:
+                return self._client.is_connected() and self._client.is_ready()
+            except Exception:
+                return False
+
+    def ensure_healthy(self) -> bool:
+        """Check the connection and reconnect with backoff if it has gone bad"""
+        for attempt in range(1, self.max_reconnect_attempts + 1):
+            with self._lock:
+                self._last_health_check = time.monotonic()
+                # Re-checked each round: another thread may have reconnected while this one backed off
+                if self._client is None or self.is_healthy():
+                    return self._client is not None
+                try:
+                    # Reconnect the same client object so vector stores holding it stay valid
+                    self._client.close()
+                    self._client.connect()
+                    if self._client.is_ready():
+                        print(f"Reconnected to Weaviate after {attempt} attempt(s)")
+                        return True
+                except Exception as e:
+                    print(f"Weaviate reconnect attempt {attempt} failed: {e}")
+            # Back off outside the lock so searches and health reports are not stuck behind the wait
+            time.sleep(min(2 ** attempt, 10))
+        return False
+
+    def suspend(self):
+        """Close the sockets but keep the client object, so a forked worker can reconnect it with resume"""
+        with self._lock:
+            if self._client is not None:
+                # gRPC channels and pooled HTTP connections must not be shared across a fork
+                self._client.close()
+
+    def resume(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.connect()
+                self._last_health_check = time.monotonic()
+                print(f"Reconnected to Weaviate ({self.mode}) in process {os.getpid()}")
+
+    def health(self) -> Dict[str, Any]:
+        return {"mode": self.mode, "connected": self._client is not None, "ready": self.is_healthy()}
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+                print("Closed Weaviate connection")
+
+
+def batch_import(collection: Any, objects: List[Dict[str, Any]], max_retries: int = 3) -> Dict[str, int]:
+    """Import objects with a server-sized dynamic batch, retrying the ones that fail"""
+    pending = objects
+    imported = 0
+    for attempt in range(max_retries + 1):
+        with collection.batch.dynamic() as batch:
+            for obj in pending:
+                batch.add_object(properties=obj["properties"], vector=obj["vector"], uuid=obj["uuid"])
+
+        failed_uuids = {str(error.object_.uuid) for error in collection.batch.failed_objects}
+        imported += len(pending) - len(failed_uuids)
+        pending = [obj for obj in pending if str(obj["uuid"]) in failed_uuids]
+        if not pending:
+            break
+        if attempt < max_retries:
+            print(f"Retrying {len(pending)} failed Weaviate objects (attempt {attempt + 1}/{max_retries})")
+            time.sleep(min(2 ** attempt, 10))
+
+    if pending:
+        print(f"Giving up on {len(pending)} Weaviate objects after {max_retries} retries")
+    return {"imported": imported, "failed": len(pending)}
@@ -0,0 +1,166 @@
+import os
+import re
+import json
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from retrieval.vector_index import _atomic_save, _top_k
+
+# Statute citations and docket-style numbers are kept whole: "§ 1983" -> "§1983", "12-345", "u.s.c"
+TOKEN_PATTERN = re.compile(r"§+\s*[\w.\-()]*\w|\d+(?:[.\-:]\d+)+|(?:[a-z]\.){2,}[a-z]?|\w+", re.IGNORECASE)
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the to was were will with
+""".split())
+# Posting lists shorter than this are cheap enough to always score
+PRUNE_MIN_DF = 1000
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase tokens that preserve section symbols, citations and dotted abbreviations"""
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        token = re.sub(r"\s+", "", match.group(0)).rstrip(".")
+        if not token or token in STOPWORDS:
+            continue
+        tokens.append(token)
+        # "§1983" should also match a bare "1983" in the query or the text
+        if token.startswith("§"):
+            bare = token.lstrip("§")
+            if bare:
+                tokens.append(bare)
+    return tokens
+
+
+class BM25Index:
+    """Local inverted index with BM25 scoring over compact, precomputed postings"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, max_df_ratio: float = 0.1):
+        self.k1 = k1
+        self.b = b
+        self.max_df_ratio = max_df_ratio
+
+        self.ids: List[str] = []
+        self.doc_lengths = np.zeros(0, dtype=np.uint32)
+        self.vocabulary: Dict[str, int] = {}
+
+        # CSR postings: term t owns doc_ids[offsets[t]:offsets[t + 1]] and the matching impacts
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.doc_ids = np.zeros(0, dtype=np.uint32)
+        self.impacts = np.zeros(0, dtype=np.float16)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_texts(cls, ids: List[str], texts: Iterable[str], **kwargs) -> "BM25Index":
+        index = cls(**kwargs)
+        index.build(ids, texts)
+        return index
+
+    def build(self, ids: List[str], texts: Iterable[str]):
+        """Tokenize the corpus and freeze postings with precomputed BM25 impacts"""
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        lengths = []
+        for doc_number, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings[term].append((doc_number, tf))
+
+        self.ids = list(ids)
+        if len(self.ids) != len(lengths):
+            raise ValueError("Expected one id per text")
+        self.doc_lengths = np.asarray(lengths, dtype=np.uint32)
+
+        num_docs = len(self.ids)
+        average_length = float(self.doc_lengths.mean()) if num_docs else 0.0
+        length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / max(average_length, 1.0))
+
+        terms = sorted(postings)
+        self.vocabulary = {term: term_id for term_id, term in enumerate(terms)}
+        sizes = np.array([len(postings[term]) for term in terms], dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        self.doc_ids = np.empty(int(self.offsets[-1]), dtype=np.uint32)
+        self.impacts = np.empty(int(self.offsets[-1]), dtype=np.float16)
+
+        for term_id, term in enumerate(terms):
+            entries = np.asarray(postings[term], dtype=np.int64)
+            docs, tfs = entries[:, 0], entries[:, 1].astype(np.float32)
+            idf = np.log(1 + (num_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            impact = idf * tfs * (self.k1 + 1) / (tfs + length_norm[docs])
+            span = slice(self.offsets[term_id], self.offsets[term_id + 1])
+            self.doc_ids[span] = docs
+            self.impacts[span] = impact
+
+        print(f"Built BM25 index over {num_docs} chunks ({len(terms)} terms, {self.memory_usage()['postings_bytes']} postings bytes)")
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[str, float]]:
+        """Return (chunk id, BM25 score) for the k best-matching chunks"""
+        term_ids = [self.vocabulary[term] for term in set(tokenize(query)) if term in self.vocabulary]
+        if not term_ids or not self.ids:
+            return []
+
+        # Very common terms carry almost no idf but dominate posting traffic; drop them
+        # whenever the query has a more selective term to rank on
+        document_frequency = lambda t: self.offsets[t + 1] - self.offsets[t]
+        term_ids.sort(key=document_frequency)
+        max_df = max(self.max_df_ratio * len(self.ids), PRUNE_MIN_DF)
+        selective = [t for t in term_ids if document_frequency(t) <= max_df]
+        term_ids = selective or term_ids[:1]
+
+        docs = np.concatenate([self.doc_ids[self.offsets[t]:self.offsets[t + 1]] for t in term_ids])
+        weights = np.concatenate([self.impacts[self.offsets[t]:self.offsets[t + 1]] for t in term_ids]).astype(np.float32)
+
+        if len(docs) * 8 < len(self.ids):
+            candidates, inverse = np.unique(docs, return_inverse=True)
+            scores = np.bincount(inverse, weights=weights, minlength=len(candidates))
+        else:
+            dense = np.bincount(docs, weights=weights)
+            candidates = np.flatnonzero(dense)
+            scores = dense[candidates]
+
+        best = _top_k(scores, k)
+        return [(self.ids[candidates[i]], float(scores[i])) for i in best]
+
+    def memory_usage(self) -> Dict[str, int]:
+        return {
+            "chunks": len(self.ids),
+            "terms": len(self.vocabulary),
+            "postings": int(len(self.doc_ids)),
+            "postings_bytes": int(self.doc_ids.nbytes + self.impacts.nbytes + self.offsets.nbytes),
+        }
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        _atomic_save(os.path.join(directory, "offsets.npy"), self.offsets)
+        _atomic_save(os.path.join(directory, "doc_ids.npy"), self.doc_ids)
+        _atomic_save(os.path.join(directory, "impacts.npy"), self.impacts)
+        _atomic_save(os.path.join(directory, "doc_lengths.npy"), self.doc_lengths)
+        with open(os.path.join(directory, "bm25.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "k1": self.k1,
+                "b": self.b,
+                "max_df_ratio": self.max_df_ratio,
+                "ids": self.ids,
+                "vocabulary": self.vocabulary
+            }, f)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "BM25Index":
+        with open(os.path.join(directory, "bm25.json"), encoding="utf-8") as f:
+            config = json.load(f)
+        index = cls(k1=config["k1"], b=config["b"], max_df_ratio=config.get("max_df_ratio", 0.1))
+        index.ids = config["ids"]
+        index.vocabulary = config["vocabulary"]
+        mmap_mode = "r" if mmap else None
+        index.offsets = np.load(os.path.join(directory, "offsets.npy"))
+        index.doc_ids = np.load(os.path.join(directory, "doc_ids.npy"), mmap_mode=mmap_mode)
+        index.impacts = np.load(os.path.join(directory, "impacts.npy"), mmap_mode=mmap_mode)
+        index.doc_lengths = np.load(os.path.join(directory, "doc_lengths.npy"))
+        return index
+
+    @staticmethod
+    def exists(directory: Optional[str]) -> bool:
+        return bool(directory) and os.path.exists(os.path.join(directory, "bm25.json"))
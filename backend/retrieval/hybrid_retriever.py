@@ -0,0 +1,93 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from retrieval.vector_index import LocalVectorIndex
+from retrieval.bm25_index import BM25Index
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60, weights: Optional[Sequence[float]] = None) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists by summing weight / (k + rank) for every list an id appears in"""
+    weights = weights or [1.0] * len(rankings)
+    fused: Dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+class HybridRetriever:
+    """Fuse dense vector search with BM25 keyword search via reciprocal rank fusion"""
+
+    def __init__(
+        self,
+        vector_index: LocalVectorIndex,
+        bm25_index: BM25Index,
+        rrf_k: int = 60,
+        candidate_multiplier: int = 4,
+        weights: Tuple[float, float] = (1.0, 1.0)
+    ):
+        self.vector_index = vector_index
+        self.bm25_index = bm25_index
+        self.rrf_k = rrf_k
+        self.candidate_multiplier = candidate_multiplier
+        self.weights = weights
+
+    @property
+    def embeddings(self) -> Any:
+        return self.vector_index.embeddings
+
+    def __len__(self) -> int:
+        return len(self.vector_index)
+
+    def _keyword_ids(self, query: str, depth: int, allowed_mask: Optional[np.ndarray]) -> List[str]:
+        """BM25 hits restricted to the rows the filters allow"""
+        keyword_hits = self.bm25_index.search(query, depth if allowed_mask is None else depth * self.candidate_multiplier)
+        if allowed_mask is not None:
+            keyword_hits = [
+                (doc_id, score) for doc_id, score in keyword_hits
+                if self.vector_index.row_of(doc_id) is not None and allowed_mask[self.vector_index.row_of(doc_id)]
+            ]
+        return [doc_id for doc_id, _ in keyword_hits[:depth]]
+
+    def similarity_search_multi(
+        self,
+        queries: List[str],
+        k: int = 4,
+        filters: Optional[Dict[str, List[str]]] = None,
+        **kwargs
+    ) -> List[Tuple[Document, float]]:
+        """Fuse the dense and keyword rankings of every query into one RRF ranking"""
+        depth = k * self.candidate_multiplier
+        allowed = self.vector_index.filter_rows(filters)
+        allowed_mask = None
+        if allowed is not None:
+            allowed_mask = np.zeros(len(self.vector_index.alive), dtype=bool)
+            allowed_mask[allowed] = True
+
+        # One embedding call and one index pass for all queries
+        dense = self.vector_index.search_rows_batch(self.embeddings.embed_documents(queries), depth, candidate_rows=allowed, **kwargs)
+        rankings, weights = [], []
+        for query, hits in zip(queries, dense):
+            rankings.append([self.vector_index.ids[row] for row, _ in hits])
+            rankings.append(self._keyword_ids(query, depth, allowed_mask))
+            weights.extend(self.weights)
+
+        results = []
+        for doc_id, score in reciprocal_rank_fusion(rankings, self.rrf_k, weights):
+            doc = self.vector_index.get_document(doc_id)
+            # BM25 may still list chunks that were deleted from the vector index since it was built
+            if doc is None:
+                continue
+            results.append((doc, score))
+            if len(results) == k:
+                break
+        return results
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs) -> List[Tuple[Document, float]]:
+        """Same contract as the vector stores; scores are fused RRF scores"""
+        return self.similarity_search_multi([query], k, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
@@ -0,0 +1,208 @@
+import os
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from retrieval.vector_index import LocalVectorIndex, RowStore, SCAN_BLOCK_SIZE, normalize_embeddings, _atomic_save, _top_k
+
+# Below this many rows per list the centroids are too noisy to be worth training
+MIN_ROWS_PER_LIST = 39
+TRAINING_ROWS_PER_LIST = 256
+# With an automatic nlist, retrain once the index has grown this much since the last training
+RETRAIN_GROWTH_FACTOR = 4
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Assign each row to its most similar centroid"""
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), SCAN_BLOCK_SIZE):
+        block = np.asarray(vectors[start:start + SCAN_BLOCK_SIZE])
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def spherical_kmeans(vectors: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Cluster unit vectors by cosine similarity and return unit-norm centroids"""
+    rng = np.random.default_rng(seed)
+    centroids = np.asarray(vectors[np.sort(rng.choice(len(vectors), nlist, replace=False))], dtype=np.float32)
+
+    for _ in range(iterations):
+        assignments = _assign(vectors, centroids)
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=nlist)
+        sums = np.zeros_like(centroids)
+        nonempty = np.flatnonzero(counts)
+        sums[nonempty] = np.add.reduceat(np.asarray(vectors)[order], np.concatenate([[0], np.cumsum(counts)[:-1]])[nonempty])
+
+        # Reseed empty lists from random rows so every list stays useful
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            sums[empty] = np.asarray(vectors[rng.choice(len(vectors), len(empty), replace=False)])
+        centroids = normalize_embeddings(sums)
+
+    return centroids
+
+
+class IVFVectorIndex(LocalVectorIndex):
+    """Inverted-file ANN index: rows are bucketed by nearest centroid and only nprobe lists are scanned"""
+
+    def __init__(
+        self,
+        embeddings: Any = None,
+        quantization: str = "int8",
+        rescore_multiplier: Optional[int] = None,
+        spill_dir: Optional[str] = None,
+        nlist: Optional[int] = None,
+        nprobe: int = 8,
+        train_iterations: int = 10
+    ):
+        super().__init__(embeddings=embeddings, quantization=quantization, rescore_multiplier=rescore_multiplier, spill_dir=spill_dir)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_iterations = train_iterations
+        self.auto_nlist = nlist is None
+
+        self.trained_rows = 0
+        self.centroids: Optional[np.ndarray] = None
+        self._assignments = RowStore(np.int32)
+        self._lists: List[List[np.ndarray]] = []
+
+    @property
+    def assignments(self) -> np.ndarray:
+        assignments = self._assignments.array
+        return np.zeros(0, dtype=np.int32) if assignments is None else assignments
+
+    @assignments.setter
+    def assignments(self, value: np.ndarray):
+        self._assignments.assign(value)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def _target_nlist(self, rows: int) -> int:
+        if self.auto_nlist:
+            return max(1, int(4 * math.sqrt(rows)))
+        return self.nlist
+
+    def train(self, nlist: Optional[int] = None):
+        """(Re)build centroids from the live rows and reassign every row"""
+        live = np.flatnonzero(self.alive)
+        nlist = min(nlist or self._target_nlist(len(live)), len(live))
+        if nlist == 0:
+            return
+
+        sample_size = min(len(live), nlist * TRAINING_ROWS_PER_LIST)
+        sample = np.sort(np.random.default_rng(0).choice(live, sample_size, replace=False))
+        self.centroids = spherical_kmeans(np.asarray(self.vectors[sample]), nlist, self.train_iterations)
+        self.nlist = nlist
+        self.trained_rows = len(live)
+
+        self.assignments = _assign(self.vectors, self.centroids)
+        self._rebuild_lists()
+        print(f"Trained IVF index with {nlist} lists over {len(live)} rows")
+
+    def _rebuild_lists(self):
+        order = np.argsort(self.assignments, kind="stable")
+        bounds = np.cumsum(np.bincount(self.assignments, minlength=len(self.centroids)))
+        self._lists = [[rows] for rows in np.split(order, bounds[:-1])]
+
+    def _list_rows(self, list_id: int) -> np.ndarray:
+        """Rows in one inverted list, consolidating incremental appends on first read"""
+        chunks = self._lists[list_id]
+        if len(chunks) > 1:
+            chunks[:] = [np.concatenate(chunks)]
+        return chunks[0]
+
+    def _on_rows_added(self, start: int, vectors: np.ndarray):
+        if not self.is_trained:
+            self._assignments.append(np.full(len(vectors), -1, dtype=np.int32))
+            if len(self) >= MIN_ROWS_PER_LIST * self._target_nlist(len(self)):
+                self.train()
+            return
+
+        new_assignments = _assign(vectors, self.centroids)
+        self._assignments.append(new_assignments)
+        if self.auto_nlist and len(self) > RETRAIN_GROWTH_FACTOR * self.trained_rows:
+            self.train()
+            return
+
+        rows = np.arange(start, start + len(vectors))
+        for list_id in np.unique(new_assignments):
+            self._lists[list_id].append(rows[new_assignments == list_id])
+
+    def _on_compacted(self, remap: np.ndarray):
+        self._assignments.take(np.flatnonzero(remap >= 0))
+        if self.is_trained:
+            self._rebuild_lists()
+
+    def search_rows_batch(
+        self,
+        embeddings: Any,
+        k: int = 4,
+        candidate_rows: Optional[np.ndarray] = None,
+        filters: Optional[Dict[str, List[str]]] = None,
+        nprobe: Optional[int] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """Scan only the lists closest to any of the queries, then rescore as usual"""
+        candidate_rows = self.filter_rows(filters, candidate_rows)
+        nprobe = nprobe or self.nprobe
+        if not self.is_trained:
+            return super().search_rows_batch(embeddings, k, candidate_rows=candidate_rows)
+
+        # A selective filter leaves fewer rows than the probed lists would hold; scan them exactly
+        if candidate_rows is not None and len(candidate_rows) <= nprobe * len(self.alive) / self.nlist:
+            return super().search_rows_batch(embeddings, k, candidate_rows=candidate_rows)
+
+        queries = normalize_embeddings(np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim))
+        # Related subqueries mostly probe the same lists, so the union stays close to a single probe
+        centroid_scores = self.centroids @ queries.T
+        probe = np.unique(np.concatenate([_top_k(centroid_scores[:, column], nprobe) for column in range(len(queries))]))
+        rows = np.concatenate([self._list_rows(list_id) for list_id in probe])
+        if candidate_rows is not None:
+            rows = np.intersect1d(rows, candidate_rows)
+        return super().search_rows_batch(queries, k, candidate_rows=rows)
+
+    def list_sizes(self) -> np.ndarray:
+        """Live rows per inverted list, useful for spotting skew that calls for retraining"""
+        if not self.is_trained:
+            return np.zeros(0, dtype=np.int64)
+        live = self.alive & (self.assignments >= 0)
+        return np.bincount(self.assignments[live], minlength=len(self.centroids))
+
+    def memory_usage(self) -> Dict[str, Any]:
+        usage = super().memory_usage()
+        usage["nlist"] = self.nlist if self.is_trained else 0
+        usage["ivf_bytes"] = int(self.assignments.nbytes + (self.centroids.nbytes if self.is_trained else 0))
+        return usage
+
+    def _config(self) -> Dict[str, Any]:
+        config = super()._config()
+        config.update({
+            "nlist": self.nlist,
+            "nprobe": self.nprobe,
+            "train_iterations": self.train_iterations,
+            "auto_nlist": self.auto_nlist,
+            "trained_rows": self.trained_rows
+        })
+        return config
+
+    def _save_extra(self, directory: str):
+        _atomic_save(os.path.join(directory, "assignments.npy"), self.assignments)
+        if self.is_trained:
+            _atomic_save(os.path.join(directory, "centroids.npy"), self.centroids)
+
+    def _load_config(self, config: Dict[str, Any]):
+        self.nlist = config.get("nlist")
+        self.auto_nlist = config.get("auto_nlist", self.nlist is None)
+        self.trained_rows = config.get("trained_rows", 0)
+        self.nprobe = config.get("nprobe", self.nprobe)
+        self.train_iterations = config.get("train_iterations", self.train_iterations)
+
+    def _load_extra(self, directory: str):
+        self.assignments = np.load(os.path.join(directory, "assignments.npy"))
+        centroids_path = os.path.join(directory, "centroids.npy")
+        if os.path.exists(centroids_path):
+            self.centroids = np.load(centroids_path)
+            self._rebuild_lists()
@@ -0,0 +1,77 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+# Chunk metadata fields that retrieval can prefilter on
+FILTER_FIELDS = ("jurisdiction", "legal_domains")
+
+
+class MetadataPostingIndex:
+    """Posting lists of row numbers per metadata value, used to prefilter similarity search"""
+
+    def __init__(self, fields: Sequence[str] = FILTER_FIELDS):
+        self.fields = tuple(fields)
+        # field -> value -> row arrays appended per insert batch, consolidated on first read
+        self._postings: Dict[str, Dict[str, List[np.ndarray]]] = {field: {} for field in self.fields}
+
+    def add(self, start_row: int, metadatas: Iterable[Dict[str, Any]]):
+        rows_by_value: Dict[str, Dict[str, List[int]]] = {field: {} for field in self.fields}
+        for offset, metadata in enumerate(metadatas):
+            for field in self.fields:
+                values = metadata.get(field)
+                if values is None:
+                    continue
+                for value in [values] if isinstance(values, str) else values:
+                    rows_by_value[field].setdefault(value, []).append(start_row + offset)
+
+        for field, by_value in rows_by_value.items():
+            for value, rows in by_value.items():
+                self._postings[field].setdefault(value, []).append(np.asarray(rows, dtype=np.int64))
+
+    def _rows(self, field: str, value: str) -> np.ndarray:
+        chunks = self._postings[field].get(value)
+        if not chunks:
+            return np.empty(0, dtype=np.int64)
+        if len(chunks) > 1:
+            chunks[:] = [np.concatenate(chunks)]
+        return chunks[0]
+
+    def candidate_rows(self, filters: Optional[Dict[str, Sequence[str]]]) -> Optional[np.ndarray]:
+        """Rows matching any value within a field and every filtered field; None means unfiltered"""
+        result = None
+        for field, values in (filters or {}).items():
+            if field not in self._postings or not values:
+                continue
+            lists = [self._rows(field, value) for value in values]
+            rows = np.unique(np.concatenate(lists))
+            result = rows if result is None else np.intersect1d(result, rows, assume_unique=True)
+        return result
+
+    def remap(self, remap: np.ndarray):
+        """Renumber rows after compaction; remap[old_row] is the new row or -1"""
+        for field in self.fields:
+            for value in list(self._postings[field]):
+                rows = remap[self._rows(field, value)]
+                rows = rows[rows >= 0]
+                if len(rows):
+                    self._postings[field][value] = [rows]
+                else:
+                    del self._postings[field][value]
+
+    def value_counts(self) -> Dict[str, Dict[str, int]]:
+        return {
+            field: {value: len(self._rows(field, value)) for value in values}
+            for field, values in self._postings.items()
+        }
+
+
+def build_weaviate_filter(filters: Optional[Dict[str, Sequence[str]]]) -> Any:
+    """Translate a filters dict into a Weaviate v4 filter for the same prefiltering"""
+    if not filters:
+        return None
+    from weaviate.classes.query import Filter
+
+    conditions = [Filter.by_property(field).contains_any(list(values)) for field, values in filters.items() if values]
+    if not conditions:
+        return None
+    return Filter.all_of(conditions) if len(conditions) > 1 else conditions[0]
@@ -0,0 +1,18 @@
+from typing import Dict, List, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+
+def _document_key(doc: Document) -> str:
+    return doc.metadata.get("chunk_id") or doc.page_content
+
+
+def merge_multi_query_results(per_query: Sequence[Sequence[Tuple[Document, float]]], k: int) -> List[Tuple[Document, float]]:
+    """Merge the hits of several queries, keeping each chunk once with its best score"""
+    best: Dict[str, Tuple[Document, float]] = {}
+    for results in per_query:
+        for doc, score in results:
+            key = _document_key(doc)
+            if key not in best or score > best[key][1]:
+                best[key] = (doc, score)
+    return sorted(best.values(), key=lambda item: item[1], reverse=True)[:k]
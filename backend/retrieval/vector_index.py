@@ -0,0 +1,520 @@
+import os
+import json
+import uuid
+import shutil
+import weakref
+import tempfile
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from retrieval.metadata_filter import MetadataPostingIndex
+from retrieval.multi_query import merge_multi_query_results
+
+QUANTIZATION_MODES = ("none", "int8", "binary")
+SCAN_BLOCK_SIZE = 2048
+# Rows allocated for the first insert; storage then doubles, so appends are amortized O(rows added)
+INITIAL_CAPACITY = 1024
+INDEX_FORMAT_VERSION = 1
+
+# Binary codes lose more ranking information, so they need a deeper rescoring shortlist
+DEFAULT_RESCORE_MULTIPLIERS = {"none": 1, "int8": 4, "binary": 16}
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _popcount(bits: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(bits)
+    return _POPCOUNT[bits]
+
+
+def normalize_embeddings(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows so inner product equals cosine similarity"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32, copy=False)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Return positions of the k highest scores, best first"""
+    if k <= 0 or len(scores) == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        positions = np.argpartition(-scores, k - 1)[:k]
+    else:
+        positions = np.arange(len(scores))
+    return positions[np.argsort(-scores[positions], kind="stable")]
+
+
+def _atomic_save(path: str, array: np.ndarray):
+    """Write an .npy file without clobbering a memory-mapped original"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(temp_path, path)
+
+
+class RowStore:
+    """Row-appendable array with capacity doubling, held in memory or in a file-backed memmap"""
+
+    def __init__(self, dtype: Any, path: Optional[str] = None):
+        self.dtype = np.dtype(dtype)
+        self.path = path
+        self._data: Optional[np.ndarray] = None
+        self.size = 0
+
+    @property
+    def array(self) -> Optional[np.ndarray]:
+        return None if self._data is None else self._data[:self.size]
+
+    @property
+    def capacity(self) -> int:
+        return 0 if self._data is None else len(self._data)
+
+    def assign(self, array: Optional[np.ndarray]):
+        """Take over existing rows without copying them; a loaded memmap stays mapped until the next append"""
+        self._data = array
+        self.size = 0 if array is None else len(array)
+
+    def _allocate(self, shape: Tuple[int, ...]) -> np.ndarray:
+        if self.path is None:
+            return np.empty(shape, dtype=self.dtype)
+        # Written beside the current file and swapped in; the old mapping stays readable until it is dropped
+        temp_path = f"{self.path}.tmp"
+        data = np.lib.format.open_memmap(temp_path, mode="w+", dtype=self.dtype, shape=shape)
+        os.replace(temp_path, self.path)
+        return data
+
+    def _rebuild(self, rows: Optional[np.ndarray], count: int, capacity: int, tail: Tuple[int, ...]):
+        data = self._allocate((max(capacity, 1),) + tail)
+        for start in range(0, count, SCAN_BLOCK_SIZE):
+            stop = min(start + SCAN_BLOCK_SIZE, count)
+            data[start:stop] = self._data[start:stop] if rows is None else self._data[rows[start:stop]]
+        self._data = data
+        self.size = count
+
+    def append(self, rows: np.ndarray):
+        needed = self.size + len(rows)
+        if self._data is None:
+            self._data = self._allocate((max(needed, INITIAL_CAPACITY),) + rows.shape[1:])
+        elif needed > len(self._data) or not self._data.flags.writeable:
+            self._rebuild(None, self.size, max(needed, 2 * len(self._data)), self._data.shape[1:])
+        self._data[self.size:needed] = rows
+        self.size = needed
+
+    def take(self, rows: np.ndarray):
+        """Keep only the given rows, in order, at a capacity that leaves room to grow"""
+        if self._data is not None:
+            self._rebuild(rows, len(rows), 2 * len(rows), self._data.shape[1:])
+
+    @property
+    def nbytes(self) -> int:
+        return 0 if self._data is None else int(self._data.nbytes)
+
+
+class LocalVectorIndex:
+    """In-process vector index with a quantized first-pass scan and exact rescoring.
+
+    Quantization shrinks the resident scan data (int8 to a quarter, binary to a thirty-second) and
+    spills the full-precision vectors, which are only read for rescoring, to a memory-mapped file in
+    spill_dir (a temporary directory when none is given). The int8 scan widens each block of codes
+    back to float32 before the matrix product, so with numpy it is somewhat slower than the float
+    scan; choose it for memory, not for speed.
+    """
+
+    def __init__(
+        self,
+        embeddings: Any = None,
+        quantization: str = "int8",
+        rescore_multiplier: Optional[int] = None,
+        spill_dir: Optional[str] = None
+    ):
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unsupported quantization mode: {quantization}")
+
+        self.embeddings = embeddings
+        self.quantization = quantization
+        self.rescore_multiplier = max(1, rescore_multiplier or DEFAULT_RESCORE_MULTIPLIERS[quantization])
+        self.dim: Optional[int] = None
+
+        self._vectors = RowStore(np.float32, self._spill_path(spill_dir) if quantization != "none" else None)
+        self._codes = RowStore(np.uint8 if quantization == "binary" else np.int8)
+        self._scales = RowStore(np.float32)
+        self._alive = RowStore(bool)
+
+        self.documents: List[Optional[Document]] = []
+        self.ids: List[str] = []
+        self._id_to_row: Dict[str, int] = {}
+        self.metadata_index = MetadataPostingIndex()
+
+    def _spill_path(self, spill_dir: Optional[str]) -> str:
+        """File for the full-precision vectors of this index, removed with the index"""
+        if spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok=True)
+        directory = tempfile.mkdtemp(prefix="local-index-", dir=spill_dir)
+        weakref.finalize(self, shutil.rmtree, directory, ignore_errors=True)
+        return os.path.join(directory, "vectors.npy")
+
+    # Views of the live part of each store; assigning replaces the rows without copying them
+    @property
+    def vectors(self) -> np.ndarray:
+        vectors = self._vectors.array
+        return np.zeros((0, self.dim or 0), dtype=np.float32) if vectors is None else vectors
+
+    @vectors.setter
+    def vectors(self, value: np.ndarray):
+        self._vectors.assign(value)
+
+    @property
+    def codes(self) -> Optional[np.ndarray]:
+        return self._codes.array
+
+    @codes.setter
+    def codes(self, value: Optional[np.ndarray]):
+        self._codes.assign(value)
+
+    @property
+    def scales(self) -> Optional[np.ndarray]:
+        return self._scales.array
+
+    @scales.setter
+    def scales(self, value: Optional[np.ndarray]):
+        self._scales.assign(value)
+
+    @property
+    def alive(self) -> np.ndarray:
+        alive = self._alive.array
+        return np.zeros(0, dtype=bool) if alive is None else alive
+
+    @alive.setter
+    def alive(self, value: np.ndarray):
+        self._alive.assign(value)
+
+    def __len__(self) -> int:
+        return len(self._id_to_row)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._id_to_row
+
+    def row_of(self, doc_id: str) -> Optional[int]:
+        return self._id_to_row.get(doc_id)
+
+    def get_document(self, doc_id: str) -> Optional[Document]:
+        row = self._id_to_row.get(doc_id)
+        return None if row is None else self.documents[row]
+
+    @classmethod
+    def from_documents(cls, documents: List[Document], embedding: Any, **kwargs) -> "LocalVectorIndex":
+        """Build an index from documents, mirroring the LangChain vector store constructor"""
+        index = cls(embeddings=embedding, **kwargs)
+        index.add_documents(documents)
+        return index
+
+    def _quantize(self, vectors: np.ndarray) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        """Quantize normalized vectors for the first-pass scan"""
+        if self.quantization == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            codes = np.round(vectors / scales[:, None]).astype(np.int8)
+            return codes, scales.astype(np.float32)
+        if self.quantization == "binary":
+            return np.packbits(vectors > 0, axis=1), None
+        return None, None
+
+    def add_documents(self, documents: List[Document], ids: Optional[List[str]] = None, batch_size: int = 256) -> List[str]:
+        """Embed and insert documents, replacing any existing rows with the same ids"""
+        if self.embeddings is None:
+            raise ValueError("An embedding model is required to add documents")
+
+        ids = ids or [doc.metadata.get("chunk_id") or uuid.uuid4().hex for doc in documents]
+        added_ids = []
+        for start in range(0, len(documents), batch_size):
+            batch = documents[start:start + batch_size]
+            vectors = self.embeddings.embed_documents([doc.page_content for doc in batch])
+            added_ids.extend(self.add_embeddings(batch, vectors, ids[start:start + batch_size]))
+        return added_ids
+
+    def add_embeddings(self, documents: List[Document], vectors: Any, ids: Optional[List[str]] = None) -> List[str]:
+        """Insert precomputed embeddings, replacing any existing rows with the same ids"""
+        vectors = normalize_embeddings(np.asarray(vectors, dtype=np.float32))
+        if vectors.ndim != 2 or len(vectors) != len(documents):
+            raise ValueError("Expected one embedding row per document")
+        if len(documents) == 0:
+            return []
+
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {self.dim}")
+
+        ids = list(ids or [doc.metadata.get("chunk_id") or uuid.uuid4().hex for doc in documents])
+        self.delete([doc_id for doc_id in ids if doc_id in self._id_to_row])
+
+        start = len(self.ids)
+        codes, scales = self._quantize(vectors)
+        self._vectors.append(vectors)
+        if codes is not None:
+            self._codes.append(codes)
+        if scales is not None:
+            self._scales.append(scales)
+        self._alive.append(np.ones(len(vectors), dtype=bool))
+
+        for offset, (doc, doc_id) in enumerate(zip(documents, ids)):
+            # Later duplicates within the same batch win
+            if doc_id in self._id_to_row:
+                self._mark_deleted(self._id_to_row[doc_id])
+            self.documents.append(doc)
+            self.ids.append(doc_id)
+            self._id_to_row[doc_id] = start + offset
+
+        self.metadata_index.add(start, [doc.metadata for doc in documents])
+        self._on_rows_added(start, vectors)
+        return ids
+
+    def _mark_deleted(self, row: int):
+        self.alive[row] = False
+        self.documents[row] = None
+
+    def delete(self, ids: Iterable[str]) -> int:
+        """Tombstone rows by id; storage is reclaimed by compact()"""
+        deleted = 0
+        for doc_id in ids:
+            row = self._id_to_row.pop(doc_id, None)
+            if row is not None:
+                self._mark_deleted(row)
+                deleted += 1
+        return deleted
+
+    def compact(self):
+        """Drop tombstoned rows and renumber the remaining ones"""
+        keep = np.flatnonzero(self.alive)
+        if len(keep) == len(self.alive):
+            return
+        remap = np.full(len(self.alive), -1, dtype=np.int64)
+        remap[keep] = np.arange(len(keep))
+
+        for store in (self._vectors, self._codes, self._scales, self._alive):
+            store.take(keep)
+        self.documents = [self.documents[row] for row in keep]
+        self.ids = [self.ids[row] for row in keep]
+        self._id_to_row = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self.metadata_index.remap(remap)
+        self._on_compacted(remap)
+
+    def _on_rows_added(self, start: int, vectors: np.ndarray):
+        """Hook for subclasses that maintain auxiliary structures over rows"""
+        pass
+
+    def _on_compacted(self, remap: np.ndarray):
+        """Hook for subclasses; remap[old_row] is the new row or -1"""
+        pass
+
+    def _approximate_scores(self, queries: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """First-pass similarity of every query over the quantized rows, scanned in blocks; shape (rows, queries)"""
+        total = len(self.alive) if rows is None else len(rows)
+        scores = np.empty((total, len(queries)), dtype=np.float32)
+
+        if self.quantization == "binary":
+            query_bits = np.packbits(queries > 0, axis=1)
+        elif self.quantization == "int8":
+            # Small, reused float buffer keeps the int8 -> float32 widening in cache
+            buffer = np.empty((min(SCAN_BLOCK_SIZE, total), self.dim), dtype=np.float32)
+
+        for start in range(0, total, SCAN_BLOCK_SIZE):
+            block = slice(start, min(start + SCAN_BLOCK_SIZE, total))
+            block_rows = block if rows is None else rows[block]
+
+            if self.quantization == "int8":
+                widened = buffer[:block.stop - block.start]
+                np.copyto(widened, self.codes[block_rows])
+                scores[block] = (widened @ queries.T) * self.scales[block_rows, None]
+            elif self.quantization == "binary":
+                xor = np.bitwise_xor(self.codes[block_rows][:, None, :], query_bits[None, :, :])
+                scores[block] = self.dim - 2.0 * _popcount(xor).sum(axis=2, dtype=np.int32)
+            else:
+                scores[block] = np.asarray(self.vectors[block_rows]) @ queries.T
+
+        return scores
+
+    def filter_rows(self, filters: Optional[Dict[str, List[str]]], candidate_rows: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        """Narrow the candidate rows with the metadata posting lists; None means every row"""
+        filtered = self.metadata_index.candidate_rows(filters)
+        if filtered is None:
+            return candidate_rows
+        if candidate_rows is None:
+            return filtered
+        return np.intersect1d(filtered, candidate_rows)
+
+    def search_rows_batch(
+        self,
+        embeddings: Any,
+        k: int = 4,
+        candidate_rows: Optional[np.ndarray] = None,
+        filters: Optional[Dict[str, List[str]]] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """Top-k (row, cosine score) pairs for several queries in one pass over the index"""
+        queries = normalize_embeddings(np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim or 1))
+        if self.dim is None or k <= 0:
+            return [[] for _ in queries]
+        candidate_rows = self.filter_rows(filters, candidate_rows)
+
+        if candidate_rows is None:
+            rows = None
+            scores = self._approximate_scores(queries)
+            scores[~self.alive] = -np.inf
+        else:
+            rows = np.asarray(candidate_rows, dtype=np.int64)
+            rows = rows[self.alive[rows]]
+            scores = self._approximate_scores(queries, rows)
+
+        shortlist_size = k if self.quantization == "none" else k * self.rescore_multiplier
+        shortlists = []
+        for column in range(len(queries)):
+            shortlist = _top_k(scores[:, column], shortlist_size)
+            shortlist = shortlist[np.isfinite(scores[shortlist, column])]
+            if self.quantization == "none":
+                # The float scan is already exact
+                shortlists.append([(int(i if rows is None else rows[i]), float(scores[i, column])) for i in shortlist])
+            else:
+                shortlists.append(shortlist if rows is None else rows[shortlist])
+        if self.quantization == "none" or not shortlists:
+            return shortlists
+
+        # One sorted gather over the union of shortlists keeps memory-mapped reads sequential
+        union = np.unique(np.concatenate(shortlists))
+        exact = np.asarray(self.vectors[union]) @ queries.T
+        results = []
+        for column, shortlist_rows in enumerate(shortlists):
+            positions = np.searchsorted(union, shortlist_rows)
+            best = _top_k(exact[positions, column], k)
+            results.append([(int(shortlist_rows[i]), float(exact[positions[i], column])) for i in best])
+        return results
+
+    def search_rows(self, embedding: Any, k: int = 4, **kwargs) -> List[Tuple[int, float]]:
+        """Return (row, cosine score) pairs for the k nearest live rows matching the filters"""
+        return self.search_rows_batch(np.asarray(embedding, dtype=np.float32).reshape(1, -1), k, **kwargs)[0]
+
+    def similarity_search_by_vector_with_score(self, embedding: Any, k: int = 4, **kwargs) -> List[Tuple[Document, float]]:
+        """Search by a precomputed query embedding"""
+        return [(self.documents[row], score) for row, score in self.search_rows(embedding, k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs) -> List[Tuple[Document, float]]:
+        """Search by query text; same contract as the LangChain vector stores"""
+        if self.embeddings is None:
+            raise ValueError("An embedding model is required to search by text")
+        return self.similarity_search_by_vector_with_score(self.embeddings.embed_query(query), k, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> List[Document]:
+        """Search by query text and drop the scores"""
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def similarity_search_multi(self, queries: List[str], k: int = 4, **kwargs) -> List[Tuple[Document, float]]:
+        """Embed all queries in one call, search them in one pass and merge the hits"""
+        if self.embeddings is None:
+            raise ValueError("An embedding model is required to search by text")
+        per_query = self.search_rows_batch(self.embeddings.embed_documents(queries), k, **kwargs)
+        return merge_multi_query_results(
+            [[(self.documents[row], score) for row, score in results] for results in per_query], k
+        )
+
+    def memory_usage(self) -> Dict[str, Any]:
+        """Report the bytes held by each part of the index"""
+        # Allocated bytes, including room reserved for rows not yet added
+        scan_bytes = self._codes.nbytes + self._scales.nbytes
+        if self.quantization == "none":
+            scan_bytes = self._vectors.nbytes
+
+        return {
+            "rows": len(self.alive),
+            "live_rows": len(self),
+            "quantization": self.quantization,
+            "scan_bytes": int(scan_bytes),
+            "full_precision_bytes": int(self.vectors.nbytes),
+            "full_precision_resident": not isinstance(self._vectors._data, np.memmap),
+        }
+
+    def _config(self) -> Dict[str, Any]:
+        return {
+            "format_version": INDEX_FORMAT_VERSION,
+            "index_type": type(self).__name__,
+            "quantization": self.quantization,
+            "rescore_multiplier": self.rescore_multiplier,
+            "dim": self.dim,
+        }
+
+    def save(self, directory: str):
+        """Persist the index so it can be reloaded (and memory-mapped) later"""
+        os.makedirs(directory, exist_ok=True)
+        _atomic_save(os.path.join(directory, "vectors.npy"), np.asarray(self.vectors))
+        _atomic_save(os.path.join(directory, "alive.npy"), self.alive)
+        if self.codes is not None:
+            _atomic_save(os.path.join(directory, "codes.npy"), self.codes)
+        if self.scales is not None:
+            _atomic_save(os.path.join(directory, "scales.npy"), self.scales)
+
+        documents_path = os.path.join(directory, "documents.jsonl")
+        with open(f"{documents_path}.tmp", "w", encoding="utf-8") as f:
+            for doc_id, doc in zip(self.ids, self.documents):
+                record = {"id": doc_id, "content": None, "metadata": None}
+                if doc is not None:
+                    record["content"] = doc.page_content
+                    record["metadata"] = doc.metadata
+                f.write(json.dumps(record, default=str) + "\n")
+        os.replace(f"{documents_path}.tmp", documents_path)
+
+        self._save_extra(directory)
+        with open(os.path.join(directory, "index.json"), "w", encoding="utf-8") as f:
+            json.dump(self._config(), f)
+
+    @classmethod
+    def load(cls, directory: str, embeddings: Any = None, mmap: bool = True, spill_dir: Optional[str] = None) -> "LocalVectorIndex":
+        """Load a saved index; full-precision vectors stay on disk when mmap is set"""
+        with open(os.path.join(directory, "index.json"), encoding="utf-8") as f:
+            config = json.load(f)
+        if config.get("format_version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported index format: {config.get('format_version')}")
+        if config.get("index_type") != cls.__name__:
+            raise ValueError(f"Index at {directory} is a {config.get('index_type')}, not a {cls.__name__}; rebuild it")
+
+        index = cls(
+            embeddings=embeddings,
+            quantization=config["quantization"],
+            rescore_multiplier=config["rescore_multiplier"],
+            spill_dir=spill_dir
+        )
+        index._load_config(config)
+        index.dim = config["dim"]
+        index.vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r" if mmap else None)
+        index.alive = np.load(os.path.join(directory, "alive.npy"))
+        if os.path.exists(os.path.join(directory, "codes.npy")):
+            index.codes = np.load(os.path.join(directory, "codes.npy"))
+        if os.path.exists(os.path.join(directory, "scales.npy")):
+            index.scales = np.load(os.path.join(directory, "scales.npy"))
+
+        with open(os.path.join(directory, "documents.jsonl"), encoding="utf-8") as f:
+            for row, line in enumerate(f):
+                record = json.loads(line)
+                index.ids.append(record["id"])
+                if record["content"] is None or not index.alive[row]:
+                    index.documents.append(None)
+                    continue
+                index.documents.append(Document(page_content=record["content"], metadata=record["metadata"]))
+                index._id_to_row[record["id"]] = row
+
+        index.metadata_index.add(0, [doc.metadata if doc is not None else {} for doc in index.documents])
+        index._load_extra(directory)
+        return index
+
+    def _save_extra(self, directory: str):
+        """Hook for subclasses to persist auxiliary structures"""
+        pass
+
+    def _load_config(self, config: Dict[str, Any]):
+        """Hook for subclasses to restore their own parameters"""
+        pass
+
+    def _load_extra(self, directory: str):
+        """Hook for subclasses to restore auxiliary structures"""
+        pass
@@ -0,0 +1,158 @@
+import os
+import math
+import time
+import asyncio
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+INPUT_TYPES = ("text", "image", "pdf", "batch")
+# Text pipelines are LLM-bound; image and PDF pipelines also hold an extraction worker;
+# a batch fans out internally, so few run at once
+DEFAULT_CONCURRENCY = {"text": 8, "image": 2, "pdf": 2, "batch": 2}
+
+
+class JobQueueFull(RuntimeError):
+    """Raised when a job is submitted to a full queue; retry_after is a seconds estimate"""
+
+    def __init__(self, input_type: str, retry_after: int):
+        super().__init__(f"The {input_type} job queue is full")
+        self.input_type = input_type
+        self.retry_after = retry_after
+
+
+class JobQueue:
+    """Bounded per-input-type queues, each drained by a fixed pool of pipeline workers"""
+
+    def __init__(self, concurrency: Optional[Dict[str, int]] = None, max_queue: Optional[int] = None):
+        self.concurrency = {
+            input_type: int(os.environ.get(f"{input_type.upper()}_PIPELINE_WORKERS", DEFAULT_CONCURRENCY[input_type]))
+            for input_type in INPUT_TYPES
+        }
+        self.concurrency.update(concurrency or {})
+        self.max_queue = max_queue if max_queue is not None else int(os.environ.get("JOB_QUEUE_SIZE", "64"))
+
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._waiting: Dict[str, "OrderedDict[str, float]"] = {input_type: OrderedDict() for input_type in INPUT_TYPES}
+        self._running: Dict[str, Dict[str, float]] = {input_type: {} for input_type in INPUT_TYPES}
+        self._wait_times: Dict[str, deque] = {input_type: deque(maxlen=500) for input_type in INPUT_TYPES}
+        self._run_times: Dict[str, deque] = {input_type: deque(maxlen=500) for input_type in INPUT_TYPES}
+        self._workers: List[asyncio.Task] = []
+        self._jobs: Dict[str, asyncio.Task] = {}
+        self._discards: Dict[str, Callable[[], None]] = {}
+        self._cancelled = set()
+
+    def start(self):
+        """Create the queues and workers on the running event loop"""
+        for input_type in INPUT_TYPES:
+            self._queues[input_type] = asyncio.Queue(maxsize=self.max_queue)
+            for _ in range(self.concurrency[input_type]):
+                self._workers.append(asyncio.create_task(self._worker(input_type)))
+
+    async def stop(self):
+        for job in self._jobs.values():
+            job.cancel()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, task_id: str, input_type: str, job: Callable[[], Awaitable[Any]], on_discard: Optional[Callable[[], None]] = None):
+        """Queue a job without waiting; raises JobQueueFull rather than letting the backlog grow.
+
+        on_discard runs if the job is cancelled before a worker picks it up.
+        """
+        try:
+            self._queues[input_type].put_nowait((task_id, job))
+        except asyncio.QueueFull:
+            raise JobQueueFull(input_type, self.retry_after(input_type)) from None
+        self._waiting[input_type][task_id] = time.monotonic()
+        if on_discard:
+            self._discards[task_id] = on_discard
+
+    def cancel(self, task_id: str) -> Optional[str]:
+        """Drop a queued job or cancel a running one; returns the state it was in, or None if not held here"""
+        for input_type in INPUT_TYPES:
+            if task_id in self._waiting[input_type]:
+                # The entry stays in the asyncio queue and is skipped when a worker reaches it
+                del self._waiting[input_type][task_id]
+                self._cancelled.add(task_id)
+                on_discard = self._discards.pop(task_id, None)
+                if on_discard:
+                    on_discard()
+                return "queued"
+        job = self._jobs.get(task_id)
+        if job is not None:
+            self._cancelled.add(task_id)
+            # Cancellation reaches whichever await the pipeline is in, including in-flight HTTP calls
+            job.cancel()
+            return "running"
+        return None
+
+    def retry_after(self, input_type: str) -> int:
+        """Seconds until a queue slot is likely to free up, from recent run times"""
+        run_times = self._run_times[input_type]
+        if not run_times:
+            return 5
+        # With the queue full, a slot opens each time any worker finishes a job
+        mean_run = sum(run_times) / len(run_times)
+        return max(1, min(300, math.ceil(mean_run / self.concurrency[input_type])))
+
+    async def _worker(self, input_type: str):
+        queue = self._queues[input_type]
+        while True:
+            task_id, job = await queue.get()
+            if task_id in self._cancelled:
+                self._cancelled.discard(task_id)
+                queue.task_done()
+                continue
+            self._discards.pop(task_id, None)
+            started = time.monotonic()
+            self._wait_times[input_type].append(started - self._waiting[input_type].pop(task_id, started))
+            self._running[input_type][task_id] = started
+            self._jobs[task_id] = asyncio.ensure_future(job())
+            try:
+                await self._jobs[task_id]
+            except asyncio.CancelledError:
+                # Only a cancelled job is absorbed; a cancelled worker (shutdown) still stops
+                if task_id not in self._cancelled:
+                    raise
+                print(f"Job {task_id} cancelled")
+            except Exception as e:
+                print(f"Job {task_id} failed outside its own error handling: {e}")
+            finally:
+                del self._running[input_type][task_id]
+                del self._jobs[task_id]
+                self._cancelled.discard(task_id)
+                self._run_times[input_type].append(time.monotonic() - started)
+                queue.task_done()
+
+    def job_status(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Queue position and wait so far for a job this process holds; None once it has finished"""
+        now = time.monotonic()
+        for input_type in INPUT_TYPES:
+            waiting = self._waiting[input_type]
+            if task_id in waiting:
+                position = list(waiting).index(task_id) + 1
+                return {
+                    "state": "queued",
+                    "position": position,
+                    "queue_depth": len(waiting),
+                    "waited_s": round(now - waiting[task_id], 3),
+                }
+            if task_id in self._running[input_type]:
+                return {"state": "running", "running_s": round(now - self._running[input_type][task_id], 3)}
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {}
+        for input_type in INPUT_TYPES:
+            waits = sorted(self._wait_times[input_type])
+            stats[input_type] = {
+                "workers": self.concurrency[input_type],
+                "running": len(self._running[input_type]),
+                "queue_depth": len(self._waiting[input_type]),
+                "max_queue": self.max_queue,
+                "wait_p50_s": round(waits[len(waits) // 2], 3) if waits else None,
+                "wait_p95_s": round(waits[min(len(waits) - 1, int(0.95 * len(waits)))], 3) if waits else None,
+            }
+        return stats
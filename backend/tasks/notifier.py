@@ -0,0 +1,47 @@
+import asyncio
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+TERMINAL_STATUSES = ("completed", "error", "cancelled")
+
+
+class TaskNotifier:
+    """Per-task wake-ups for status watchers, so nothing has to scan or poll the task store"""
+
+    def __init__(self):
+        self._events: Dict[str, asyncio.Event] = {}
+        self._watchers: Dict[str, int] = {}
+
+    def publish(self, task_id: str):
+        """Wake everyone watching a task; later watchers get a fresh event"""
+        event = self._events.pop(task_id, None)
+        if event is not None:
+            event.set()
+
+    @contextmanager
+    def watch(self, task_id: str) -> Iterator[asyncio.Event]:
+        """Event set on the task's next transition; take it before reading the status so none is missed"""
+        event = self._events.setdefault(task_id, asyncio.Event())
+        self._watchers[task_id] = self._watchers.get(task_id, 0) + 1
+        try:
+            yield event
+        finally:
+            self._watchers[task_id] -= 1
+            if not self._watchers[task_id]:
+                del self._watchers[task_id]
+                # Nobody left waiting on a task that never changed again
+                if self._events.get(task_id) is event:
+                    del self._events[task_id]
+
+    @property
+    def watched_tasks(self) -> int:
+        return len(self._watchers)
+
+    @staticmethod
+    async def wait(event: asyncio.Event, timeout: float) -> bool:
+        """True if the event fired within the timeout"""
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
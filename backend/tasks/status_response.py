@@ -0,0 +1,131 @@
+import os
+import gzip
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import orjson
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this go out uncompressed; the headers would eat most of the saving
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", "5"))
+ENCODED_CACHE_SIZE = int(os.environ.get("ENCODED_CACHE_SIZE", "256"))
+
+
+def status_body(task_id: str, status: str, response: bytes, queue: Optional[Dict[str, Any]]) -> bytes:
+    """JSON body of a status response, with the stored response bytes spliced in rather than re-serialized"""
+    head = orjson.dumps({"task_id": task_id, "status": status, "queue": queue})
+    return head[:-1] + b',"response":' + response + b"}"
+
+
+def status_version(task_id: str, status: str, response: bytes, queue: Optional[Dict[str, Any]]) -> bytes:
+    """What a status body's ETag is computed from: everything in it except the queue timings.
+
+    waited_s and running_s tick on every poll; hashing them would mean a queued or running
+    task never answers 304, and those are the tasks clients poll hardest.
+    """
+    queue_place = {key: value for key, value in (queue or {}).items() if not key.endswith("_s")}
+    return orjson.dumps([task_id, status, queue_place]) + response
+
+
+def accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    """Content codings named in an Accept-Encoding header, with their q-values"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Best coding both sides support: brotli when it is installed and accepted, otherwise gzip"""
+    accepted = accepted_encodings(accept_encoding)
+    supported = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best, best_quality = None, 0.0
+    for coding in supported:
+        quality = accepted.get(coding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison, as If-None-Match requires"""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    return any((tag.strip()[2:] if tag.strip().startswith("W/") else tag.strip()) == opaque for tag in if_none_match.split(","))
+
+
+class StatusResponder:
+    """Conditional, compressed responses for task status bodies.
+
+    Compressed bodies of finished tasks never change, so they are kept in a small LRU cache
+    and every later poll is served without compressing again.
+    """
+
+    def __init__(self, cache_size: int = ENCODED_CACHE_SIZE, min_bytes: int = COMPRESS_MIN_BYTES):
+        self.cache_size = cache_size
+        self.min_bytes = min_bytes
+        self._encoded: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def etag(body: bytes) -> str:
+        # Weak: the same body is equally valid in any content coding
+        return f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+    def encode(self, body: bytes, etag: str, encoding: str, cacheable: bool) -> bytes:
+        key = (etag, encoding)
+        if cacheable and key in self._encoded:
+            self._encoded.move_to_end(key)
+            self.hits += 1
+            return self._encoded[key]
+        if encoding == "br":
+            encoded = brotli.compress(body, quality=BROTLI_QUALITY)
+        else:
+            encoded = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+        if cacheable:
+            self.misses += 1
+            self._encoded[key] = encoded
+            if len(self._encoded) > self.cache_size:
+                self._encoded.popitem(last=False)
+        return encoded
+
+    def respond(self, request: Request, body: bytes, cacheable: bool = False, version: Optional[bytes] = None) -> Response:
+        """304 when the client already has this body, otherwise the body in the best accepted coding.
+
+        version, when given, is hashed for the ETag instead of the body.
+        """
+        etag = self.etag(body if version is None else version)
+        headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match", ""), etag):
+            return Response(status_code=304, headers=headers)
+
+        encoding = negotiate_encoding(request.headers.get("accept-encoding", "")) if len(body) >= self.min_bytes else None
+        if encoding is not None:
+            body = self.encode(body, etag, encoding, cacheable)
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def stats(self) -> Dict[str, int]:
+        return {"cached": len(self._encoded), "hits": self.hits, "misses": self.misses}
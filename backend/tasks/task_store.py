@@ -0,0 +1,295 @@
+import os
+import abc
+import time
+import heapq
+import uuid
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+
+DEFAULT_TASK_TTL = 86400
+# Runtime state belongs outside the source tree; TASK_DB_PATH overrides this
+DEFAULT_TASK_DB_PATH = os.path.join(
+    os.environ.get("XDG_STATE_HOME") or os.path.join(os.path.expanduser("~"), ".local", "state"),
+    "legal-ai-assistant",
+    "tasks.db"
+)
+UNFINISHED_STATUSES = ("queued", "processing")
+ORPHANED_TASK_ERROR = "Task was interrupted by a server restart before it finished"
+
+
+def _to_jsonable(value: Any) -> Any:
+    """orjson fallback for LangChain messages and other pydantic objects in a task result"""
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    return str(value)
+
+
+def encode_response(response: Optional[Dict[str, Any]]) -> bytes:
+    """Serialize a task response once, when it is stored; status polls serve these bytes as they are"""
+    return orjson.dumps(response, default=_to_jsonable)
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, but belongs to another user
+        return True
+    return True
+
+
+def _process_start(pid: int) -> Optional[str]:
+    """Start time of a process in clock ticks since boot, from /proc (Linux only)"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # The command name may contain spaces; starttime is the 20th field after its closing parenthesis
+    return stat.rsplit(")", 1)[1].split()[19]
+
+
+_identity: Dict[int, str] = {}
+
+
+def process_identity() -> str:
+    """pid:start identifying this process incarnation; a pid alone is reused, often by the restarted server itself"""
+    pid = os.getpid()
+    if pid not in _identity:
+        # Without /proc a random token still tells this process apart from an earlier one with the same pid
+        _identity[pid] = f"{pid}:{_process_start(pid) or uuid.uuid4().hex}"
+    return _identity[pid]
+
+
+def owner_alive(owner: str) -> bool:
+    """Whether the process that recorded this owner identity is still running"""
+    pid_text, _, start = owner.partition(":")
+    pid = int(pid_text)
+    if pid == os.getpid():
+        return owner == process_identity()
+    if not _process_alive(pid):
+        return False
+    current = _process_start(pid)
+    # Where /proc is unavailable, a live process with the pid gets the benefit of the doubt
+    return current is None or current == start
+
+
+def new_task_id() -> str:
+    """Collision-free task id, unlike the old per-second timestamp"""
+    return f"task_{uuid.uuid4().hex}"
+
+
+class TaskStore(abc.ABC):
+    """Where query tasks and their results live between submission and polling"""
+
+    def __init__(self, ttl: float = DEFAULT_TASK_TTL):
+        self.ttl = ttl
+
+    @abc.abstractmethod
+    def create(self, task_id: str, status: str = "processing", response: Optional[Dict[str, Any]] = None):
+        pass
+
+    @abc.abstractmethod
+    def update(self, task_id: str, status: str, response: Optional[Dict[str, Any]] = None):
+        pass
+
+    @abc.abstractmethod
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        pass
+
+    @abc.abstractmethod
+    def get_raw(self, task_id: str) -> Optional[Tuple[str, bytes]]:
+        """Status and the stored JSON bytes of the response, without parsing them"""
+
+    @abc.abstractmethod
+    def delete(self, task_id: str):
+        pass
+
+    @abc.abstractmethod
+    def evict_expired(self, now: Optional[float] = None) -> int:
+        """Remove tasks past their expiry and return how many were removed"""
+
+    @abc.abstractmethod
+    def recover_orphans(self) -> int:
+        """Fail queued and processing tasks whose worker process is gone; returns how many were failed"""
+
+    def close(self):
+        pass
+
+
+class InMemoryTaskStore(TaskStore):
+    """Single-process store for development; a heap orders tasks by expiry"""
+
+    def __init__(self, ttl: float = DEFAULT_TASK_TTL):
+        super().__init__(ttl)
+        self._tasks: Dict[str, Dict[str, Any]] = {}
+        self._expiry: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+
+    def create(self, task_id: str, status: str = "processing", response: Optional[Dict[str, Any]] = None):
+        now = time.time()
+        with self._lock:
+            self._tasks[task_id] = {"status": status, "response": encode_response(response), "created_at": now, "updated_at": now, "expires_at": now + self.ttl}
+            heapq.heappush(self._expiry, (now + self.ttl, task_id))
+
+    def update(self, task_id: str, status: str, response: Optional[Dict[str, Any]] = None):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is not None:
+                task.update(status=status, response=encode_response(response), updated_at=time.time())
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            task = self._tasks.get(task_id)
+            return {**task, "response": orjson.loads(task["response"])} if task is not None else None
+
+    def get_raw(self, task_id: str) -> Optional[Tuple[str, bytes]]:
+        with self._lock:
+            task = self._tasks.get(task_id)
+            return (task["status"], task["response"]) if task is not None else None
+
+    def delete(self, task_id: str):
+        with self._lock:
+            # The heap entry is left behind and skipped when it surfaces
+            self._tasks.pop(task_id, None)
+
+    def evict_expired(self, now: Optional[float] = None) -> int:
+        now = now or time.time()
+        removed = 0
+        with self._lock:
+            while self._expiry and self._expiry[0][0] <= now:
+                expires_at, task_id = heapq.heappop(self._expiry)
+                task = self._tasks.get(task_id)
+                if task is not None and task["expires_at"] == expires_at:
+                    del self._tasks[task_id]
+                    removed += 1
+        return removed
+
+    def recover_orphans(self) -> int:
+        # Tasks die with the process that holds them, so none can be left behind
+        return 0
+
+
+class SQLiteTaskStore(TaskStore):
+    """Durable store in a local SQLite file, shared safely by every uvicorn worker process on the host"""
+
+    def __init__(self, path: str = DEFAULT_TASK_DB_PATH, ttl: float = DEFAULT_TASK_TTL):
+        super().__init__(ttl)
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        connection = self._connection()
+        with connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    task_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    response TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    owner TEXT
+                )
+            """)
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(tasks)")}
+            if "owner" not in columns:
+                connection.execute("ALTER TABLE tasks ADD COLUMN owner TEXT")
+            # Eviction walks this index, so it touches only the expired rows
+            connection.execute("CREATE INDEX IF NOT EXISTS tasks_expires_at ON tasks (expires_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread; SQLite's file locks coordinate between processes"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            # WAL lets status polls read while a worker writes; NORMAL sync is durable across process crashes
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA busy_timeout=30000")
+            self._local.connection = connection
+        return connection
+
+    def create(self, task_id: str, status: str = "processing", response: Optional[Dict[str, Any]] = None):
+        now = time.time()
+        self._connection().execute(
+            "INSERT INTO tasks (task_id, status, response, created_at, updated_at, expires_at, owner) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            # The job queue is per process, so the worker that accepts a task is the one that runs it
+            (task_id, status, encode_response(response), now, now, now + self.ttl, process_identity())
+        )
+
+    def update(self, task_id: str, status: str, response: Optional[Dict[str, Any]] = None):
+        self._connection().execute(
+            "UPDATE tasks SET status = ?, response = ?, updated_at = ? WHERE task_id = ?",
+            (status, encode_response(response), time.time(), task_id)
+        )
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute(
+            "SELECT status, response, created_at, updated_at, expires_at FROM tasks WHERE task_id = ?",
+            (task_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        status, response, created_at, updated_at, expires_at = row
+        return {
+            "status": status,
+            "response": orjson.loads(response) if response else None,
+            "created_at": created_at,
+            "updated_at": updated_at,
+            "expires_at": expires_at,
+        }
+
+    def get_raw(self, task_id: str) -> Optional[Tuple[str, bytes]]:
+        row = self._connection().execute("SELECT status, response FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        if row is None:
+            return None
+        status, response = row
+        # Rows written before responses were stored as bytes come back as text
+        return status, response.encode("utf-8") if isinstance(response, str) else (response or b"null")
+
+    def delete(self, task_id: str):
+        self._connection().execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
+
+    def evict_expired(self, now: Optional[float] = None) -> int:
+        cursor = self._connection().execute("DELETE FROM tasks WHERE expires_at <= ?", (now or time.time(),))
+        return cursor.rowcount
+
+    def recover_orphans(self) -> int:
+        connection = self._connection()
+        rows = connection.execute(
+            "SELECT task_id, owner FROM tasks WHERE status IN (?, ?)", UNFINISHED_STATUSES
+        ).fetchall()
+        # Other workers on the host share this file; only tasks whose process has exited are orphaned
+        orphaned = [task_id for task_id, owner in rows if owner is None or not owner_alive(str(owner))]
+        if not orphaned:
+            return 0
+        response, now = encode_response({"error": ORPHANED_TASK_ERROR}), time.time()
+        with connection:
+            connection.execute("BEGIN")
+            connection.executemany(
+                "UPDATE tasks SET status = 'error', response = ?, updated_at = ? WHERE task_id = ? AND status IN (?, ?)",
+                [(response, now, task_id, *UNFINISHED_STATUSES) for task_id in orphaned]
+            )
+        return len(orphaned)
+
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+def create_task_store(backend: Optional[str] = None) -> TaskStore:
+    """Build the task store selected by TASK_STORE (sqlite or memory)"""
+    backend = backend or os.environ.get("TASK_STORE", "sqlite")
+    ttl = float(os.environ.get("TASK_TTL", str(DEFAULT_TASK_TTL)))
+    if backend == "memory":
+        return InMemoryTaskStore(ttl)
+    if backend == "sqlite":
+        return SQLiteTaskStore(os.environ.get("TASK_DB_PATH", DEFAULT_TASK_DB_PATH), ttl)
+    raise ValueError(f"Unsupported task store: {backend}")
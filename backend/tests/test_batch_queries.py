@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("magic")
+
+import app
+from tasks.task_store import InMemoryTaskStore
+
+
+class RecordingStore(InMemoryTaskStore):
+    """Task store that remembers every response written to it"""
+
+    def __init__(self):
+        super().__init__()
+        self.writes = []
+
+    def update(self, task_id, status, response=None):
+        self.writes.append((status, response))
+        super().update(task_id, status, response)
+
+
+class EchoAssistant:
+    def __init__(self):
+        self.calls = 0
+
+    async def process_query(self, query, input_type, conversation_history=None, memo=None, is_cancelled=None):
+        self.calls += 1
+        if query == "fail":
+            raise RuntimeError("no answer")
+        return {"final_response": f"answer to {query}", "references": []}
+
+
+def run_batch(monkeypatch, queries):
+    store, assistant = RecordingStore(), EchoAssistant()
+    monkeypatch.setattr(app, "task_store", store)
+    monkeypatch.setattr(app, "legal_assistant", assistant)
+    store.create("batch", "queued")
+    requests = [app.TextQueryRequest(query=query) for query in queries]
+    asyncio.run(app.process_batch_async("batch", requests))
+    return store, assistant
+
+
+def test_progress_writes_carry_counts_only(monkeypatch):
+    store, assistant = run_batch(monkeypatch, ["a", "b", "a", "c"])
+
+    progress_writes = [response for status, response in store.writes if status == "processing"]
+    assert progress_writes and all("items" not in response for response in progress_writes)
+    assert progress_writes[-1]["counts"]["completed"] == 4
+    assert assistant.calls == 3  # the repeated question is answered once
+
+    status, summary = store.writes[-1]
+    assert status == "completed"
+    assert [item["response"]["final_response"] for item in summary["items"]] == ["answer to a", "answer to b", "answer to a", "answer to c"]
+
+
+def test_failed_items_are_reported_at_the_end(monkeypatch):
+    store, _ = run_batch(monkeypatch, ["a", "fail"])
+    status, summary = store.writes[-1]
+    assert status == "completed"
+    assert summary["counts"] == {"queued": 0, "processing": 0, "completed": 1, "error": 1, "cancelled": 0}
+    assert summary["items"][1] == {"index": 1, "status": "error", "error": "no answer"}
@@ -0,0 +1,40 @@
+from agent.blob_store import BlobStore, history_message, lean_extraction
+
+
+def pdf_extraction(text, query="Can we terminate early?"):
+    return {
+        "type": "pdf",
+        "content": f"PDF content: {text}\n\nUser query: {query}",
+        "metadata": {"user_query": query, "documents": ["page one", "page two"], "extracted_text": text},
+    }
+
+
+def test_lean_extraction_moves_pages_behind_a_handle():
+    blobs = BlobStore()
+    lean = lean_extraction(pdf_extraction("terms"), blobs)
+    assert "documents" not in lean["metadata"] and "extracted_text" not in lean["metadata"]
+    assert blobs.get(lean["metadata"]["pages_ref"]) == ["page one", "page two"]
+
+
+def test_history_message_keeps_an_excerpt_of_uploads():
+    blobs = BlobStore()
+    text = "The supplier may terminate on ninety days notice. " * 2000
+    processed = lean_extraction(pdf_extraction(text), blobs)
+
+    message = history_message(processed, excerpt_chars=200)
+
+    assert len(message.content) < 400
+    assert message.content.startswith("Can we terminate early?")
+    attachment = message.additional_kwargs["attachment"]
+    assert attachment == {"type": "pdf", "chars": len(processed["content"])}
+    assert "timestamp" in message.additional_kwargs
+
+
+def test_history_message_keeps_short_uploads_and_text_whole():
+    short = pdf_extraction("Short note.", query="")
+    assert "Short note." in history_message(short).content
+
+    text = {"type": "text", "content": "What is adverse possession?", "metadata": {}}
+    message = history_message(text)
+    assert message.content == "What is adverse possession?"
+    assert "attachment" not in message.additional_kwargs
@@ -0,0 +1,91 @@
+import zlib
+
+import numpy as np
+from langchain_core.documents import Document
+
+from retrieval.bm25_index import BM25Index, tokenize
+from retrieval.hybrid_retriever import HybridRetriever, reciprocal_rank_fusion
+from retrieval.vector_index import LocalVectorIndex
+
+TEXTS = {
+    "a": "Claims under 42 U.S.C. § 1983 require action under color of state law.",
+    "b": "The statute of limitations for breach of contract is six years.",
+    "c": "A landlord must return the security deposit within thirty days.",
+    "d": "Qualified immunity shields officials sued under section 1983.",
+}
+
+
+class KeywordEmbeddings:
+    """Deterministic bag-of-words embeddings, enough for the dense half of hybrid search"""
+
+    def __init__(self, dim=64):
+        self.dim = dim
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in tokenize(text):
+            vector[zlib.crc32(token.encode()) % self.dim] += 1
+        return vector
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def test_tokenize_keeps_citations_whole():
+    tokens = tokenize("See 42 U.S.C. § 1983 and case 12-345.")
+    assert "§1983" in tokens and "1983" in tokens
+    assert "u.s.c" in tokens
+    assert "12-345" in tokens
+    assert "and" not in tokens
+
+
+def test_bm25_ranks_matching_chunks_first():
+    index = BM25Index.from_texts(list(TEXTS), TEXTS.values())
+    hits = index.search("§ 1983 color of law", k=2)
+    assert [doc_id for doc_id, _ in hits] == ["a", "d"]
+    assert hits[0][1] > hits[1][1] > 0
+    assert index.search("unknownterm") == []
+
+
+def test_bm25_save_and_load(tmp_path):
+    index = BM25Index.from_texts(list(TEXTS), TEXTS.values())
+    index.save(str(tmp_path))
+    assert BM25Index.exists(str(tmp_path))
+    loaded = BM25Index.load(str(tmp_path))
+    assert loaded.search("security deposit") == index.search("security deposit")
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["x", "y", "z"], ["y", "x"]], k=60)
+    # Ties keep first-seen order
+    assert [doc_id for doc_id, _ in fused] == ["x", "y", "z"]
+    scores = dict(fused)
+    assert scores["x"] == scores["y"] == 1 / 61 + 1 / 62
+    assert scores["z"] == 1 / 63
+
+
+def test_reciprocal_rank_fusion_weights():
+    fused = dict(reciprocal_rank_fusion([["x"], ["y"]], k=0, weights=[2.0, 1.0]))
+    assert fused == {"x": 2.0, "y": 1.0}
+
+
+def test_hybrid_retriever_fuses_dense_and_keyword_hits():
+    embeddings = KeywordEmbeddings()
+    documents = [Document(page_content=text, metadata={"chunk_id": doc_id, "jurisdiction": "federal" if doc_id in "ad" else "state"})
+                 for doc_id, text in TEXTS.items()]
+    vector_index = LocalVectorIndex.from_documents(documents, embeddings, quantization="none")
+    retriever = HybridRetriever(vector_index, BM25Index.from_texts(list(TEXTS), TEXTS.values()))
+
+    results = retriever.similarity_search("section 1983 qualified immunity", k=2)
+    assert {doc.metadata["chunk_id"] for doc in results} == {"a", "d"}
+    assert results[0].metadata["chunk_id"] == "d"
+
+    filtered = retriever.similarity_search("section 1983 qualified immunity", k=2, filters={"jurisdiction": ["state"]})
+    assert all(doc.metadata["jurisdiction"] == "state" for doc in filtered)
+
+    # Chunks deleted from the vector index are dropped even though BM25 still lists them
+    vector_index.delete(["d"])
+    assert "d" not in {doc.metadata["chunk_id"] for doc in retriever.similarity_search("qualified immunity", k=4)}
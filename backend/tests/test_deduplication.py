@@ -0,0 +1,80 @@
+import numpy as np
+from langchain_core.documents import Document
+
+from processing.deduplication import NearDuplicateDetector, deduplicate_chunks
+from processing.metadata_tagging import LegalMetadataTagger
+from retrieval.metadata_filter import MetadataPostingIndex
+
+BASE = ("The court held that the landlord breached the implied warranty of habitability by failing to repair "
+        "the heating system during the winter months, and awarded the tenant a partial rent abatement for the period. "
+        "The landlord argued that the tenant had refused access to the unit, but the trial court found that notice "
+        "of the entry was never given and that the repairs were delayed for reasons within the landlord's control.")
+# The same paragraph with a trailing edit, as re-extracted copies of a page often differ
+NEAR = BASE + " Costs were awarded."
+OTHER = ("Under the Fourth Amendment, a warrantless search of a vehicle is permitted when officers have probable "
+         "cause to believe it contains evidence of a crime, as the Supreme Court explained in Carroll.")
+
+
+def test_signature_similarity_tracks_jaccard():
+    detector = NearDuplicateDetector()
+    base, near, other = (detector.signature(text.lower()) for text in (BASE, NEAR, OTHER))
+    assert np.mean(base == near) > 0.6
+    assert np.mean(base == other) < 0.1
+
+
+def test_exact_and_near_duplicates_collapse_into_the_first_chunk():
+    detector = NearDuplicateDetector(threshold=0.6)
+    texts = [BASE, OTHER, "  " + BASE.upper() + " ", NEAR]
+    assert detector.find_clusters(texts) == [0, 1, 0, 0]
+
+
+def test_distinct_texts_stay_separate():
+    detector = NearDuplicateDetector(threshold=0.85)
+    assert detector.find_clusters([BASE, OTHER, "short text"]) == [0, 1, 2]
+
+
+def test_threshold_must_be_met():
+    assert NearDuplicateDetector(threshold=0.99).find_clusters([BASE, NEAR]) == [0, 1]
+
+
+def test_deduplicate_chunks_merges_sources_and_reports_stats():
+    chunks = [
+        Document(page_content=BASE, metadata={"source": "a.pdf", "page": 1}),
+        Document(page_content=OTHER, metadata={"source": "a.pdf", "page": 2}),
+        Document(page_content=BASE, metadata={"source": "b.pdf", "page": 7}),
+    ]
+    kept, stats = deduplicate_chunks(chunks, NearDuplicateDetector())
+    assert [chunk.page_content for chunk in kept] == [BASE, OTHER]
+    assert kept[0].metadata["sources"] == ["a.pdf (Page 1)", "b.pdf (Page 7)"]
+    assert kept[0].metadata["duplicate_count"] == 2
+    assert "sources" not in kept[1].metadata
+    assert stats["removed_chunks"] == 1
+    assert stats["duplicate_clusters"] == 1
+    assert stats["output_chars"] == len(BASE) + len(OTHER)
+
+
+def test_duplicates_keep_every_members_tags():
+    chunks = [
+        Document(page_content=BASE, metadata={"source": "ca.pdf", "jurisdiction": ["california"], "legal_domains": ["property"]}),
+        Document(page_content=BASE, metadata={"source": "ny.pdf", "jurisdiction": ["new_york"], "legal_domains": ["property", "contract"]}),
+        # Tags written by older ingests are plain strings
+        Document(page_content=BASE, metadata={"source": "us.pdf", "jurisdiction": "federal"}),
+    ]
+    kept, _ = deduplicate_chunks(chunks, NearDuplicateDetector())
+    assert len(kept) == 1
+    assert kept[0].metadata["jurisdiction"] == ["california", "new_york", "federal"]
+    assert kept[0].metadata["legal_domains"] == ["property", "contract"]
+
+    # Every merged value is indexed, so filtering on any member's tags finds the chunk
+    index = MetadataPostingIndex()
+    index.add(0, [chunk.metadata for chunk in kept])
+    for jurisdiction in ("california", "new_york", "federal"):
+        assert index.candidate_rows({"jurisdiction": [jurisdiction]}).tolist() == [0]
+    assert index.candidate_rows({"legal_domains": ["contract"]}).tolist() == [0]
+    assert index.candidate_rows({"jurisdiction": ["texas"]}).tolist() == []
+
+
+def test_tagger_emits_list_tags():
+    tags = LegalMetadataTagger().classify("notes/california/lease.pdf", "The landlord and tenant signed a lease. " * 3)
+    assert tags["jurisdiction"] == ["california"]
+    assert "property" in tags["legal_domains"]
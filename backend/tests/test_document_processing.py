@@ -0,0 +1,58 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("weaviate")
+
+from processing.document_processing import DocumentProcessor
+
+
+class StubEmbeddings:
+    def embed_documents(self, texts):
+        return [[float(len(text))] for text in texts]
+
+
+class BarrierCollection:
+    """Collection whose vector search only returns once every query is in flight at the same time"""
+
+    def __init__(self, concurrent_queries):
+        self.barrier = threading.Barrier(concurrent_queries, timeout=5)
+        self.query = SimpleNamespace(near_vector=self.near_vector)
+
+    def near_vector(self, near_vector, limit, filters, return_metadata):
+        self.barrier.wait()
+        length = int(near_vector[0])
+        return SimpleNamespace(objects=[
+            SimpleNamespace(properties={"content": f"{length} {i}", "chunk_id": f"{length}-{i}"}, metadata=SimpleNamespace(distance=1.0 / length + i))
+            for i in range(limit)
+        ])
+
+
+def processor_for(collection, concurrency):
+    processor = DocumentProcessor(documents_dir="")
+    processor.embeddings = StubEmbeddings()
+    processor.search_concurrency = concurrency
+    client = SimpleNamespace(collections=SimpleNamespace(get=lambda name: collection))
+    processor._connection = SimpleNamespace(client=client, close=lambda: None, suspend=lambda: None)
+    return processor
+
+
+def test_subqueries_are_searched_concurrently():
+    queries = ["notice", "termination for cause", "indemnity"]
+    processor = processor_for(BarrierCollection(len(queries)), concurrency=4)
+    try:
+        results = processor.search_collection_multi(queries, k=2)
+    finally:
+        processor.close()
+
+    # Each query's best hit outranks every second hit, and longer queries sit closer to their matches
+    assert [doc.page_content for doc, _ in results] == ["21 0", "9 0"]
+    assert processor._search_executor is None
+
+
+def test_single_query_skips_the_executor():
+    processor = processor_for(BarrierCollection(1), concurrency=4)
+    results = processor.search_collection_multi(["notice"], k=3)
+    assert len(results) == 3
+    assert processor._search_executor is None
@@ -0,0 +1,62 @@
+import zlib
+
+import numpy as np
+import pytest
+
+from benchmarks.embedding_benchmark import SAMPLE_TEXTS
+from processing.embeddings import embedding_parity, parity_failures
+
+
+class HashedEmbeddings:
+    """Deterministic bag-of-words vectors, optionally with noise, to exercise the parity maths"""
+
+    def __init__(self, noise: float = 0.0, dim: int = 64):
+        self.noise = noise
+        self.dim = dim
+
+    def embed_documents(self, texts):
+        vectors = []
+        for text in texts:
+            vector = np.zeros(self.dim)
+            for word in text.lower().split():
+                vector[zlib.crc32(word.encode()) % self.dim] += 1.0
+            rng = np.random.default_rng(zlib.crc32(text.encode()))
+            vectors.append((vector + self.noise * rng.standard_normal(self.dim)).tolist())
+        return vectors
+
+
+def test_identical_backends_pass():
+    parity = embedding_parity(HashedEmbeddings(), HashedEmbeddings(), SAMPLE_TEXTS)
+    assert parity["min_cosine"] == pytest.approx(1.0)
+    assert parity["neighbour_agreement"] == 1.0
+    assert parity_failures(parity) == []
+
+
+def test_drifting_backend_fails():
+    parity = embedding_parity(HashedEmbeddings(), HashedEmbeddings(noise=2.0), SAMPLE_TEXTS)
+    failures = parity_failures(parity)
+    assert any("min cosine" in failure for failure in failures)
+
+
+@pytest.fixture(scope="module")
+def torch_reference():
+    pytest.importorskip("langchain_huggingface")
+    from processing.embeddings import create_embeddings
+    try:
+        return create_embeddings("torch")
+    except OSError as e:
+        pytest.skip(f"embedding model could not be downloaded: {e}")
+
+
+@pytest.mark.parametrize("backend", ["onnx", "onnx-int8"])
+def test_onnx_backends_match_torch(torch_reference, backend):
+    for module in ("onnxruntime", "tokenizers", "huggingface_hub"):
+        pytest.importorskip(module)
+    from processing.embeddings import create_embeddings
+    try:
+        candidate = create_embeddings(backend)
+    except OSError as e:
+        pytest.skip(f"ONNX graph could not be downloaded: {e}")
+
+    parity = embedding_parity(torch_reference, candidate, SAMPLE_TEXTS)
+    assert parity_failures(parity) == []
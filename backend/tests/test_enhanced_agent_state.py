@@ -0,0 +1,40 @@
+import pytest
+
+from agent.enhanced_agent_state import determine_search_sufficiency, relevance_score
+
+
+@pytest.mark.parametrize("score, expected", [
+    (8, 8.0),
+    (7.5, 7.5),
+    ("8", 8.0),
+    ("8/10", 8.0),
+    ("8.5 / 10", 8.5),
+    ("80 out of 100", 8.0),
+    ("Score: 6 (partially relevant)", 6.0),
+    ("high", 0.0),
+    (None, 0.0),
+    (True, 0.0),
+])
+def test_relevance_score_parses_what_the_llm_returns(score, expected):
+    assert relevance_score({"Relevance Score": score}) == pytest.approx(expected)
+
+
+def test_missing_evaluation_scores_zero():
+    assert relevance_score(None) == 0.0
+    assert relevance_score({}) == 0.0
+
+
+def test_document_sufficiency_accepts_string_scores():
+    assert determine_search_sufficiency({"document_search_evaluation": {"Relevance Score": "8/10"}}, "document") == {
+        "document_search_sufficient": True,
+        "need_additional_search": False,
+    }
+    unparseable = determine_search_sufficiency({"document_search_evaluation": {"Relevance Score": "n/a"}}, "document")
+    assert unparseable["document_search_sufficient"] is False
+
+
+def test_web_sufficiency_only_asks_for_more_when_still_needed():
+    state = {"web_search_evaluation": {"Relevance Score": "5"}, "need_additional_search": False}
+    assert determine_search_sufficiency(state, "web") == {"web_search_sufficient": False, "need_additional_search": False}
+    with pytest.raises(ValueError):
+        determine_search_sufficiency(state, "image")
@@ -0,0 +1,63 @@
+import os
+import time
+import asyncio
+
+from processing.extraction_pool import ExtractionPool, ExtractionTimeout
+
+
+def sleepy_job(input_type, data, text_query):
+    """Stands in for an extraction: "hang" never returns in time, anything else sleeps for data seconds"""
+    if input_type == "hang":
+        with open(data, "w") as pid_file:
+            pid_file.write(str(os.getpid()))
+        time.sleep(60)
+    else:
+        time.sleep(data)
+    return {"pid": os.getpid()}
+
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    # A terminated worker lingers as a zombie until its pool reaps it
+    with open(f"/proc/{pid}/stat") as stat:
+        return stat.read().rsplit(")", 1)[1].split()[0] != "Z"
+
+
+def test_a_hung_job_does_not_take_down_the_job_beside_it(tmp_path):
+    pid_file = str(tmp_path / "hung.pid")
+    pool = ExtractionPool(max_workers=2, timeout=30, job=sleepy_job)
+
+    async def scenario():
+        hung = asyncio.create_task(pool.run("hang", pid_file, timeout=2))
+        healthy = asyncio.create_task(pool.run("pdf", 4))
+        try:
+            await hung
+        except ExtractionTimeout:
+            pass
+        else:
+            raise AssertionError("the hung job should have timed out")
+        hung_pid = int(open(pid_file).read())
+        # The healthy job is still running on the old pool, which waits for it before stopping the hung worker
+        retired = pool.stats()["retired_pools"]
+        still_running = alive(hung_pid)
+        fresh = await pool.run("pdf", 0)
+        done = await healthy
+        return hung_pid, retired, still_running, fresh, done
+
+    try:
+        hung_pid, retired, still_running, fresh, done = asyncio.run(scenario())
+        stats = pool.stats()
+    finally:
+        pool.close()
+
+    assert retired == 1 and still_running
+    assert done["pid"] not in (hung_pid, fresh["pid"])
+    assert stats["completed"] == 2 and stats["timed_out"] == 1
+    assert stats["recycled"] == 1 and stats["retired_pools"] == 0
+    deadline = time.monotonic() + 5
+    while alive(hung_pid) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not alive(hung_pid)
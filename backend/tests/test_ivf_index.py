@@ -0,0 +1,87 @@
+import numpy as np
+from langchain_core.documents import Document
+
+from retrieval.ivf_index import IVFVectorIndex, spherical_kmeans
+from retrieval.vector_index import normalize_embeddings
+
+
+def clustered_vectors(rows, dim=32, topics=16, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = normalize_embeddings(rng.standard_normal((topics, dim)).astype(np.float32))
+    noise = rng.standard_normal((rows, dim)).astype(np.float32) * 0.3
+    return normalize_embeddings(centers[rng.integers(0, topics, rows)] + noise)
+
+
+def build(vectors, **kwargs):
+    index = IVFVectorIndex(**kwargs)
+    documents = [Document(page_content="", metadata={"jurisdiction": "federal" if i % 3 else "state"}) for i in range(len(vectors))]
+    index.add_embeddings(documents, vectors, ids=[str(i) for i in range(len(vectors))])
+    return index
+
+
+def recall(index, vectors, queries, k=5, **kwargs):
+    hits = 0
+    for query in queries:
+        expected = set(np.argsort(-(vectors @ query))[:k])
+        hits += len(expected.intersection(row for row, _ in index.search_rows(query, k, **kwargs)))
+    return hits / (len(queries) * k)
+
+
+def test_spherical_kmeans_returns_unit_centroids():
+    centroids = spherical_kmeans(clustered_vectors(2000), 16)
+    assert centroids.shape == (16, 32)
+    np.testing.assert_allclose(np.linalg.norm(centroids, axis=1), 1.0, rtol=1e-5)
+
+
+def test_untrained_index_falls_back_to_a_flat_scan():
+    vectors = clustered_vectors(200)
+    index = build(vectors, nlist=16)
+    assert not index.is_trained
+    assert recall(index, vectors, vectors[:10]) == 1.0
+
+
+def test_trains_once_there_are_enough_rows():
+    vectors = clustered_vectors(4000)
+    index = build(vectors, nlist=16, quantization="none")
+    assert index.is_trained
+    assert index.list_sizes().sum() == 4000
+    # Probing every list is an exact search
+    assert recall(index, vectors, vectors[:20], nprobe=16) == 1.0
+    assert recall(index, vectors, vectors[:20], nprobe=4) >= 0.8
+
+
+def test_rows_added_after_training_are_searchable():
+    vectors = clustered_vectors(4000)
+    index = build(vectors[:3000], nlist=16, quantization="none")
+    index.add_embeddings([Document(page_content="") for _ in range(1000)], vectors[3000:], ids=[str(i) for i in range(3000, 4000)])
+    assert index.list_sizes().sum() == 4000
+    assert index.search_rows(vectors[3500], k=1, nprobe=16)[0][0] == 3500
+
+
+def test_compact_keeps_lists_consistent():
+    vectors = clustered_vectors(4000)
+    index = build(vectors, nlist=16, quantization="none")
+    index.delete([str(i) for i in range(0, 4000, 2)])
+    index.compact()
+    assert len(index.assignments) == 2000
+    assert index.list_sizes().sum() == 2000
+    row = index.row_of("1")
+    assert index.search_rows(vectors[1], k=1, nprobe=16)[0][0] == row
+
+
+def test_selective_filter_scans_exactly():
+    vectors = clustered_vectors(4000)
+    index = build(vectors, nlist=16, quantization="none")
+    results = index.search_rows(vectors[0], k=5, filters={"jurisdiction": ["state"]}, nprobe=1)
+    assert results[0][0] == 0
+    assert all(index.documents[row].metadata["jurisdiction"] == "state" for row, _ in results)
+
+
+def test_save_and_load_keeps_the_lists(tmp_path):
+    vectors = clustered_vectors(4000)
+    index = build(vectors, nlist=16)
+    index.save(str(tmp_path))
+    loaded = IVFVectorIndex.load(str(tmp_path))
+    assert loaded.is_trained and loaded.nlist == 16
+    np.testing.assert_array_equal(loaded.list_sizes(), index.list_sizes())
+    assert loaded.search_rows(vectors[5], k=5) == index.search_rows(vectors[5], k=5)
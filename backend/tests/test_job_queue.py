@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+from tasks.job_queue import JobQueue, JobQueueFull
+
+
+def single_worker_queue(max_queue=2):
+    return JobQueue(concurrency={"text": 1, "image": 1, "pdf": 1, "batch": 1}, max_queue=max_queue)
+
+
+def run(scenario, max_queue=2):
+    async def main():
+        queue = single_worker_queue(max_queue)
+        queue.start()
+        try:
+            return await scenario(queue)
+        finally:
+            await queue.stop()
+    return asyncio.run(main())
+
+
+def blocking_job(started, release, log, name):
+    async def job():
+        started.set()
+        await release.wait()
+        log.append(name)
+    return job
+
+
+def test_jobs_run_in_order_per_input_type():
+    async def scenario(queue):
+        log, release = [], asyncio.Event()
+        release.set()
+        for name in ("a", "b", "c"):
+            queue.submit(name, "text", blocking_job(asyncio.Event(), release, log, name))
+        while len(log) < 3:
+            await asyncio.sleep(0)
+        return log
+    assert run(scenario, max_queue=3) == ["a", "b", "c"]
+
+
+def test_full_queue_rejects_with_retry_after():
+    async def scenario(queue):
+        started, release, log = asyncio.Event(), asyncio.Event(), []
+        queue.submit("running", "pdf", blocking_job(started, release, log, "running"))
+        await started.wait()
+        queue.submit("q1", "pdf", blocking_job(asyncio.Event(), release, log, "q1"))
+        queue.submit("q2", "pdf", blocking_job(asyncio.Event(), release, log, "q2"))
+        with pytest.raises(JobQueueFull) as excinfo:
+            queue.submit("q3", "pdf", blocking_job(asyncio.Event(), release, log, "q3"))
+        # Other input types have their own queues
+        queue.submit("t1", "text", blocking_job(asyncio.Event(), release, log, "t1"))
+        status = queue.job_status("q2")
+        release.set()
+        return excinfo.value, status
+    error, status = run(scenario)
+    assert error.input_type == "pdf" and error.retry_after == 5
+    assert status["state"] == "queued" and status["position"] == 2 and status["queue_depth"] == 2
+
+
+def test_cancelling_a_queued_job_skips_it_and_discards_its_input():
+    async def scenario(queue):
+        started, release, log, discarded = asyncio.Event(), asyncio.Event(), [], []
+        queue.submit("running", "text", blocking_job(started, release, log, "running"))
+        await started.wait()
+        queue.submit("queued", "text", blocking_job(asyncio.Event(), release, log, "queued"), on_discard=lambda: discarded.append("queued"))
+        queue.submit("next", "text", blocking_job(asyncio.Event(), release, log, "next"))
+        state = queue.cancel("queued")
+        release.set()
+        while len(log) < 2:
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        return state, log, discarded, queue.job_status("queued")
+    state, log, discarded, status = run(scenario)
+    assert state == "queued"
+    assert log == ["running", "next"]
+    assert discarded == ["queued"]
+    assert status is None
+
+
+def test_cancelling_a_running_job_keeps_the_worker_alive():
+    async def scenario(queue):
+        started, release, log = asyncio.Event(), asyncio.Event(), []
+        queue.submit("slow", "text", blocking_job(started, release, log, "slow"))
+        await started.wait()
+        assert queue.job_status("slow")["state"] == "running"
+        state = queue.cancel("slow")
+        release.set()
+        queue.submit("after", "text", blocking_job(asyncio.Event(), release, log, "after"))
+        while not log:
+            await asyncio.sleep(0)
+        return state, log, queue.cancel("unknown")
+    state, log, unknown = run(scenario)
+    assert state == "running"
+    assert log == ["after"]
+    assert unknown is None
+
+
+def test_failing_job_does_not_stop_the_worker():
+    async def scenario(queue):
+        log, release = [], asyncio.Event()
+        release.set()
+
+        async def boom():
+            raise RuntimeError("boom")
+
+        queue.submit("bad", "image", boom)
+        queue.submit("good", "image", blocking_job(asyncio.Event(), release, log, "good"))
+        while not log:
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        return log, queue.stats()["image"]
+    log, stats = run(scenario)
+    assert log == ["good"]
+    assert stats["running"] == 0 and stats["queue_depth"] == 0 and stats["wait_p50_s"] is not None
+
+
+def test_retry_after_tracks_run_times():
+    queue = single_worker_queue()
+    queue._run_times["text"].extend([20.0, 40.0])
+    assert queue.retry_after("text") == 30
+    queue.concurrency["text"] = 4
+    assert queue.retry_after("text") == 8
@@ -0,0 +1,110 @@
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from metrics import legal_metrics_api
+from metrics.legal_metrics_api import fetch_court_metrics, fetch_jurisdictions_breakdown
+
+COUNTS = {"F": 100, "S": 200, "FA": 30, "FD": 40, "FS": 5}
+
+
+class StubCourtListener:
+    """Local stand-in for the CourtListener opinions endpoint that records how many requests overlap"""
+
+    def __init__(self, delay=0.05, failing=("FB",)):
+        self.delay = delay
+        self.failing = failing
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = 0
+
+    async def opinions(self, request):
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            jurisdiction = request.query.get("court__jurisdiction")
+            if jurisdiction in self.failing:
+                return web.json_response({"detail": "unavailable"}, status=503)
+            assert request.query["count"] == "on"
+            if jurisdiction:
+                return web.json_response({"count": COUNTS[jurisdiction]})
+            if request.query.get("cluster__docket__court") == "scotus":
+                return web.json_response({"count": 7})
+            if "date_filed__gte" in request.query:
+                return web.json_response({"count": 3})
+            return web.json_response({"count": 1000})
+        finally:
+            self.in_flight -= 1
+
+
+def run_against_stub(monkeypatch, stub, fetch, concurrency):
+    async def scenario():
+        monkeypatch.setattr(legal_metrics_api, "courtlistener_slots", asyncio.Semaphore(concurrency))
+        application = web.Application()
+        application.router.add_get("/opinions/", stub.opinions)
+        server = TestServer(application)
+        await server.start_server()
+        try:
+            monkeypatch.setenv("COURTLISTENER_BASE_URL", str(server.make_url("")))
+            return await fetch()
+        finally:
+            await server.close()
+
+    return asyncio.run(scenario())
+
+
+def test_jurisdictions_run_concurrently_and_report_failures(monkeypatch):
+    stub = StubCourtListener()
+    result = run_against_stub(monkeypatch, stub, fetch_jurisdictions_breakdown, concurrency=6)
+
+    assert stub.requests == 6
+    assert stub.max_in_flight > 1
+    assert result["Federal"] == 100 and result["Federal_Special"] == 5
+    # A failed query is reported, not passed off as a count of zero
+    assert result["Federal_Bankruptcy"] is None
+    assert list(result["errors"]) == ["Federal_Bankruptcy"]
+    assert "503" in result["errors"]["Federal_Bankruptcy"]
+
+
+def test_concurrency_cap_is_respected(monkeypatch):
+    stub = StubCourtListener(failing=())
+    result = run_against_stub(monkeypatch, stub, fetch_court_metrics, concurrency=2)
+
+    assert stub.max_in_flight == 2
+    assert result == {
+        "total_opinions": 1000,
+        "scotus_opinions": 7,
+        "federal_opinions": 100,
+        "state_opinions": 200,
+        "recent_opinions": 3,
+        "errors": {},
+    }
+
+
+def test_unreachable_server_fails_every_query(monkeypatch):
+    async def scenario():
+        monkeypatch.setattr(legal_metrics_api, "courtlistener_slots", asyncio.Semaphore(4))
+        # Nothing listens on port 1
+        monkeypatch.setenv("COURTLISTENER_BASE_URL", "http://127.0.0.1:1")
+        return await fetch_court_metrics()
+
+    result = asyncio.run(scenario())
+    assert set(result["errors"]) == {"total_opinions", "scotus_opinions", "federal_opinions", "state_opinions", "recent_opinions"}
+    assert all(result[name] is None for name in result["errors"])
+
+
+def test_partial_results_expire_early(monkeypatch):
+    cache = {"data": None, "timestamp": 0, "ttl": 3600}
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return {"Federal": None, "errors": {"Federal": "HTTP 503 from opinions/"}}
+
+    monkeypatch.setattr(legal_metrics_api, "PARTIAL_RESULT_TTL", 0)
+    asyncio.run(legal_metrics_api.get_cached_data(cache, fetch))
+    asyncio.run(legal_metrics_api.get_cached_data(cache, fetch))
+    assert len(calls) == 2
@@ -0,0 +1,90 @@
+import asyncio
+import json
+
+import pytest
+
+from tasks.notifier import TaskNotifier
+
+
+def test_publish_wakes_every_watcher():
+    async def scenario():
+        notifier = TaskNotifier()
+        woken = []
+
+        async def watcher(name):
+            with notifier.watch("t1") as changed:
+                if await notifier.wait(changed, 5):
+                    woken.append(name)
+
+        watchers = [asyncio.create_task(watcher(name)) for name in ("a", "b")]
+        await asyncio.sleep(0)
+        assert notifier.watched_tasks == 1
+        notifier.publish("t1")
+        await asyncio.gather(*watchers)
+        return woken, notifier.watched_tasks
+    woken, watched = asyncio.run(scenario())
+    assert sorted(woken) == ["a", "b"]
+    assert watched == 0
+
+
+def test_later_watchers_get_a_fresh_event():
+    async def scenario():
+        notifier = TaskNotifier()
+        with notifier.watch("t1") as first:
+            notifier.publish("t1")
+            with notifier.watch("t1") as second:
+                return first.is_set(), second.is_set(), second is first
+    first_set, second_set, same = asyncio.run(scenario())
+    assert first_set and not second_set and not same
+
+
+def test_wait_times_out_without_a_transition():
+    async def scenario():
+        notifier = TaskNotifier()
+        with notifier.watch("t1") as changed:
+            # Publishing another task does not wake this one
+            notifier.publish("t2")
+            return await notifier.wait(changed, 0.01)
+    assert asyncio.run(scenario()) is False
+
+
+def test_events_are_dropped_once_nobody_watches():
+    async def scenario():
+        notifier = TaskNotifier()
+        with notifier.watch("t1"):
+            with notifier.watch("t1"):
+                pass
+            assert notifier.watched_tasks == 1
+        notifier.publish("t1")
+        return notifier._events, notifier._watchers
+    events, watchers = asyncio.run(scenario())
+    assert events == {} and watchers == {}
+
+
+def test_event_stream_reports_progress_under_an_unchanged_status(monkeypatch):
+    pytest.importorskip("magic")
+    import app
+    from tasks.job_queue import JobQueue
+    from tasks.task_store import InMemoryTaskStore
+
+    store = InMemoryTaskStore()
+    monkeypatch.setattr(app, "task_store", store)
+    monkeypatch.setattr(app, "job_queue", JobQueue())
+    monkeypatch.setattr(app, "task_notifier", TaskNotifier())
+    store.create("t1", status="processing")
+
+    async def scenario():
+        response = await app.query_events("t1")
+        events = response.body_iterator
+        received = [await asyncio.wait_for(events.__anext__(), 5)]
+        app.set_task_status("t1", "processing", {"counts": {"completed": 1}})
+        received.append(await asyncio.wait_for(events.__anext__(), 5))
+        app.set_task_status("t1", "completed", {"counts": {"completed": 2}})
+        received.append(await asyncio.wait_for(events.__anext__(), 5))
+        async for extra in events:
+            received.append(extra)
+        return [json.loads(event.split(b"data: ", 1)[1]) for event in received]
+
+    statuses = asyncio.run(scenario())
+    assert [event["status"] for event in statuses] == ["processing", "processing", "completed"]
+    assert statuses[1]["response"] == {"counts": {"completed": 1}}
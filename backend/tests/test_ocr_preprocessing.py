@@ -0,0 +1,34 @@
+from PIL import Image
+
+from processing.ocr_preprocessing import OCRPreprocessor
+
+
+def page(size, dpi=None):
+    image = Image.new("L", size, 255)
+    if dpi:
+        image.info["dpi"] = (dpi, dpi)
+    return image
+
+
+def test_placeholder_dpi_falls_back_to_page_size():
+    preprocessor = OCRPreprocessor()
+    # A 12 MP phone photo tagged 72 DPI is really about 364 DPI for a letter page
+    for dpi in (None, 1, 72, 96):
+        assert round(preprocessor.estimated_dpi(page((3000, 4000), dpi))) == 364
+
+
+def test_plausible_scan_dpi_is_trusted():
+    preprocessor = OCRPreprocessor()
+    assert preprocessor.estimated_dpi(page((2550, 3300), 300)) == 300
+    # A receipt scanned at 600 DPI is a short page, not a low resolution
+    assert preprocessor.estimated_dpi(page((1200, 1800), 600)) == 600
+
+
+def test_stated_dpi_too_low_for_the_pixels_is_raised():
+    # 150 DPI over 4000 px would be a 27-inch page
+    assert round(OCRPreprocessor().estimated_dpi(page((3000, 4000), 150))) == 235
+
+
+def test_72_dpi_photo_is_downscaled():
+    prepared = OCRPreprocessor(target_dpi=300, binarize=False)(page((3000, 4000), 72))
+    assert max(prepared.size) == 3300
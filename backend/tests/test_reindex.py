@@ -0,0 +1,76 @@
+import zlib
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from processing.document_processing import DocumentProcessor
+
+
+class CountingEmbeddings:
+    """Deterministic embeddings that record every text they are asked to embed"""
+
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        return np.random.default_rng(zlib.crc32(text.encode())).standard_normal(16).tolist()
+
+
+def para(sentence):
+    return " ".join([sentence] * 10)
+
+
+def pages(source, *texts):
+    return [Document(page_content=text, metadata={"source": source, "page": page}) for page, text in enumerate(texts)]
+
+
+@pytest.fixture
+def corpus():
+    return {
+        "lease.pdf": pages("lease.pdf", para("The tenant pays rent monthly."), para("The landlord maintains the roof.")),
+        "nda.pdf": pages("nda.pdf", para("Confidential information stays confidential for five years.")),
+    }
+
+
+def processor_for(corpus, monkeypatch, **env):
+    monkeypatch.setenv("VECTOR_QUANTIZATION", "none")
+    monkeypatch.setenv("DEDUPLICATE_CHUNKS", "false")
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    processor = DocumentProcessor(documents_dir="")
+    processor.embeddings = CountingEmbeddings()
+    monkeypatch.setattr(processor, "load_documents", lambda: [page for docs in corpus.values() for page in docs])
+    return processor
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf"])
+def test_refresh_re_embeds_only_the_edited_document(corpus, monkeypatch, tmp_path, index_type):
+    processor = processor_for(corpus, monkeypatch, LOCAL_INDEX_TYPE=index_type)
+    index = processor.create_local_index(str(tmp_path), refresh=True)
+    assert len(index) == 3
+
+    corpus["lease.pdf"] = pages("lease.pdf", para("The tenant pays rent monthly."), para("The tenant maintains the roof."))
+    processor.embeddings.embedded.clear()
+    refreshed = processor.create_local_index(str(tmp_path), refresh=True)
+
+    assert processor.embeddings.embedded == [para("The tenant maintains the roof.")]
+    assert len(refreshed) == 3
+    contents = {doc.page_content for doc in refreshed.documents if doc is not None}
+    assert para("The landlord maintains the roof.") not in contents
+    assert para("The tenant maintains the roof.") in contents
+
+
+def test_refresh_without_changes_embeds_nothing(corpus, monkeypatch, tmp_path):
+    processor = processor_for(corpus, monkeypatch)
+    processor.create_hybrid_retriever(str(tmp_path), refresh=True)
+    processor.embeddings.embedded.clear()
+
+    retriever = processor.create_hybrid_retriever(str(tmp_path), refresh=True)
+
+    assert processor.embeddings.embedded == []
+    assert len(retriever.bm25_index) == 3
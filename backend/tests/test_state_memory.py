@@ -0,0 +1,46 @@
+import pickle
+
+import pytest
+
+for module in ("langgraph", "langchain_groq", "tavily", "pytesseract", "pdf2image"):
+    pytest.importorskip(module)
+
+from benchmarks.state_memory_benchmark import build_assistant, run_turn, text_pdf
+
+# Measured at about 6x the extracted text plus 2-3 MB of fixed cost (graph build, prompts, extraction round trip)
+PEAK_TEXT_MULTIPLE = 8
+PEAK_FIXED_BYTES = 4 * 1024 * 1024
+
+
+@pytest.fixture(scope="module")
+def turns():
+    assistant = build_assistant()
+    try:
+        first, first_peak = run_turn(assistant, text_pdf(400), "pdf", "Can either party terminate early?", [])
+        follow_up, _ = run_turn(assistant, "What notice period applies?", "text", "", first["conversation_history"])
+    finally:
+        assistant.close()
+    return first, first_peak, follow_up
+
+
+def test_peak_memory_per_request_is_bounded(turns):
+    first, peak, _ = turns
+    text_bytes = len(first["processed_input"]["content"].encode("utf-8"))
+    assert text_bytes > 1_000_000
+    assert peak <= PEAK_TEXT_MULTIPLE * text_bytes + PEAK_FIXED_BYTES
+
+
+def test_state_holds_the_text_once(turns):
+    first, _, _ = turns
+    text_bytes = len(first["processed_input"]["content"].encode("utf-8"))
+    state = {key: value for key, value in first.items() if key != "skipped_stages"}
+    assert len(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)) < 1.5 * text_bytes
+    assert "documents" not in first["processed_input"]["metadata"]
+
+
+def test_history_carries_an_excerpt_not_the_document(turns):
+    _, _, follow_up = turns
+    history = follow_up["conversation_history"]
+    assert len(history) == 4
+    assert len(pickle.dumps(history, protocol=pickle.HIGHEST_PROTOCOL)) < 16 * 1024
+    assert history[0].additional_kwargs["attachment"]["type"] == "pdf"
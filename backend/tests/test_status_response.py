@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+from tasks.status_response import StatusResponder, negotiate_encoding, status_body, status_version
+
+
+def test_version_ignores_queue_timings_but_not_queue_position():
+    running = status_version("t1", "processing", b"null", {"state": "running", "running_s": 1.234})
+    assert running == status_version("t1", "processing", b"null", {"state": "running", "running_s": 9.876})
+
+    first = status_version("t1", "queued", b"null", {"state": "queued", "position": 2, "queue_depth": 3, "waited_s": 0.5})
+    moved = status_version("t1", "queued", b"null", {"state": "queued", "position": 1, "queue_depth": 3, "waited_s": 0.5})
+    assert first != moved
+    assert running != status_version("t1", "processing", b'{"counts":{}}', {"state": "running", "running_s": 1.0})
+
+
+def test_status_body_splices_the_stored_response():
+    body = status_body("t1", "completed", b'{"final_response":"done"}', None)
+    assert body == b'{"task_id":"t1","status":"completed","queue":null,"response":{"final_response":"done"}}'
+
+
+def test_negotiate_encoding_honours_q_values():
+    assert negotiate_encoding("gzip;q=0") is None
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("gzip, deflate") == "gzip"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    pytest.importorskip("magic")
+    from fastapi.testclient import TestClient
+    import app
+    from tasks.job_queue import JobQueue
+    from tasks.task_store import InMemoryTaskStore
+
+    store, queue = InMemoryTaskStore(), JobQueue()
+    monkeypatch.setattr(app, "task_store", store)
+    monkeypatch.setattr(app, "job_queue", queue)
+    monkeypatch.setattr(app, "status_responder", StatusResponder())
+    store.create("t1", status="processing")
+    queue._running["text"]["t1"] = time.monotonic()
+    return TestClient(app.app), store
+
+
+def test_polling_a_running_task_gets_304_until_it_changes(client):
+    http, store = client
+    first = http.get("/query/status/t1")
+    assert first.status_code == 200 and first.json()["queue"]["state"] == "running"
+
+    time.sleep(0.01)
+    # running_s has moved on, but nothing the client acts on has
+    again = http.get("/query/status/t1", headers={"If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304
+
+    store.update("t1", "processing", {"counts": {"completed": 1}})
+    changed = http.get("/query/status/t1", headers={"If-None-Match": first.headers["etag"]})
+    assert changed.status_code == 200
+    assert changed.json()["response"] == {"counts": {"completed": 1}}
+
+
+def test_large_terminal_bodies_are_compressed_once(client):
+    http, store = client
+    store.update("t1", "completed", {"final_response": "x" * 5000})
+    for _ in range(2):
+        response = http.get("/query/status/t1", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.json()["response"]["final_response"] == "x" * 5000
+    import app
+    assert app.status_responder.stats() == {"cached": 1, "hits": 1, "misses": 1}
@@ -0,0 +1,154 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+import orjson
+import pytest
+from langchain_core.messages import AIMessage
+
+from tasks.task_store import (
+    ORPHANED_TASK_ERROR, InMemoryTaskStore, SQLiteTaskStore, TaskStore, create_task_store, owner_alive, process_identity
+)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    store = InMemoryTaskStore() if request.param == "memory" else SQLiteTaskStore(str(tmp_path / "tasks.db"))
+    yield store
+    store.close()
+
+
+def exited_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_task_store_is_abstract():
+    with pytest.raises(TypeError):
+        TaskStore()
+
+    class Partial(TaskStore):
+        def create(self, task_id, status="processing", response=None):
+            pass
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_create_update_get(store):
+    store.create("t1", status="queued")
+    assert store.get("t1")["status"] == "queued"
+    assert store.get("t1")["response"] is None
+
+    store.update("t1", "completed", {"final_response": "done", "conversation_history": [AIMessage(content="done")]})
+    task = store.get("t1")
+    assert task["status"] == "completed"
+    assert task["response"]["final_response"] == "done"
+    assert task["response"]["conversation_history"][0]["content"] == "done"
+    assert store.get("missing") is None
+
+
+def test_get_raw_returns_the_stored_bytes(store):
+    store.create("t1", status="completed", response={"final_response": "done"})
+    status, raw = store.get_raw("t1")
+    assert status == "completed"
+    assert orjson.loads(raw) == {"final_response": "done"}
+    assert store.get_raw("missing") is None
+
+
+def test_evict_expired(store):
+    store.create("t1")
+    assert store.evict_expired(now=0) == 0
+    assert store.evict_expired(now=store.get("t1")["expires_at"]) == 1
+    assert store.get("t1") is None
+
+
+def test_delete(store):
+    store.create("t1")
+    store.delete("t1")
+    assert store.get("t1") is None
+
+
+def test_in_memory_store_has_no_orphans():
+    store = InMemoryTaskStore()
+    store.create("t1", status="processing")
+    assert store.recover_orphans() == 0
+    assert store.get("t1")["status"] == "processing"
+
+
+def test_sqlite_recovers_tasks_of_exited_workers(tmp_path):
+    path = str(tmp_path / "tasks.db")
+    store = SQLiteTaskStore(path)
+    for task_id, status in (("queued", "queued"), ("running", "processing"), ("done", "completed"), ("mine", "processing")):
+        store.create(task_id, status=status)
+    dead = exited_pid()
+    store._connection().execute("UPDATE tasks SET owner = ? WHERE task_id != 'mine'", (f"{dead}:1",))
+
+    assert store.recover_orphans() == 2
+    assert store.get("queued")["status"] == "error"
+    assert store.get("queued")["response"] == {"error": ORPHANED_TASK_ERROR}
+    assert store.get("running")["status"] == "error"
+    # Finished tasks and tasks of live workers are left alone
+    assert store.get("done")["status"] == "completed"
+    assert store.get("mine")["status"] == "processing"
+    assert store.recover_orphans() == 0
+    store.close()
+
+
+def test_sqlite_adds_the_owner_column_to_old_databases(tmp_path):
+    path = str(tmp_path / "tasks.db")
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE tasks (task_id TEXT PRIMARY KEY, status TEXT NOT NULL, response TEXT, "
+        "created_at REAL NOT NULL, updated_at REAL NOT NULL, expires_at REAL NOT NULL)"
+    )
+    connection.execute("INSERT INTO tasks VALUES ('old', 'processing', 'null', 0, 0, 1e12)")
+    connection.commit()
+    connection.close()
+
+    store = SQLiteTaskStore(path)
+    # Rows from before owners were recorded cannot belong to a running worker of this version
+    assert store.recover_orphans() == 1
+    assert store.get("old")["status"] == "error"
+    store.close()
+
+
+def test_create_task_store(tmp_path, monkeypatch):
+    monkeypatch.setenv("TASK_DB_PATH", str(tmp_path / "tasks.db"))
+    assert isinstance(create_task_store("memory"), InMemoryTaskStore)
+    sqlite_store = create_task_store("sqlite")
+    assert isinstance(sqlite_store, SQLiteTaskStore)
+    sqlite_store.close()
+    with pytest.raises(ValueError):
+        create_task_store("redis")
+
+
+def test_a_reused_pid_does_not_keep_old_tasks_alive(tmp_path):
+    store = SQLiteTaskStore(str(tmp_path / "tasks.db"))
+    store.create("before_restart", status="processing")
+    store.create("current", status="processing")
+    # A restarted container server usually comes back with the same pid as the one that died
+    store._connection().execute("UPDATE tasks SET owner = ? WHERE task_id = 'before_restart'", (f"{os.getpid()}:earlier",))
+
+    assert store.recover_orphans() == 1
+    assert store.get("before_restart")["status"] == "error"
+    assert store.get("current")["status"] == "processing"
+    store.close()
+
+
+def test_owner_alive_tells_process_incarnations_apart():
+    process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    try:
+        assert owner_alive(process_identity())
+        assert not owner_alive(f"{os.getpid()}:earlier")
+        if os.path.exists(f"/proc/{process.pid}/stat"):
+            with open(f"/proc/{process.pid}/stat") as f:
+                start = f.read().rsplit(")", 1)[1].split()[19]
+            assert owner_alive(f"{process.pid}:{start}")
+            assert not owner_alive(f"{process.pid}:{int(start) - 1}")
+    finally:
+        process.kill()
+        process.wait()
+    assert not owner_alive(f"{process.pid}:anything")
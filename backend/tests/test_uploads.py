@@ -0,0 +1,76 @@
+import asyncio
+import os
+
+import pytest
+
+pytest.importorskip("magic")
+
+from processing.uploads import UploadRejected, receive_upload
+
+PDF = b"%PDF-1.4\n" + b"0" * 20000 + b"\n%%EOF\n"
+BOUNDARY = "testboundary"
+
+
+class StreamedRequest:
+    """Just enough of a Starlette request for receive_upload: headers and a chunked body stream"""
+
+    def __init__(self, body, chunk_size=4096):
+        self.headers = {"content-type": f"multipart/form-data; boundary={BOUNDARY}"}
+        self.body = body
+        self.chunk_size = chunk_size
+
+    async def stream(self):
+        for start in range(0, len(self.body), self.chunk_size):
+            yield self.body[start:start + self.chunk_size]
+
+
+def multipart(file_field="pdf", filename="a.pdf", data=PDF, **fields):
+    parts = [
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        for name, value in fields.items()
+    ]
+    parts.append(
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+        f"Content-Type: application/octet-stream\r\n\r\n".encode() + data + b"\r\n"
+    )
+    return b"".join(parts) + f"--{BOUNDARY}--\r\n".encode()
+
+
+def receive(body, max_bytes=10 ** 6, spool_threshold=10 ** 6):
+    return asyncio.run(receive_upload(StreamedRequest(body), "pdf", "pdf", max_bytes, spool_threshold))
+
+
+def test_small_upload_stays_in_memory():
+    contents, filename, fields = receive(multipart(query="what applies?", conversation_history="[]"))
+    assert contents == PDF
+    assert filename == "a.pdf"
+    assert fields == {"query": "what applies?", "conversation_history": "[]"}
+
+
+def test_large_upload_is_spooled_once():
+    contents, _, _ = receive(multipart(), spool_threshold=1000)
+    try:
+        with open(contents, "rb") as f:
+            assert f.read() == PDF
+    finally:
+        os.unlink(contents)
+
+
+def test_oversized_upload_is_rejected_and_cleaned_up(tmp_path, monkeypatch):
+    monkeypatch.setattr("tempfile.tempdir", str(tmp_path))
+    with pytest.raises(UploadRejected) as rejected:
+        receive(multipart(), max_bytes=10000, spool_threshold=1000)
+    assert rejected.value.status_code == 413
+    assert os.listdir(tmp_path) == []
+
+
+def test_wrong_type_is_rejected():
+    with pytest.raises(UploadRejected) as rejected:
+        receive(multipart(data=b"plain text, not a document"))
+    assert rejected.value.status_code == 415
+
+
+def test_missing_file_is_rejected():
+    with pytest.raises(UploadRejected) as rejected:
+        receive(multipart(file_field="other"))
+    assert rejected.value.status_code == 400
@@ -0,0 +1,112 @@
+import gc
+import os
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from retrieval.vector_index import LocalVectorIndex, normalize_embeddings
+
+
+def make_vectors(rows, dim=32, seed=0):
+    return normalize_embeddings(np.random.default_rng(seed).standard_normal((rows, dim)).astype(np.float32))
+
+
+def make_documents(rows, start=0):
+    return [Document(page_content=f"chunk {i}", metadata={"jurisdiction": "federal" if i % 2 else "state"}) for i in range(start, start + rows)]
+
+
+def build(vectors, batch=None, **kwargs):
+    index = LocalVectorIndex(**kwargs)
+    batch = batch or len(vectors)
+    for start in range(0, len(vectors), batch):
+        stop = min(start + batch, len(vectors))
+        index.add_embeddings(make_documents(stop - start, start), vectors[start:stop], ids=[str(i) for i in range(start, stop)])
+    return index
+
+
+def exact_top_k(vectors, query, k):
+    return list(np.argsort(-(vectors @ query), kind="stable")[:k])
+
+
+@pytest.mark.parametrize("quantization", ["none", "int8"])
+def test_search_matches_exact_neighbours(quantization):
+    vectors = make_vectors(3000)
+    index = build(vectors, quantization=quantization, rescore_multiplier=32)
+    for query in make_vectors(10, seed=1):
+        rows = [row for row, _ in index.search_rows(query, k=5)]
+        assert rows == exact_top_k(vectors, query, 5)
+
+
+def test_binary_codes_find_near_duplicates():
+    vectors = make_vectors(3000, dim=128)
+    index = build(vectors, quantization="binary")
+    noise = make_vectors(20, dim=128, seed=2) * 0.1
+    for row, query in zip(range(0, 3000, 150), vectors[::150] + noise):
+        assert index.search_rows(query, k=1)[0][0] == row
+
+
+def test_small_batches_grow_storage_geometrically():
+    vectors = make_vectors(5000)
+    index = build(vectors, batch=100, quantization="int8")
+    # Doubling from the initial capacity, never one reallocation per batch
+    assert index._codes.capacity < 2 * len(vectors)
+    assert index._vectors.capacity == index._codes.capacity
+    np.testing.assert_allclose(index.vectors, vectors, atol=1e-6)
+    assert len(index.alive) == len(index.codes) == len(index.scales) == 5000
+
+
+def test_quantized_index_spills_full_precision_vectors(tmp_path):
+    index = build(make_vectors(500), quantization="int8", spill_dir=str(tmp_path))
+    usage = index.memory_usage()
+    assert not usage["full_precision_resident"]
+    assert usage["scan_bytes"] < usage["full_precision_bytes"]
+    assert len(os.listdir(tmp_path)) == 1
+
+    del index
+    gc.collect()
+    # The spill directory goes away with the index
+    assert os.listdir(tmp_path) == []
+
+
+def test_float_index_keeps_vectors_in_memory():
+    assert build(make_vectors(100), quantization="none").memory_usage()["full_precision_resident"]
+
+
+def test_replace_delete_and_compact():
+    vectors = make_vectors(300)
+    index = build(vectors, quantization="int8")
+    replacement = make_vectors(1, seed=5)
+    index.add_embeddings(make_documents(1), replacement, ids=["0"])
+    assert index.delete(["1", "2"]) == 2
+    assert len(index) == 298
+
+    index.compact()
+    assert len(index.alive) == len(index.vectors) == 298
+    assert index.alive.all()
+    np.testing.assert_allclose(index.vectors[index.row_of("0")], replacement[0])
+    # The replaced row is still found by its new vector
+    assert index.search_rows(replacement[0], k=1)[0][0] == index.row_of("0")
+
+
+def test_metadata_filters_restrict_results():
+    index = build(make_vectors(400), quantization="int8")
+    for row, _ in index.search_rows(make_vectors(1, seed=3)[0], k=10, filters={"jurisdiction": ["state"]}):
+        assert index.documents[row].metadata["jurisdiction"] == "state"
+
+
+def test_save_and_load_round_trip(tmp_path):
+    vectors = make_vectors(500)
+    index = build(vectors, quantization="int8")
+    index.delete(["7"])
+    index.save(str(tmp_path / "index"))
+
+    loaded = LocalVectorIndex.load(str(tmp_path / "index"))
+    assert len(loaded) == 499 and "7" not in loaded
+    query = make_vectors(1, seed=9)[0]
+    assert loaded.search_rows(query, k=5) == index.search_rows(query, k=5)
+
+    # Appending after a memory-mapped load moves the vectors into the index's own storage
+    loaded.add_embeddings(make_documents(1, 500), make_vectors(1, seed=11), ids=["500"])
+    assert len(loaded) == 500
+    np.testing.assert_allclose(loaded.vectors[:500], vectors, atol=1e-6)
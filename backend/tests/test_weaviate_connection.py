@@ -0,0 +1,169 @@
+import asyncio
+import threading
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+from processing import weaviate_connection
+from processing.weaviate_connection import WeaviateConnection, batch_import
+
+
+class FakeBatch:
+    """collection.batch: records added objects and fails each listed uuid a set number of times"""
+
+    def __init__(self, failures):
+        self.failures = dict(failures)
+        self.added = []
+        self.failed_objects = []
+
+    @contextmanager
+    def dynamic(self):
+        self.failed_objects = []
+        adder = SimpleNamespace(add_object=self._add)
+        yield adder
+
+    def _add(self, properties, vector, uuid):
+        self.added.append(uuid)
+        if self.failures.get(uuid, 0) > 0:
+            self.failures[uuid] -= 1
+            self.failed_objects.append(SimpleNamespace(object_=SimpleNamespace(uuid=uuid)))
+
+
+class FakeClient:
+    """Weaviate client whose health and reconnect outcomes are scripted"""
+
+    def __init__(self, ready=True, reconnects_needed=0):
+        self.ready = ready
+        self.reconnects_needed = reconnects_needed
+        self.connects = 0
+        self.closes = 0
+
+    def is_connected(self):
+        return self.ready
+
+    def is_ready(self):
+        return self.ready
+
+    def close(self):
+        self.closes += 1
+        self.ready = False
+
+    def connect(self):
+        self.connects += 1
+        if self.connects < self.reconnects_needed:
+            raise ConnectionError("still down")
+        self.ready = True
+
+
+def objects(count):
+    return [{"uuid": f"uuid-{i}", "vector": [0.0], "properties": {"content": str(i)}} for i in range(count)]
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr(weaviate_connection.time, "sleep", slept.append)
+    return slept
+
+
+def connection_with(client, **kwargs):
+    connection = WeaviateConnection(mode="local", **kwargs)
+    connection._client = client
+    return connection
+
+
+def test_batch_import_retries_only_failed_objects(sleeps):
+    collection = SimpleNamespace(batch=FakeBatch({"uuid-1": 1, "uuid-3": 2}))
+
+    stats = batch_import(collection, objects(5), max_retries=3)
+
+    assert stats == {"imported": 5, "failed": 0}
+    assert collection.batch.added == [f"uuid-{i}" for i in range(5)] + ["uuid-1", "uuid-3", "uuid-3"]
+    assert len(sleeps) == 2
+
+
+def test_batch_import_gives_up_after_max_retries(sleeps):
+    collection = SimpleNamespace(batch=FakeBatch({"uuid-0": 10}))
+
+    stats = batch_import(collection, objects(3), max_retries=2)
+
+    assert stats == {"imported": 2, "failed": 1}
+    assert collection.batch.added.count("uuid-0") == 3
+
+
+def test_ensure_healthy_leaves_a_healthy_client_alone(sleeps):
+    client = FakeClient()
+    assert connection_with(client).ensure_healthy()
+    assert client.connects == 0 and not sleeps
+
+
+def test_ensure_healthy_reconnects_the_same_client(sleeps):
+    client = FakeClient(ready=False, reconnects_needed=2)
+    connection = connection_with(client, max_reconnect_attempts=3)
+
+    assert connection.ensure_healthy()
+    assert connection._client is client
+    assert client.connects == 2
+    assert len(sleeps) == 1
+
+
+def test_ensure_healthy_gives_up(sleeps):
+    client = FakeClient(ready=False, reconnects_needed=10)
+    assert not connection_with(client, max_reconnect_attempts=2).ensure_healthy()
+    assert client.connects == 2
+
+
+def test_backoff_does_not_hold_the_lock(monkeypatch):
+    connection = connection_with(FakeClient(ready=False, reconnects_needed=2))
+    lock_free_during_sleep = []
+
+    def sleep(seconds):
+        # Another thread must be able to use the connection while this one waits
+        def probe():
+            acquired = connection._lock.acquire(blocking=False)
+            lock_free_during_sleep.append(acquired)
+            if acquired:
+                connection._lock.release()
+        thread = threading.Thread(target=probe)
+        thread.start()
+        thread.join()
+
+    monkeypatch.setattr(weaviate_connection.time, "sleep", sleep)
+    assert connection.ensure_healthy()
+    assert lock_free_during_sleep == [True]
+
+
+def test_close_drops_the_client():
+    client = FakeClient()
+    connection = connection_with(client)
+    connection.close()
+    assert client.closes == 1
+    assert connection._client is None
+    assert connection.health() == {"mode": "local", "connected": False, "ready": False}
+
+
+def test_lifespan_closes_the_weaviate_connection(monkeypatch):
+    pytest.importorskip("magic")
+    import app
+    from processing.document_processing import DocumentProcessor
+
+    client = FakeClient()
+    processor = DocumentProcessor(documents_dir="")
+    processor._connection = connection_with(client)
+    assistant = SimpleNamespace(
+        document_processor=processor,
+        retrieval_backend="local",
+        after_fork=processor.after_fork,
+        close=processor.close,
+    )
+    monkeypatch.setenv("TASK_STORE", "memory")
+    monkeypatch.setattr(app, "legal_assistant", assistant)
+
+    async def run():
+        async with app.lifespan(app.app):
+            assert client.connects == 1  # after_fork reconnects the preloaded client
+    asyncio.run(run())
+
+    assert client.closes == 1
+    assert processor._connection._client is None